@@ -31,6 +31,15 @@ export function effectiveClubId(): string | null {
   }
 }
 
+/** ID prijavljenog korisnika (JWT `sub`) — npr. konobarova soba. */
+export function currentUserId(): string | null {
+  try {
+    return JSON.parse(atob((auth.token || '').split('.')[1])).sub ?? null;
+  } catch {
+    return null;
+  }
+}
+
 /** Superadmin nema club claim pa admin rute dobivaju ?club_id= iz odabira. */
 function withClubParam(path: string): string {
   if (auth.role !== 'superadmin' || !auth.clubId) return path;
@@ -61,6 +70,23 @@ export async function api<T = any>(
   }
 
   const data = await res.json().catch(() => ({}));
-  if (!res.ok) throw new Error(data.error || `Greška ${res.status}`);
+  if (!res.ok) throw Object.assign(new Error(data.error || `Greška ${res.status}`), { status: res.status });
   return data as T;
 }
+
+/** Preuzimanje datoteke (izvozi) — isti token, odgovor ide u blob. */
+export async function download(path: string, filename: string): Promise<void> {
+  const headers: Record<string, string> = {};
+  if (auth.token) headers['Authorization'] = `Bearer ${auth.token}`;
+  const res = await fetch(withClubParam(path), { headers });
+  if (!res.ok) {
+    const data = await res.json().catch(() => ({}));
+    throw new Error(data.error || `Greška ${res.status}`);
+  }
+  const url = URL.createObjectURL(await res.blob());
+  const link = document.createElement('a');
+  link.href = url;
+  link.download = filename;
+  link.click();
+  URL.revokeObjectURL(url);
+}
@@ -1,6 +1,7 @@
 import { useEffect, useState } from 'react';
 import { NavLink, useNavigate } from 'react-router-dom';
 import { api, auth } from '../api';
+import { resetSocket } from '../socket';
 
 export default function Layout({ children }: { children: React.ReactNode }) {
   const navigate = useNavigate();
@@ -52,7 +53,7 @@ export default function Layout({ children }: { children: React.ReactNode }) {
         </nav>
         <button
           className="secondary logout"
-          onClick={() => { auth.logout(); navigate('/login'); }}
+          onClick={() => { auth.logout(); resetSocket(); navigate('/login'); }}
         >
           Odjava
         </button>
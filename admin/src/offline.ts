@@ -0,0 +1,150 @@
+/**
+ * Offline check-in potpisanih QR kodova (backend ticket_signing.py).
+ *
+ * Kit (ključ eventa + poništene i već ušle karte) drži se u localStorageu;
+ * QR se provjerava lokalno HMAC-om kroz WebCrypto (traži HTTPS ili
+ * localhost), a skenovi čekaju u redu do sljedećeg synca.
+ */
+
+import { api } from './api';
+
+export type OfflineKit = {
+  event_id: string;
+  prefix: string;
+  key: string;
+  ticket_types: Record<string, string>;
+  revoked: string;
+  checked_in: string;
+  generated_at: string;
+};
+
+type QueuedScan = { qr: string; ticket_id: string; scanned_at: string };
+
+export type OfflineResult =
+  | { ok: true; ticketId: string; ticketType: string }
+  | { ok: false; reason: string };
+
+const SIGNATURE_BYTES = 16;
+// Najviše skenova po sync zahtjevu (backend OFFLINE_SYNC_MAX_SCANS)
+const SYNC_CHUNK_SIZE = 5000;
+const kitKey = (eventId: string) => `offline_kit_${eventId}`;
+const queueKey = (eventId: string) => `offline_scans_${eventId}`;
+
+function fromB64(text: string): Uint8Array {
+  const b64 = text.replace(/-/g, '+').replace(/_/g, '/');
+  const raw = atob(b64 + '='.repeat((4 - (b64.length % 4)) % 4));
+  return Uint8Array.from(raw, (c) => c.charCodeAt(0));
+}
+
+const toHex = (bytes: Uint8Array) => Array.from(bytes, (b) => b.toString(16).padStart(2, '0')).join('');
+
+/** Pakirani id-evi (12 bajtova svaki) → set hex ObjectId-eva. */
+function unpackIds(packed: string): Set<string> {
+  const bytes = fromB64(packed);
+  const ids = new Set<string>();
+  for (let i = 0; i + 12 <= bytes.length; i += 12) ids.add(toHex(bytes.subarray(i, i + 12)));
+  return ids;
+}
+
+function deviceId(): string {
+  let id = localStorage.getItem('offline_device_id');
+  if (!id) {
+    id = crypto.randomUUID();
+    localStorage.setItem('offline_device_id', id);
+  }
+  return id;
+}
+
+export function storedKit(eventId: string): OfflineKit | null {
+  const raw = localStorage.getItem(kitKey(eventId));
+  return raw ? JSON.parse(raw) : null;
+}
+
+/** Skida svježi kit; null ako event nema (više) potpisane karte. */
+export async function downloadKit(eventId: string): Promise<OfflineKit | null> {
+  try {
+    const kit = await api<OfflineKit>(`/api/hostess/event/${eventId}/offline-kit`);
+    localStorage.setItem(kitKey(eventId), JSON.stringify(kit));
+    return kit;
+  } catch (err: any) {
+    if (err.status === 409) {
+      // Potpisane karte su isključene — stari kit više ne vrijedi
+      localStorage.removeItem(kitKey(eventId));
+      return null;
+    }
+    return storedKit(eventId);
+  }
+}
+
+export function queuedScans(eventId: string): QueuedScan[] {
+  return JSON.parse(localStorage.getItem(queueKey(eventId)) || '[]');
+}
+
+export async function verifyOffline(kit: OfflineKit, qr: string): Promise<OfflineResult> {
+  const parts = qr.trim().split('.');
+  if (parts.length !== 4 || parts[0] !== kit.prefix) {
+    return { ok: false, reason: 'Kod nije potpisan — potrebna je mreža' };
+  }
+  const [prefix, body, ticketType, signature] = parts;
+  let ids: Uint8Array;
+  let expected: Uint8Array;
+  try {
+    ids = fromB64(body);
+    expected = fromB64(signature);
+  } catch {
+    return { ok: false, reason: 'Neispravan QR kod' };
+  }
+  if (ids.length !== 24 || toHex(ids.subarray(12)) !== kit.event_id) {
+    return { ok: false, reason: 'Karta nije za ovaj event' };
+  }
+
+  const key = await crypto.subtle.importKey(
+    'raw', fromB64(kit.key), { name: 'HMAC', hash: 'SHA-256' }, false, ['sign'],
+  );
+  const mac = new Uint8Array(await crypto.subtle.sign(
+    'HMAC', key, new TextEncoder().encode(`${prefix}.${body}.${ticketType}`),
+  )).subarray(0, SIGNATURE_BYTES);
+  if (expected.length !== SIGNATURE_BYTES || toHex(mac) !== toHex(expected)) {
+    return { ok: false, reason: 'Krivotvoren QR kod' };
+  }
+
+  const ticketId = toHex(ids.subarray(0, 12));
+  if (unpackIds(kit.revoked).has(ticketId)) return { ok: false, reason: 'Karta je poništena' };
+  if (unpackIds(kit.checked_in).has(ticketId)
+      || queuedScans(kit.event_id).some((s) => s.ticket_id === ticketId)) {
+    return { ok: false, reason: 'Karta je već iskorištena' };
+  }
+
+  const queue = queuedScans(kit.event_id);
+  queue.push({ qr: qr.trim(), ticket_id: ticketId, scanned_at: new Date().toISOString() });
+  localStorage.setItem(queueKey(kit.event_id), JSON.stringify(queue));
+  return { ok: true, ticketId, ticketType: kit.ticket_types[ticketType] ?? ticketType };
+}
+
+type SyncResult = { accepted: number; duplicates: any[]; rejected: any[] };
+
+/**
+ * Šalje red skenova u komadima od najviše SYNC_CHUNK_SIZE (backend
+ * OFFLINE_SYNC_MAX_SCANS); svaki komad se briše iz reda čim ga server
+ * prihvati, pa prekid usred synca ne šalje prihvaćene skenove ponovno.
+ */
+export async function syncScans(eventId: string): Promise<SyncResult | null> {
+  const scans = queuedScans(eventId);
+  if (scans.length === 0) return null;
+  const total: SyncResult = { accepted: 0, duplicates: [], rejected: [] };
+  for (let i = 0; i < scans.length; i += SYNC_CHUNK_SIZE) {
+    const chunk = scans.slice(i, i + SYNC_CHUNK_SIZE);
+    const result = await api<SyncResult>(
+      `/api/hostess/event/${eventId}/offline-sync`,
+      { body: { device_id: deviceId(), scans: chunk.map(({ qr, scanned_at }) => ({ qr, scanned_at })) } },
+    );
+    const sent = new Set(chunk.map((s) => s.qr));
+    localStorage.setItem(
+      queueKey(eventId), JSON.stringify(queuedScans(eventId).filter((s) => !sent.has(s.qr))),
+    );
+    total.accepted += result.accepted;
+    total.duplicates.push(...result.duplicates);
+    total.rejected.push(...result.rejected);
+  }
+  return total;
+}
@@ -1,5 +1,7 @@
 import { useEffect, useState } from 'react';
 import { api, effectiveClubId } from '../../api';
+import { useSubscription } from '../../socket';
+import { downloadKit, OfflineKit, queuedScans, syncScans, verifyOffline } from '../../offline';
 
 export default function CheckIn() {
   const [events, setEvents] = useState<any[]>([]);
@@ -9,6 +11,9 @@ export default function CheckIn() {
   const [stats, setStats] = useState<any>(null);
   const [error, setError] = useState('');
   const [message, setMessage] = useState('');
+  const [qr, setQr] = useState('');
+  const [kit, setKit] = useState<OfflineKit | null>(null);
+  const [pending, setPending] = useState(0);
 
   useEffect(() => {
     api<{ events: any[] }>(`/api/events?club_id=${effectiveClubId()}`)
@@ -23,20 +28,76 @@ export default function CheckIn() {
       .catch((e) => setError(e.message));
   }
 
-  function loadStats() {
-    if (!eventId) return;
-    api(`/api/hostess/event/${eventId}/stats`).then(setStats).catch(() => {});
-  }
-
   useEffect(() => {
     if (!eventId) return;
     loadGuests();
-    loadStats();
-    const interval = setInterval(loadStats, 15000);
-    return () => clearInterval(interval);
     // eslint-disable-next-line react-hooks/exhaustive-deps
   }, [eventId, search]);
 
+  // Kit za offline provjeru potpisanih QR kodova; red se šalje čim je mreža tu
+  useEffect(() => {
+    if (!eventId) return;
+    downloadKit(eventId).then(setKit);
+    setPending(queuedScans(eventId).length);
+    const onOnline = () => { sync(); };
+    window.addEventListener('online', onOnline);
+    return () => window.removeEventListener('online', onOnline);
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [eventId]);
+
+  async function sync() {
+    if (!eventId) return;
+    try {
+      const res = await syncScans(eventId);
+      if (res) {
+        setMessage(`Sync: ${res.accepted} ulazaka, ${res.duplicates.length} duplikata, ${res.rejected.length} odbijeno`);
+        loadGuests();
+      }
+      downloadKit(eventId).then(setKit);
+    } catch (err: any) {
+      setError(err.message);
+    }
+    setPending(queuedScans(eventId).length);
+  }
+
+  async function scan(e: React.FormEvent) {
+    e.preventDefault();
+    const code = qr.trim();
+    setQr('');
+    setError('');
+    setMessage('');
+    if (!code || !eventId) return;
+    if (navigator.onLine) {
+      try {
+        const res = await api<{ guest_name?: string }>(
+          `/api/hostess/checkin/ticket/${encodeURIComponent(code)}?by=qr`, { method: 'POST' },
+        );
+        setMessage(`✓ Ulaz potvrđen — ${res.guest_name ?? ''}`);
+        loadGuests();
+        return;
+      } catch (err: any) {
+        // TypeError = mreža nedostupna; ostale greške su odgovor servera
+        if (!(err instanceof TypeError)) {
+          setError(err.message);
+          return;
+        }
+      }
+    }
+    if (!kit) {
+      setError('Nema mreže ni offline kita za ovaj event');
+      return;
+    }
+    const res = await verifyOffline(kit, code);
+    if (res.ok) setMessage(`✓ Ulaz potvrđen offline — ${res.ticketType}`);
+    else setError(res.reason);
+    setPending(queuedScans(eventId).length);
+  }
+
+  // Join vraća trenutne statistike, a dalje ih backend gura nakon promjene
+  useSubscription('join_hostess', eventId ? { event_id: eventId } : null, 'hostess_stats', (s: any) => {
+    if (s.event_id === eventId) setStats(s);
+  }, 'leave_stats');
+
   async function checkin(guest: any) {
     setError('');
     setMessage('');
@@ -47,7 +108,6 @@ export default function CheckIn() {
       const res = await api<{ guest_name?: string }>(path, { method: 'POST' });
       setMessage(`✓ Ulaz potvrđen — ${res.guest_name ?? guest.name}`);
       loadGuests();
-      loadStats();
     } catch (err: any) {
       setError(err.message);
     }
@@ -93,6 +153,19 @@ export default function CheckIn() {
         </div>
       )}
 
+      <form className="card" onSubmit={scan} style={{ marginBottom: 16, display: 'flex', gap: 8 }}>
+        <input
+          placeholder="Skeniraj QR kod…" autoFocus
+          value={qr} onChange={(e) => setQr(e.target.value)}
+        />
+        <button>Provjeri</button>
+        {kit && (
+          <button type="button" className="secondary" onClick={sync} disabled={pending === 0}>
+            Sync ({pending})
+          </button>
+        )}
+      </form>
+
       <div className="card">
         <input
           placeholder="Pretraga po imenu/prezimenu…"
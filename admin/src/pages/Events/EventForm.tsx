@@ -22,6 +22,7 @@ export default function EventForm() {
     age_limit: existing?.age_limit ?? 18,
     dress_code: existing?.dress_code ?? '',
     is_published: existing?.is_published ?? false,
+    signed_tickets: existing?.signed_tickets ?? false,
   });
   const [lineup, setLineup] = useState<any[]>(existing?.lineup ?? []);
   const [ticketTypes, setTicketTypes] = useState<TicketType[]>(
@@ -137,6 +138,11 @@ export default function EventForm() {
                    onChange={(e) => set('is_published', e.target.checked)} />
             Objavljen (vidljiv u mobilnoj aplikaciji)
           </label>
+          <label style={{ display: 'flex', alignItems: 'center', gap: 8, marginTop: 8 }}>
+            <input type="checkbox" style={{ width: 'auto' }} checked={form.signed_tickets}
+                   onChange={(e) => set('signed_tickets', e.target.checked)} />
+            Potpisani QR kodovi (check-in bez mreže, za karte prodane od sada)
+          </label>
           {error && <div className="error-msg">{error}</div>}
           <button style={{ marginTop: 12 }}>{id ? 'Spremi' : 'Kreiraj event'}</button>
         </div>
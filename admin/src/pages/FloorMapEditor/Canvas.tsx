@@ -1,5 +1,7 @@
 import { useEffect, useRef, useState } from 'react';
 import { api, effectiveClubId } from '../../api';
+import { useSubscription } from '../../socket';
+import { applyChanges, diffTables, MapChanges } from './diff';
 import SectionEditor from './SectionEditor';
 import TableEditor, { TableDef } from './TableEditor';
 
@@ -9,6 +11,12 @@ import TableEditor, { TableDef } from './TableEditor';
  * 2. Klik na prazno mjesto dodaje stol na tu poziciju (% koordinate)
  * 3. Povlačenje pomiče stol; klik na stol otvara editor svojstava
  * 4. Stolovi se grupiraju u sekcije (boja sekcije = vizualna razlika)
+ * 5. Spremanje šalje samo razliku od zadnje spremljene verzije (`version`);
+ *    ako je netko drugi u međuvremenu spremio, backend vraća 409
+ * 6. Soba `floor_map_<id>` javlja spremanja drugih admina: PATCH razlika
+ *    (`floor_map_updated`) se primijeni na mjestu, ostala spremanja
+ *    (`floor_map_changed`) ponovno učitaju mapu; s lokalnim izmjenama
+ *    editor upozori prije spremanja
  */
 export default function FloorMapEditor() {
   const [map, setMap] = useState<any>(null);
@@ -16,20 +24,58 @@ export default function FloorMapEditor() {
   const [error, setError] = useState('');
   const [saving, setSaving] = useState(false);
   const svgRef = useRef<SVGSVGElement>(null);
+  // Zadnje spremljeno stanje — osnovica za razliku pri spremanju
+  const saved = useRef<{ tables: TableDef[]; sections: any[] }>({ tables: [], sections: [] });
   const dragging = useRef<{ id: string; moved: boolean } | null>(null);
 
+  function load(m: any) {
+    saved.current = { tables: m.tables ?? [], sections: m.sections ?? [] };
+    setMap(m);
+  }
+
+  function hasLocalChanges() {
+    return JSON.stringify(map.tables ?? []) !== JSON.stringify(saved.current.tables)
+      || JSON.stringify(map.sections ?? []) !== JSON.stringify(saved.current.sections);
+  }
+
+  /** Tuđe spremanje: razlika na mjestu ako je sljedeća verzija, inače reload. */
+  function onRemoteSave(version: number, changes?: MapChanges) {
+    // Vlastita spremanja stižu s verzijom koju već imamo (ili dok traje save)
+    if (saving || version <= (map.version ?? 0)) return;
+    if (hasLocalChanges()) {
+      setError('Drugi admin je u međuvremenu spremio mapu — osvježi editor prije spremanja');
+      return;
+    }
+    if (changes && version === (map.version ?? 0) + 1) {
+      load({ ...map, ...applyChanges(map.tables ?? [], map.sections ?? [], changes), version });
+      return;
+    }
+    api(`/api/floor-maps/club/${map.club_id}`).then(load).catch((e) => setError(e.message));
+  }
+
+  const room = map ? { map_id: map._id } : null;
+  useSubscription<{ version: number }>(
+    'join_floor_map', room, 'floor_map_changed',
+    (data) => onRemoteSave(data.version),
+    'leave_floor_map',
+  );
+  useSubscription<{ version: number; changes: MapChanges }>(
+    'join_floor_map', room, 'floor_map_updated',
+    (data) => onRemoteSave(data.version, data.changes),
+  );
+
   useEffect(() => {
     const clubId = effectiveClubId();
     if (!clubId) { setError('Odaberi klub'); return; }
     api(`/api/floor-maps/club/${clubId}`)
-      .then(setMap)
+      .then(load)
       .catch(async () => {
         // Nema mape — kreiraj praznu
         try {
           const created = await api('/api/floor-maps', {
             body: { club_id: clubId, name: 'Glavni tlocrt', tables: [], sections: [] },
           });
-          setMap(created);
+          load(created);
         } catch (e: any) {
           setError(e.message);
         }
@@ -95,10 +141,27 @@ export default function FloorMapEditor() {
     setSaving(true);
     setError('');
     try {
-      await api(`/api/floor-maps/${map._id}/tables`, {
-        method: 'PUT',
-        body: { tables: map.tables, sections: map.sections },
-      });
+      let version = map.version ?? 0;
+      const sections = map.sections ?? [];
+      if (JSON.stringify(sections) !== JSON.stringify(saved.current.sections)) {
+        const res = await api(`/api/floor-maps/${map._id}/tables`, {
+          method: 'PUT', body: { sections, version },
+        });
+        version = res.version;
+        // Sekcije su spremljene i ako PATCH stolova ne uspije
+        saved.current = { ...saved.current, sections };
+        setMap((m: any) => ({ ...m, version }));
+      }
+      const tables = map.tables ?? [];
+      const ops = diffTables(saved.current.tables, tables);
+      if (ops.length) {
+        const res = await api(`/api/floor-maps/${map._id}/tables`, {
+          method: 'PATCH', body: { version, ops },
+        });
+        version = res.version;
+      }
+      saved.current = { tables, sections };
+      setMap((m: any) => ({ ...m, version }));
     } catch (e: any) {
       setError(e.message);
     } finally {
@@ -111,8 +174,9 @@ export default function FloorMapEditor() {
     const fd = new FormData();
     fd.append('image', e.target.files[0]);
     try {
-      const res = await api<{ url: string }>(`/api/floor-maps/${map._id}/upload-bg`, { formData: fd });
-      setMap({ ...map, background_image_url: res.url });
+      const res = await api<{ url: string; version: number }>(
+        `/api/floor-maps/${map._id}/upload-bg`, { formData: fd });
+      setMap((m: any) => ({ ...m, background_image_url: res.url, version: res.version }));
     } catch (err: any) {
       setError(err.message);
     }
@@ -0,0 +1,64 @@
+import { TableDef } from './TableEditor';
+
+export type TableOp =
+  | { op: 'add'; table: TableDef }
+  | { op: 'move'; id: string; x: number; y: number }
+  | { op: 'update'; id: string; fields: Partial<TableDef> }
+  | { op: 'delete'; id: string };
+
+/**
+ * Razlika između zadnje spremljene i trenutne liste stolova → operacije
+ * za PATCH /api/floor-maps/:id/tables. Pomak (samo x/y) je `move`, ostale
+ * promjene `update` s izmijenjenim poljima.
+ */
+export function diffTables(saved: TableDef[], current: TableDef[]): TableOp[] {
+  const before = new Map(saved.map((t) => [t.id, t]));
+  const ops: TableOp[] = [];
+
+  for (const table of current) {
+    const old = before.get(table.id);
+    before.delete(table.id);
+    if (!old) { ops.push({ op: 'add', table }); continue; }
+
+    const fields: Partial<TableDef> = {};
+    (Object.keys(table) as (keyof TableDef)[]).forEach((key) => {
+      if (key !== 'id' && table[key] !== old[key]) (fields as any)[key] = table[key];
+    });
+    const keys = Object.keys(fields);
+    if (!keys.length) continue;
+    if (keys.every((k) => k === 'x' || k === 'y')) {
+      ops.push({ op: 'move', id: table.id, x: table.x, y: table.y });
+    } else {
+      ops.push({ op: 'update', id: table.id, fields });
+    }
+  }
+  before.forEach((_, id) => ops.push({ op: 'delete', id }));
+  return ops;
+}
+
+export type MapChanges = {
+  added: TableDef[];
+  patched: Record<string, Partial<TableDef>>;
+  deleted: string[];
+};
+
+/**
+ * Primjena razlike iz `floor_map_updated` (tuđi PATCH) — isti redoslijed kao
+ * backend (floor_map_index.apply_changes): brisanje, izmjene, pa dodani stolovi.
+ */
+export function applyChanges(
+  tables: TableDef[], sections: any[], changes: MapChanges,
+): { tables: TableDef[]; sections: any[] } {
+  const deleted = new Set(changes.deleted);
+  const next = tables
+    .filter((t) => !deleted.has(t.id))
+    .map((t) => (changes.patched[t.id] ? { ...t, ...changes.patched[t.id] } : t))
+    .concat(changes.added);
+  if (!deleted.size) return { tables: next, sections };
+  return {
+    tables: next,
+    sections: sections.map((s) => ({
+      ...s, table_ids: (s.table_ids ?? []).filter((id: string) => !deleted.has(id)),
+    })),
+  };
+}
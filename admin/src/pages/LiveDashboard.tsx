@@ -1,21 +1,26 @@
 import { useEffect, useState } from 'react';
 import { useParams } from 'react-router-dom';
 import { api } from '../api';
+import { useSubscription } from '../socket';
 
-/** Live prikaz eventa — osvježava se svakih 10 sekundi. */
+/**
+ * Live prikaz eventa — prvi prikaz REST-om, zatim backend gura snapshot
+ * (`live_stats`) čim se brojke promijene.
+ */
 export default function LiveDashboard() {
   const { id } = useParams();
   const [data, setData] = useState<any>(null);
   const [error, setError] = useState('');
 
   useEffect(() => {
-    const load = () =>
-      api(`/api/admin/events/${id}/live`).then(setData).catch((e) => setError(e.message));
-    load();
-    const interval = setInterval(load, 10000);
-    return () => clearInterval(interval);
+    api(`/api/admin/events/${id}/live`).then(setData).catch((e) => setError(e.message));
   }, [id]);
 
+  useSubscription('join_live', id ? { event_id: id } : null, 'live_stats', (stats: any) => {
+    if (stats.event_id !== id) return;
+    setData((prev: any) => ({ ...prev, ...stats }));
+  }, 'leave_stats');
+
   if (error) return <div className="error-msg">{error}</div>;
   if (!data) return <p className="muted">Učitavanje…</p>;
 
@@ -33,7 +38,7 @@ export default function LiveDashboard() {
     <>
       <h1>Live — {data.event?.name}</h1>
       <p className="muted">
-        {new Date(data.event?.date).toLocaleString('hr-HR')} · automatsko osvježavanje (10 s)
+        {new Date(data.event?.date).toLocaleString('hr-HR')} · uživo
       </p>
       <div className="grid cols-4" style={{ marginTop: 16 }}>
         {items.map((i) => (
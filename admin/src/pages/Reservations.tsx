@@ -1,6 +1,6 @@
 import { useEffect, useState } from 'react';
 import { useParams } from 'react-router-dom';
-import { api } from '../api';
+import { api, download } from '../api';
 
 const STATUS_BADGE: Record<string, string> = {
   pending: 'warning',
@@ -13,17 +13,38 @@ const STATUS_BADGE: Record<string, string> = {
 export default function Reservations() {
   const { id } = useParams();
   const [reservations, setReservations] = useState<any[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
   const [error, setError] = useState('');
 
+  type Page = { reservations: any[]; next_cursor: string | null };
+
   useEffect(() => {
-    api<{ reservations: any[] }>(`/api/reservations/event/${id}/all`)
-      .then((d) => setReservations(d.reservations))
+    api<Page>(`/api/reservations/event/${id}/all`)
+      .then((d) => { setReservations(d.reservations); setNextCursor(d.next_cursor); })
       .catch((e) => setError(e.message));
   }, [id]);
 
+  const loadMore = () => {
+    if (!nextCursor) return;
+    api<Page>(`/api/reservations/event/${id}/all?cursor=${encodeURIComponent(nextCursor)}`)
+      .then((d) => {
+        setReservations((prev) => [...prev, ...d.reservations]);
+        setNextCursor(d.next_cursor);
+      })
+      .catch((e) => setError(e.message));
+  };
+
+  const exportAs = (format: 'csv' | 'ndjson') =>
+    download(`/api/reservations/event/${id}/export?format=${format}`, `rezervacije-${id}.${format}`)
+      .catch((e) => setError(e.message));
+
   return (
     <>
       <h1>Rezervacije eventa</h1>
+      <div style={{ display: 'flex', gap: 8, marginBottom: 12 }}>
+        <button className="secondary" onClick={() => exportAs('csv')}>Izvoz CSV</button>
+        <button className="secondary" onClick={() => exportAs('ndjson')}>Izvoz NDJSON</button>
+      </div>
       {error && <div className="error-msg">{error}</div>}
       <div className="card">
         <table>
@@ -48,6 +69,9 @@ export default function Reservations() {
           </tbody>
         </table>
         {reservations.length === 0 && <p className="muted" style={{ marginTop: 10 }}>Nema rezervacija.</p>}
+        {nextCursor && (
+          <button className="secondary" style={{ marginTop: 10 }} onClick={loadMore}>Učitaj još</button>
+        )}
       </div>
     </>
   );
@@ -1,5 +1,10 @@
-import { useEffect, useState } from 'react';
-import { api } from '../../api';
+import { useEffect, useRef, useState } from 'react';
+import { api, currentUserId } from '../../api';
+import { useSubscription } from '../../socket';
+
+// Narudžbe sekcije bez dodijeljenog konobara ne stižu u njegovu sobu —
+// rijetki sigurnosni refresh umjesto pollinga svakih 5 s
+const FALLBACK_REFRESH_MS = 60000;
 
 const STATUS_LABEL: Record<string, string> = {
   placed: 'Zaprimljena',
@@ -29,10 +34,17 @@ export default function Orders() {
 
   useEffect(() => {
     loadOrders();
-    const interval = setInterval(loadOrders, 5000);
+    const interval = setInterval(loadOrders, FALLBACK_REFRESH_MS);
     return () => clearInterval(interval);
   }, []);
 
+  // order_updated u sobi waiter_{id} → jedan refresh po naletu promjena
+  const pending = useRef<ReturnType<typeof setTimeout>>();
+  useSubscription('join_waiter', { waiter_id: currentUserId() ?? '' }, 'order_updated', () => {
+    clearTimeout(pending.current);
+    pending.current = setTimeout(loadOrders, 300);
+  });
+
   async function act(orderId: string, action: 'accept' | 'deliver' | 'collect-cash') {
     setError('');
     try {
@@ -0,0 +1,58 @@
+/** Socket.IO — jedna dijeljena konekcija admin SPA-a na backend. */
+
+import { useEffect, useRef } from 'react';
+import { io, Socket } from 'socket.io-client';
+import { auth } from './api';
+
+let socket: Socket | null = null;
+
+export function getSocket(): Socket {
+  if (!socket) {
+    // Isti origin: NGINX (i Vite dev proxy) prosljeđuje /socket.io backendu.
+    // Callback oblik šalje trenutni token i kod reconnecta.
+    socket = io({
+      transports: ['websocket'],
+      auth: (cb) => cb({ token: auth.token }),
+    });
+  }
+  return socket;
+}
+
+/** Prekida konekciju (logout) — sljedeći getSocket() se spaja iznova. */
+export function resetSocket() {
+  socket?.disconnect();
+  socket = null;
+}
+
+/**
+ * Pretplata na sobu: `joinEvent` s `payload` nakon svakog (re)connecta —
+ * server odmah vrati catch-up snapshot — i `event` → `onData`.
+ * `payload = null` znači bez pretplate (npr. event još nije odabran).
+ */
+export function useSubscription<T = any>(
+  joinEvent: string,
+  payload: Record<string, string> | null,
+  event: string,
+  onData: (data: T) => void,
+  leaveEvent?: string,
+) {
+  const handler = useRef(onData);
+  handler.current = onData;
+  const key = payload ? JSON.stringify(payload) : null;
+
+  useEffect(() => {
+    if (!key) return;
+    const s = getSocket();
+    const body = JSON.parse(key);
+    const join = () => s.emit(joinEvent, body);
+    const listener = (data: T) => handler.current(data);
+    s.on(event, listener);
+    s.on('connect', join);
+    if (s.connected) join();
+    return () => {
+      s.off(event, listener);
+      s.off('connect', join);
+      if (leaveEvent) s.emit(leaveEvent, body);
+    };
+  }, [joinEvent, key, event, leaveEvent]);
+}
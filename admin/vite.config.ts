@@ -8,6 +8,7 @@ export default defineConfig({
     proxy: {
       // Lokalni razvoj bez Dockera: proxy API poziva na Traefik/backend
       '/api': 'http://localhost',
+      '/socket.io': { target: 'http://localhost', ws: true },
     },
   },
 });
@@ -0,0 +1,190 @@
+"""
+Admission control — prioritetne trake i odbacivanje opterećenja po replici.
+
+Jedan gevent worker po replici poslužuje javni feed (`/api/events`,
+`/api/clubs`), polling gostiju i osoblje na vratima/šanku istim redom.
+Svaki zahtjev se prije JWT-a i Monga svrsta u klasu (samo po metodi i
+putanji, bez I/O):
+
+- critical — hostesa (check-in, popis gostiju), konobar/bar (`/api/orders/
+  waiter`, `/bar/*`, prijelazi narudžbe), check-in rezervacije, Stripe webhook
+- normal   — sve ostalo (kupnja, rezervacija, admin, auth)
+- low      — javno pregledavanje i polling gostiju (GET evenata, klubova,
+  menija, tlocrta, `my` liste)
+
+Limit istovremenih zahtjeva je adaptivan (gradijent latencije, kao Netflix
+concurrency-limits Gradient2): kratki EWMA latencije uspoređuje se s dugim
+(baseline); kad kratki naraste iznad ADMISSION_LATENCY_TOLERANCE × baseline,
+limit se smanjuje, inače polako raste (+√limit) dok je replika stvarno
+opterećena. Klase dijele isti brojač zahtjeva u tijeku, ali s različitim
+pragom: low prolazi do ADMISSION_LOW_SHARE limita, normal do
+ADMISSION_NORMAL_SHARE, a critical se ograničava samo s ADMISSION_MAX_LIMIT
+(promet osoblja je malen i ograničen brojem osoblja). Javni feed se tako
+odbacuje prvi i osoblju ostaje slobodna konkurentnost.
+
+Odbijeni zahtjev odmah dobiva 503 + `Retry-After` (nema čekanja u redu —
+čekanje bi samo produljilo p99 svima).
+"""
+
+import math
+import os
+import re
+import threading
+import time
+
+from flask import g, jsonify, request
+from prometheus_client import Counter, Gauge
+
+ADMISSION_ENABLED = os.environ.get("ADMISSION_ENABLED", "1") == "1"
+ADMISSION_INITIAL_LIMIT = int(os.environ.get("ADMISSION_INITIAL_LIMIT", "100"))
+ADMISSION_MIN_LIMIT = int(os.environ.get("ADMISSION_MIN_LIMIT", "20"))
+ADMISSION_MAX_LIMIT = int(os.environ.get("ADMISSION_MAX_LIMIT", "500"))
+ADMISSION_LOW_SHARE = float(os.environ.get("ADMISSION_LOW_SHARE", "0.5"))
+ADMISSION_NORMAL_SHARE = float(os.environ.get("ADMISSION_NORMAL_SHARE", "0.85"))
+ADMISSION_LATENCY_TOLERANCE = float(os.environ.get("ADMISSION_LATENCY_TOLERANCE", "2.0"))
+ADMISSION_RETRY_AFTER_SECONDS = int(os.environ.get("ADMISSION_RETRY_AFTER_SECONDS", "2"))
+
+PRIORITIES = ("critical", "normal", "low")
+
+# (metoda ili None, regex putanje, klasa) — prvo podudaranje pobjeđuje
+PRIORITY_RULES = [
+    (None, r"^/api/hostess/", "critical"),
+    ("GET", r"^/api/orders/(waiter|bar/[^/]+)$", "critical"),
+    ("PUT", r"^/api/orders/[^/]+/(accept|deliver|collect-cash|cancel)$", "critical"),
+    ("PUT", r"^/api/reservations/[^/]+/checkin$", "critical"),
+    ("POST", r"^/api/auth/staff/login$", "critical"),
+    (None, r"^/api/webhooks/", "critical"),
+    # Javni feed — sidreno na točne rute; admin podresursi (karte eventa,
+    # izvoz, statistika) ostaju normal
+    ("GET", r"^/api/events(/upcoming|/[^/]+)?$", "low"),
+    ("GET", r"^/api/clubs(/[^/]+)?$", "low"),
+    ("GET", r"^/api/menu/club/[^/]+$", "low"),
+    ("GET", r"^/api/floor-maps/(event/[^/]+|club/[^/]+(/hit)?)$", "low"),
+    ("GET", r"^/api/uploads/[^/]+/[^/]+$", "low"),
+    ("GET", r"^/api/(tickets|orders|reservations)/my$", "low"),
+    ("GET", r"^/api/reservations/event/[^/]+(/recommend)?$", "low"),
+]
+_RULES = [(method, re.compile(pattern), priority) for method, pattern, priority in PRIORITY_RULES]
+
+# Ne broje se: metrike, health, Socket.IO (dugotrajne konekcije)
+_EXEMPT_PREFIXES = ("/metrics", "/api/health", "/socket.io")
+_UNSAMPLED_SUFFIXES = ("/export",)
+
+# EWMA faktori: kratki prozor prati trenutno stanje, dugi baseline
+_SHORT_ALPHA = 0.1
+_LONG_ALPHA = 0.002
+_LIMIT_SMOOTHING = 0.2
+
+ADMISSION_LIMIT = Gauge(
+    "admission_concurrency_limit",
+    "Adaptive concurrency limit of this replica",
+)
+
+ADMISSION_INFLIGHT = Gauge(
+    "admission_inflight_requests",
+    "Admitted requests currently in flight",
+    ["priority"],
+)
+
+ADMISSION_DECISIONS = Counter(
+    "admission_decisions_total",
+    "Admission decisions by priority class (admitted, rejected)",
+    ["priority", "outcome"],
+)
+
+
+def classify(method, path):
+    """Prioritetna klasa zahtjeva (critical / normal / low)."""
+    for rule_method, pattern, priority in _RULES:
+        if (rule_method is None or rule_method == method) and pattern.match(path):
+            return priority
+    return "normal"
+
+
+class AdaptiveLimiter:
+    """Brojač zahtjeva u tijeku + limit izveden iz promatrane latencije."""
+
+    def __init__(self, initial_limit, min_limit, max_limit, tolerance):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.tolerance = tolerance
+        self.inflight = {p: 0 for p in PRIORITIES}
+        self.short_rtt = None
+        self.long_rtt = None
+        self._lock = threading.Lock()
+        ADMISSION_LIMIT.set(self.limit)
+
+    def _threshold(self, priority):
+        if priority == "low":
+            return self.limit * ADMISSION_LOW_SHARE
+        if priority == "normal":
+            return self.limit * ADMISSION_NORMAL_SHARE
+        return self.max_limit
+
+    def try_acquire(self, priority):
+        with self._lock:
+            total = sum(self.inflight.values())
+            if total >= self._threshold(priority):
+                return False
+            self.inflight[priority] += 1
+        ADMISSION_INFLIGHT.labels(priority).inc()
+        return True
+
+    def release(self, priority, seconds):
+        with self._lock:
+            total = sum(self.inflight.values())
+            self.inflight[priority] -= 1
+            if seconds is not None:
+                self._update(seconds, total)
+        ADMISSION_INFLIGHT.labels(priority).dec()
+
+    def _update(self, rtt, inflight):
+        if self.short_rtt is None:
+            self.short_rtt = self.long_rtt = rtt
+            return
+        self.short_rtt += _SHORT_ALPHA * (rtt - self.short_rtt)
+        # Baseline brzo pada, a raste sporo — trajno preopterećenje ne smije
+        # postati nova "normalna" latencija
+        alpha = _LONG_ALPHA if rtt > self.long_rtt else _SHORT_ALPHA
+        self.long_rtt += alpha * (rtt - self.long_rtt)
+
+        gradient = max(0.5, min(1.0, self.tolerance * self.long_rtt / self.short_rtt))
+        if gradient >= 1.0 and inflight < self.limit / 2:
+            return  # replika nije opterećena — nema signala za rast
+        target = self.limit * gradient + math.sqrt(self.limit)
+        limit = self.limit * (1 - _LIMIT_SMOOTHING) + target * _LIMIT_SMOOTHING
+        self.limit = max(self.min_limit, min(self.max_limit, limit))
+        ADMISSION_LIMIT.set(self.limit)
+
+
+limiter = AdaptiveLimiter(
+    ADMISSION_INITIAL_LIMIT, ADMISSION_MIN_LIMIT, ADMISSION_MAX_LIMIT,
+    ADMISSION_LATENCY_TOLERANCE,
+)
+
+
+def admit():
+    """before_request: None (zahtjev prolazi) ili 503 odgovor."""
+    if not ADMISSION_ENABLED or request.path.startswith(_EXEMPT_PREFIXES):
+        return None
+    priority = classify(request.method, request.path)
+    if not limiter.try_acquire(priority):
+        ADMISSION_DECISIONS.labels(priority, "rejected").inc()
+        response = jsonify({"error": "Server je trenutno preopterećen — pokušajte ponovno"})
+        response.status_code = 503
+        response.headers["Retry-After"] = str(ADMISSION_RETRY_AFTER_SECONDS)
+        return response
+    ADMISSION_DECISIONS.labels(priority, "admitted").inc()
+    # Stream izvoza traje koliko i sam izvoz — latencija nije signal opterećenja
+    sample = not request.path.endswith(_UNSAMPLED_SUFFIXES)
+    g.admission = (priority, time.perf_counter(), sample)
+    return None
+
+
+def release(_exc=None):
+    """teardown_request: oslobađa mjesto i latenciju predaje limiteru."""
+    admitted = g.pop("admission", None)
+    if admitted is not None:
+        priority, start, sample = admitted
+        limiter.release(priority, time.perf_counter() - start if sample else None)
@@ -4,113 +4,29 @@ monkey.patch_all()
 """
 NightClub Manager v2 — Flask backend.
 
-- REST API pod /api/* (blueprintovi u routes/)
+- REST API pod /api/* (blueprintovi u routes/), HTTP slojevi u app_factory.py
 - JWT autentikacija (user / admin / superadmin / hostess / waiter) + revokacija
 - Socket.IO real-time kanal kroz Redis message queue (realtime.py)
 - Rate limiting na auth rutama (flask-limiter, Redis storage)
+- Admission control: prioritetne trake i 503 pri zasićenju (admission.py)
 - Stripe webhook za potvrde plaćanja
 - Prometheus /metrics endpoint
 """
 
-import os
-import re
-import time
-
-import stripe
+from bson import ObjectId
 from bson.errors import InvalidId
-from flask import Flask, Response, g, jsonify, request, send_from_directory, session
-from flask_jwt_extended import JWTManager, decode_token
-from flask_socketio import SocketIO, join_room, leave_room
-from prometheus_client import (
-    CONTENT_TYPE_LATEST,
-    Counter,
-    Histogram,
-    generate_latest,
-)
-from werkzeug.middleware.proxy_fix import ProxyFix
-
-from db import ensure_indexes
-from extensions import limiter, redis_client
-from payments import handle_payment_intent_succeeded
+from flask import session
+from flask_jwt_extended import decode_token
+from flask_socketio import SocketIO, emit, join_room, leave_room
+
+import event_stats
+from app_factory import create_app
+from customer_provisioning import queue_customers
+from db import ensure_indexes, events_col, floor_maps_col
 from realtime import SOCKETIO_MESSAGE_QUEUE
-from routes import ALL_BLUEPRINTS
-from upload_service import UPLOAD_DIR
-
-JWT_SECRET = os.environ.get("JWT_SECRET", "dev-secret-change-me")
-if JWT_SECRET == "dev-secret-change-me":
-    print(
-        "[SECURITY] UPOZORENJE: JWT_SECRET nije postavljen — koristi se dev tajna. "
-        "Za produkciju postavi JWT_SECRET u .env (openssl rand -hex 32)."
-    )
-
-app = Flask(__name__)
-# Traefik postavlja X-Forwarded-* — bez ovoga rate limiter vidi samo IP proxyja
-app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1, x_proto=1, x_host=1)
-app.config["SECRET_KEY"] = JWT_SECRET
-app.config["JWT_SECRET_KEY"] = JWT_SECRET
-app.config["JWT_ACCESS_TOKEN_EXPIRES"] = 60 * 60 * 12       # 12h
-app.config["JWT_REFRESH_TOKEN_EXPIRES"] = 60 * 60 * 24 * 30  # 30 dana
-app.config["MAX_CONTENT_LENGTH"] = 10 * 1024 * 1024          # 10 MB upload limit
-
-jwt = JWTManager(app)
-limiter.init_app(app)
-
-
-@jwt.token_in_blocklist_loader
-def token_revoked(_jwt_header, jwt_payload):
-    """Logout/rotacija dodaju jti na blocklist u Redisu (vidi routes/auth.py)."""
-    try:
-        return redis_client.exists(f"revoked_jwt:{jwt_payload['jti']}") == 1
-    except Exception:
-        # Redis nedostupan — ne obaraj autentikaciju zbog infrastrukture
-        return False
-
-
-# =========================
-# PROMETHEUS METRIKE
-# =========================
-
-REQUEST_COUNT = Counter(
-    "http_requests_total",
-    "Total HTTP requests",
-    ["method", "endpoint", "status"]
-)
-
-REQUEST_LATENCY = Histogram(
-    "http_request_duration_seconds",
-    "HTTP request latency",
-    ["endpoint"]
-)
-
 
-@app.before_request
-def start_timer():
-    g.start_time = time.time()
-
-
-@app.after_request
-def record_metrics(response):
-    # Preskoči metrics i websocket promet
-    if request.path.startswith("/metrics") or request.path.startswith("/socket.io"):
-        return response
-
-    latency = time.time() - g.start_time
-    # Koristimo rutu (url_rule) umjesto sirove putanje da ne eksplodira kardinalnost
-    endpoint = request.url_rule.rule if request.url_rule else request.path
-
-    REQUEST_LATENCY.labels(endpoint=endpoint).observe(latency)
-    REQUEST_COUNT.labels(
-        method=request.method,
-        endpoint=endpoint,
-        status=response.status_code
-    ).inc()
-
-    return response
-
-
-@app.route("/metrics")
-def metrics():
-    return Response(generate_latest(), mimetype=CONTENT_TYPE_LATEST)
+# HTTP dio (JWT, metrike, admission, blueprintovi, webhook) — app_factory.py
+app = create_app(__name__)
 
 
 # =========================
@@ -139,6 +55,7 @@ def handle_connect(auth):
         return False
     session["role"] = claims.get("role", "user")
     session["subject_id"] = claims.get("sub")
+    session["club_id"] = claims.get("club_id")
 
 
 @socketio.on("join_event")
@@ -147,6 +64,9 @@ def handle_join_event(data):
     event_id = (data or {}).get("event_id")
     if event_id and session.get("subject_id"):
         join_room(f"event_{event_id}")
+        # Interes za event → pripremi Stripe customera prije kupnje
+        if session.get("role") == "user":
+            queue_customers([session["subject_id"]])
 
 
 @socketio.on("leave_event")
@@ -168,6 +88,30 @@ def handle_join_waiter(data):
     join_room(f"waiter_{waiter_id}")
 
 
+@socketio.on("join_floor_map")
+def handle_join_floor_map(data):
+    """Editor mape — prima razlike koje spremaju drugi admini (samo vlastiti klub)."""
+    map_id = (data or {}).get("map_id")
+    role = session.get("role")
+    if not map_id or role not in ("admin", "superadmin"):
+        return
+    if role != "superadmin":
+        try:
+            floor_map = floor_maps_col.find_one({"_id": ObjectId(map_id)}, {"club_id": 1})
+        except InvalidId:
+            return
+        if not floor_map or str(floor_map["club_id"]) != session.get("club_id"):
+            return
+    join_room(f"floor_map_{map_id}")
+
+
+@socketio.on("leave_floor_map")
+def handle_leave_floor_map(data):
+    map_id = (data or {}).get("map_id")
+    if map_id:
+        leave_room(f"floor_map_{map_id}")
+
+
 @socketio.on("join_bar")
 def handle_join_bar(data):
     """Barski zaslon — samo osoblje i admini."""
@@ -176,71 +120,48 @@ def handle_join_bar(data):
         join_room(f"bar_{event_id}")
 
 
-# =========================
-# BLUEPRINTOVI
-# =========================
-
-for bp in ALL_BLUEPRINTS:
-    app.register_blueprint(bp)
-
-
-# =========================
-# STRIPE WEBHOOK
-# =========================
-
-@app.route('/api/webhooks/stripe', methods=['POST'])
-def stripe_webhook():
-    payload = request.get_data()
-    sig_header = request.headers.get('Stripe-Signature')
+def _may_watch_event(event_id, roles):
+    """Osoblje/admin smije pratiti samo evente vlastitog kluba."""
+    role = session.get("role")
+    if not event_id or role not in roles:
+        return False
+    if role == "superadmin":
+        return True
     try:
-        event = stripe.Webhook.construct_event(
-            payload, sig_header, os.environ.get('STRIPE_WEBHOOK_SECRET')
-        )
-    except Exception:
-        return jsonify({"error": "Invalid"}), 400
-
-    if event['type'] == 'payment_intent.succeeded':
-        pi = event['data']['object']
-        handle_payment_intent_succeeded(pi)
-
-    return jsonify({"status": "ok"}), 200
-
-
-# =========================
-# OSTALO
-# =========================
-
-@app.route("/api/uploads/<folder>/<filename>")
-def serve_upload(folder, filename):
-    """Servira lokalno spremljene slike (razvoj bez Cloudinaryja)."""
-    if not re.fullmatch(r"[A-Za-z0-9_-]+", folder):
-        return jsonify({"error": "Ruta ne postoji"}), 404
-    return send_from_directory(os.path.join(UPLOAD_DIR, folder), filename)
-
-
-@app.route("/api/health")
-def health():
-    return jsonify({"status": "ok", "service": "nightclub-manager-backend"})
-
-
-@app.errorhandler(InvalidId)
-def invalid_object_id(_):
-    return jsonify({"error": "Neispravan ID"}), 400
+        event = events_col.find_one({"_id": ObjectId(event_id)}, {"club_id": 1})
+    except InvalidId:
+        return False
+    return bool(event) and str(event["club_id"]) == session.get("club_id")
 
 
-@app.errorhandler(404)
-def not_found(_):
-    return jsonify({"error": "Ruta ne postoji"}), 404
+@socketio.on("join_live")
+def handle_join_live(data):
+    """Admin live prikaz — catch-up snapshot odmah, dalje `live_stats` pushevi."""
+    event_id = (data or {}).get("event_id")
+    if not _may_watch_event(event_id, ("admin", "superadmin")):
+        return
+    join_room(f"live_{event_id}")
+    event_stats.watch(event_id)
+    emit("live_stats", event_stats.snapshot(event_id))
 
 
-@app.errorhandler(429)
-def rate_limited(_):
-    return jsonify({"error": "Previše zahtjeva — pokušajte ponovno kasnije"}), 429
+@socketio.on("join_hostess")
+def handle_join_hostess(data):
+    """Hostesa na ulazu — catch-up snapshot, dalje `hostess_stats` pushevi."""
+    event_id = (data or {}).get("event_id")
+    if not _may_watch_event(event_id, ("hostess", "admin", "superadmin")):
+        return
+    join_room(f"hostess_{event_id}")
+    event_stats.watch(event_id)
+    emit("hostess_stats", event_stats.hostess_view(event_stats.snapshot(event_id)))
 
 
-@app.errorhandler(500)
-def server_error(exc):
-    return jsonify({"error": "Interna greška servera"}), 500
+@socketio.on("leave_stats")
+def handle_leave_stats(data):
+    event_id = (data or {}).get("event_id")
+    if event_id:
+        leave_room(f"live_{event_id}")
+        leave_room(f"hostess_{event_id}")
 
 
 # =========================
@@ -0,0 +1,231 @@
+"""
+Flask app bez Socket.IO servera — svi HTTP slojevi na jednom mjestu.
+
+app.py na ovo dodaje gevent patch, Socket.IO i ensure_indexes; benchmark
+(bench/harness.py) zove isti `create_app()`, pa mjeri iste slojeve po
+zahtjevu kao produkcija (JWT + blocklist, profiling, admission, metrike,
+blueprintovi). Odvojeno od app.py jer import app.py pokreće monkey patch
+i spaja se na Redis message queue.
+"""
+
+import json
+import mimetypes
+import os
+import re
+import time
+
+from bson.errors import InvalidId
+from flask import Flask, Response, g, jsonify, request, send_from_directory
+from flask_jwt_extended import JWTManager
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    Counter,
+    Histogram,
+    generate_latest,
+)
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+import admission
+import request_profiling
+import stripe_service
+import webhook_inbox
+from extensions import limiter, redis_client
+from routes import ALL_BLUEPRINTS
+from tasks import process_stripe_event
+from upload_service import UPLOAD_DIR, is_content_addressed, resolve_upload
+
+JWT_SECRET = os.environ.get("JWT_SECRET", "dev-secret-change-me")
+if JWT_SECRET == "dev-secret-change-me":
+    print(
+        "[SECURITY] UPOZORENJE: JWT_SECRET nije postavljen — koristi se dev tajna. "
+        "Za produkciju postavi JWT_SECRET u .env (openssl rand -hex 32)."
+    )
+
+# Posluživanje uploada: NGINX (X-Accel-Redirect) ili Flask. Uključuje se samo
+# kad sav /api/uploads promet ide kroz NGINX admina (compose: Traefik router
+# `uploads`) — odluka je isključivo konfiguracija, ne header klijenta.
+UPLOADS_ACCEL_REDIRECT = os.environ.get("UPLOADS_ACCEL_REDIRECT", "0") == "1"
+UPLOADS_ACCEL_PREFIX = os.environ.get("UPLOADS_ACCEL_PREFIX", "/_uploads")
+UPLOAD_IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+UPLOAD_LEGACY_MAX_AGE = 24 * 3600
+UPLOAD_FALLBACK_MAX_AGE = 60
+
+# =========================
+# PROMETHEUS METRIKE
+# =========================
+
+REQUEST_COUNT = Counter(
+    "http_requests_total",
+    "Total HTTP requests",
+    ["method", "endpoint", "status"]
+)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency",
+    ["endpoint"]
+)
+
+
+def create_app(name=__name__, config=None):
+    """
+    Flask app sa svim HTTP rutama i slojevima po zahtjevu. `config` se
+    primijeni prije inicijalizacije ekstenzija (npr. RATELIMIT_ENABLED).
+    """
+    app = Flask(name)
+    # Traefik postavlja X-Forwarded-* — bez ovoga rate limiter vidi samo IP proxyja
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1, x_proto=1, x_host=1)
+    app.config["SECRET_KEY"] = JWT_SECRET
+    app.config["JWT_SECRET_KEY"] = JWT_SECRET
+    app.config["JWT_ACCESS_TOKEN_EXPIRES"] = 60 * 60 * 12       # 12h
+    app.config["JWT_REFRESH_TOKEN_EXPIRES"] = 60 * 60 * 24 * 30  # 30 dana
+    app.config["MAX_CONTENT_LENGTH"] = 10 * 1024 * 1024          # 10 MB upload limit
+    app.config.update(config or {})
+
+    jwt = JWTManager(app)
+    limiter.init_app(app)
+
+    @jwt.token_in_blocklist_loader
+    def token_revoked(_jwt_header, jwt_payload):
+        """Logout/rotacija dodaju jti na blocklist u Redisu (vidi routes/auth.py)."""
+        try:
+            return redis_client.exists(f"revoked_jwt:{jwt_payload['jti']}") == 1
+        except Exception:
+            # Redis nedostupan — ne obaraj autentikaciju zbog infrastrukture
+            return False
+
+    @app.before_request
+    def start_timer():
+        g.start_time = time.time()
+        request_profiling.start_request()
+
+    # Nakon start_timera — i odbijeni (503) zahtjevi ulaze u metrike
+    app.before_request(admission.admit)
+    app.teardown_request(admission.release)
+
+    @app.after_request
+    def record_metrics(response):
+        # Preskoči metrics i websocket promet
+        if request.path.startswith("/metrics") or request.path.startswith("/socket.io"):
+            return response
+
+        latency = time.time() - g.start_time
+        # Koristimo rutu (url_rule) umjesto sirove putanje da ne eksplodira kardinalnost
+        endpoint = request.url_rule.rule if request.url_rule else request.path
+
+        REQUEST_LATENCY.labels(endpoint=endpoint).observe(latency)
+        REQUEST_COUNT.labels(
+            method=request.method,
+            endpoint=endpoint,
+            status=response.status_code
+        ).inc()
+
+        # Mongo/Redis/Stripe round-tripovi i vrijeme po ruti (+ opcionalni Server-Timing)
+        return request_profiling.finish_request(endpoint, response, latency)
+
+    @app.route("/metrics")
+    def metrics():
+        return Response(generate_latest(), mimetype=CONTENT_TYPE_LATEST)
+
+    # =========================
+    # BLUEPRINTOVI
+    # =========================
+
+    for bp in ALL_BLUEPRINTS:
+        app.register_blueprint(bp)
+
+    # =========================
+    # STRIPE WEBHOOK
+    # =========================
+
+    @app.route('/api/webhooks/stripe', methods=['POST'])
+    def stripe_webhook():
+        payload = request.get_data()
+        sig_header = request.headers.get('Stripe-Signature')
+        try:
+            stripe_service.construct_webhook_event(payload, sig_header)
+        except Exception:
+            return jsonify({"error": "Invalid"}), 400
+
+        # Potpis je valjan → spremi sirovi event i odmah potvrdi; obradu radi
+        # Celery (webhook_inbox). Ako broker nije dostupan, event čeka sweeper.
+        event = json.loads(payload)
+        if webhook_inbox.ingest(event):
+            try:
+                process_stripe_event.delay(event["id"])
+            except Exception as exc:
+                print(f"[webhook] Enqueue nije uspio ({event['id']}): {exc}")
+
+        return jsonify({"status": "ok"}), 200
+
+    # =========================
+    # OSTALO
+    # =========================
+
+    @app.route("/api/uploads/<folder>/<filename>")
+    def serve_upload(folder, filename):
+        """
+        Servira lokalno spremljene slike (razvoj bez Cloudinaryja).
+
+        sha256 imena su nepromjenjiva → godišnji `immutable` cache. Varijanta
+        koja se još generira vraća original s kratkim cacheom. Uz
+        UPLOADS_ACCEL_REDIRECT=1 bajtove šalje NGINX (X-Accel-Redirect) pa
+        gevent worker ne drži sliku; bez njega send_from_directory (ETag,
+        If-None-Match/If-Modified-Since i Range).
+        """
+        if not re.fullmatch(r"[A-Za-z0-9_-]+", folder):
+            return jsonify({"error": "Ruta ne postoji"}), 404
+        served = resolve_upload(folder, filename)
+        if not os.path.isfile(os.path.join(UPLOAD_DIR, folder, served)):
+            return jsonify({"error": "Datoteka ne postoji"}), 404
+
+        if served != filename:
+            max_age, immutable = UPLOAD_FALLBACK_MAX_AGE, False
+        elif is_content_addressed(served):
+            max_age, immutable = UPLOAD_IMMUTABLE_MAX_AGE, True
+        else:
+            max_age, immutable = UPLOAD_LEGACY_MAX_AGE, False
+        cache_control = f"public, max-age={max_age}" + (", immutable" if immutable else "")
+
+        if UPLOADS_ACCEL_REDIRECT:
+            response = Response(status=200)
+            response.headers["X-Accel-Redirect"] = f"{UPLOADS_ACCEL_PREFIX}/{folder}/{served}"
+            response.headers["Content-Type"] = (
+                mimetypes.guess_type(served)[0] or "application/octet-stream"
+            )
+        else:
+            response = send_from_directory(
+                os.path.join(UPLOAD_DIR, folder), served, max_age=max_age, conditional=True
+            )
+        response.headers["Cache-Control"] = cache_control
+        return response
+
+    @app.route("/api/health")
+    def health():
+        return jsonify({"status": "ok", "service": "nightclub-manager-backend"})
+
+    @app.errorhandler(InvalidId)
+    def invalid_object_id(_):
+        return jsonify({"error": "Neispravan ID"}), 400
+
+    @app.errorhandler(404)
+    def not_found(_):
+        return jsonify({"error": "Ruta ne postoji"}), 404
+
+    @app.errorhandler(413)
+    def payload_too_large(_):
+        return jsonify({"error": "Datoteka je prevelika (najviše 10 MB)"}), 413
+
+    @app.errorhandler(415)
+    def unsupported_media(exc):
+        return jsonify({"error": exc.description}), 415
+
+    @app.errorhandler(429)
+    def rate_limited(_):
+        return jsonify({"error": "Previše zahtjeva — pokušajte ponovno kasnije"}), 429
+
+    @app.errorhandler(500)
+    def server_error(exc):
+        return jsonify({"error": "Interna greška servera"}), 500
+
+    return app
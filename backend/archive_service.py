@@ -0,0 +1,148 @@
+"""
+Arhiva završenih evenata — hot/cold razdvajanje karata, rezervacija i narudžbi.
+
+`tickets`, `table_reservations` i `drink_orders` rastu zauvijek, a vrući
+upiti (moje karte, expiry, podsjetnici, liste gostiju) ne trebaju prošle
+sezone. Celery task `archive_finished_events` svaki dan uzme evente starije
+od ARCHIVE_AFTER_DAYS i njihove dokumente preseli u `<kolekcija>_archive`
+(blok kompresija ARCHIVE_BLOCK_COMPRESSOR, db.py):
+
+1. kopija u batchevima (bulk_write ReplaceOne upsert — ponovljivo)
+2. event dobije `archived_at` — od tog trenutka čitanja idu u arhivu
+3. brisanje iz vruće kolekcije samo dokumenata identičnih arhivskoj kopiji
+   (`$$ROOT` == kopija, atomarno po dokumentu); ono što je promijenjeno
+   nakon kopiranja (kasni webhook, refund) kopira se ponovno i briše u
+   sljedećem krugu, do ARCHIVE_PURGE_ROUNDS
+
+`archive_status` ("copied" → "done") čini task sigurnim za prekid: sljedeći
+run nastavlja gdje je stao, a event s dokumentima koji se i dalje mijenjaju
+ostaje "copied" do idućeg runa. Čitanja su transparentna — rute po eventu biraju
+kolekciju kroz `for_event`, a povijest korisnika (`recent`) nadopuni vruće
+rezultate iz arhive.
+"""
+
+import os
+from datetime import datetime, timedelta
+
+from pymongo import DeleteOne, ReplaceOne
+
+from db import (
+    drink_orders_archive_col,
+    drink_orders_col,
+    events_col,
+    table_reservations_archive_col,
+    table_reservations_col,
+    tickets_archive_col,
+    tickets_col,
+)
+
+# Mora biti dulje od prozora admin dashboarda (30 dana kupnje/narudžbi)
+ARCHIVE_AFTER_DAYS = int(os.environ.get("ARCHIVE_AFTER_DAYS", "120"))
+ARCHIVE_BATCH_SIZE = int(os.environ.get("ARCHIVE_BATCH_SIZE", "1000"))
+# Gornja granica po runu — prvi run na staroj bazi ne smije trajati satima
+ARCHIVE_EVENTS_PER_RUN = int(os.environ.get("ARCHIVE_EVENTS_PER_RUN", "20"))
+# Krugovi kopija → brisanje za dokumente promijenjene između kopije i brisanja
+ARCHIVE_PURGE_ROUNDS = 3
+
+ARCHIVED_COLLECTIONS = [
+    (tickets_col, tickets_archive_col),
+    (table_reservations_col, table_reservations_archive_col),
+    (drink_orders_col, drink_orders_archive_col),
+]
+_ARCHIVE_OF = {hot.name: cold for hot, cold in ARCHIVED_COLLECTIONS}
+
+
+def for_event(col, event):
+    """Kolekcija u kojoj su dokumenti eventa (vruća ili arhiva)."""
+    return _ARCHIVE_OF[col.name] if event.get("archived_at") else col
+
+
+def recent(col, query, sort_field, limit):
+    """
+    Najnovijih `limit` dokumenata iz vruće kolekcije, nadopunjeno iz arhive
+    samo kad vrućih nema dovoljno (aktivni korisnik ne plaća upit u arhivu).
+    """
+    docs = list(col.find(query).sort(sort_field, -1).limit(limit))
+    if len(docs) < limit:
+        docs += _ARCHIVE_OF[col.name].find(query).sort(sort_field, -1).limit(limit - len(docs))
+        docs.sort(key=lambda d: d.get(sort_field) or datetime.min, reverse=True)
+    return docs
+
+
+def _copy(hot, cold, event_id):
+    copied = 0
+    batch = []
+    for doc in hot.find({"event_id": event_id}, batch_size=ARCHIVE_BATCH_SIZE):
+        batch.append(ReplaceOne({"_id": doc["_id"]}, doc, upsert=True))
+        if len(batch) >= ARCHIVE_BATCH_SIZE:
+            cold.bulk_write(batch, ordered=False)
+            copied += len(batch)
+            batch = []
+    if batch:
+        cold.bulk_write(batch, ordered=False)
+        copied += len(batch)
+    return copied
+
+
+def _purge(hot, cold, event_id):
+    """
+    Briše iz vruće kolekcije samo dokumente koji su i dalje identični svojoj
+    kopiji u arhivi; promijenjeni nakon kopiranja ostaju. Vraća broj obrisanih.
+    """
+    purged = 0
+    batch = []
+    for doc in cold.find({"event_id": event_id}, batch_size=ARCHIVE_BATCH_SIZE):
+        batch.append(DeleteOne({
+            "_id": doc["_id"],
+            "$expr": {"$eq": ["$$ROOT", {"$literal": doc}]},
+        }))
+        if len(batch) >= ARCHIVE_BATCH_SIZE:
+            purged += hot.bulk_write(batch, ordered=False).deleted_count
+            batch = []
+    if batch:
+        purged += hot.bulk_write(batch, ordered=False).deleted_count
+    return purged
+
+
+def _purge_settled(hot, cold, event_id):
+    """
+    Brisanje pa ponovna kopija onoga što se u međuvremenu promijenilo, do
+    ARCHIVE_PURGE_ROUNDS krugova. True ako je vruća strana eventa prazna.
+    """
+    for _ in range(ARCHIVE_PURGE_ROUNDS):
+        _purge(hot, cold, event_id)
+        if hot.count_documents({"event_id": event_id}, limit=1) == 0:
+            return True
+        _copy(hot, cold, event_id)
+    return False
+
+
+def archive_event(event):
+    """Seli dokumente jednog eventa u arhivu; vraća broj po kolekciji."""
+    counts = {}
+    if event.get("archive_status") != "copied":
+        for hot, cold in ARCHIVED_COLLECTIONS:
+            counts[hot.name] = _copy(hot, cold, event["_id"])
+        events_col.update_one({"_id": event["_id"]}, {"$set": {
+            "archive_status": "copied",
+            "archived_at": datetime.utcnow(),
+            "archived_counts": counts,
+        }})
+    settled = [_purge_settled(hot, cold, event["_id"]) for hot, cold in ARCHIVED_COLLECTIONS]
+    if all(settled):
+        events_col.update_one({"_id": event["_id"]}, {"$set": {"archive_status": "done"}})
+    return counts
+
+
+def archive_finished_events(now=None):
+    """Arhivira do ARCHIVE_EVENTS_PER_RUN završenih evenata; vraća njihov broj."""
+    cutoff = (now or datetime.utcnow()) - timedelta(days=ARCHIVE_AFTER_DAYS)
+    events = list(events_col.find(
+        {"date": {"$lt": cutoff}, "archive_status": {"$ne": "done"}},
+        {"_id": 1, "name": 1, "archive_status": 1},
+    ).sort("date", 1).limit(ARCHIVE_EVENTS_PER_RUN))
+    for event in events:
+        counts = archive_event(event)
+        print(f"[archive] {event.get('name')} ({event['_id']}) arhiviran: "
+              f"{counts or 'nastavak brisanja'}")
+    return len(events)
@@ -0,0 +1,13 @@
+"""
+Offline mikro-benchmark — vruće funkcije i rute bez Monga i Redisa.
+
+- stand_ins.py — mongomock/fakeredis umjesto pymongo/redis klijenata
+- harness.py   — Flask app iz app_factory.py (kao app.py), seed (loadtest/seed.py) i mjerenje
+- suites.py    — katalog: serialize, validacije, servisi, GET rute
+- runner.py    — median µs po benchmarku, JSON baseline i usporedba
+               (exit code 1 pri regresiji)
+
+Pokretanje (dev ovisnosti iz requirements-dev.txt):
+    cd backend && python -m bench.runner --save-baseline bench/baseline.json
+    cd backend && python -m bench.runner --baseline bench/baseline.json
+"""
@@ -0,0 +1,238 @@
+"""
+Okruženje benchmarka — Flask app, mali seedani skup podataka i mjerenje.
+
+Importa se tek nakon `stand_ins.install()` (runner.py to radi prvi).
+Podaci se seedaju istim kodom kao load test (loadtest/seed.py), samo u
+mongomock i s fiksnim random seedom, pa svaki run mjeri isti skup.
+"""
+
+import gc
+import io
+import os
+import random
+import statistics
+import time
+from contextlib import redirect_stdout
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from app_factory import create_app
+from auth_utils import issue_tokens
+from db import db, drink_orders_col, table_reservations_col, tickets_col, users_col
+from guest_profile import guest_snapshot
+from loadtest.seed import MENU, seed
+
+BENCH_SEED = int(os.environ.get("BENCH_SEED", "49"))
+BENCH_USERS = int(os.environ.get("BENCH_USERS", "2000"))
+BENCH_TABLES = int(os.environ.get("BENCH_TABLES", "120"))
+# Zauzeti stolovi glavnog eventa (od BENCH_TABLES)
+TAKEN_TABLES = int(os.environ.get("BENCH_TAKEN_TABLES", "40"))
+EVENT_TICKETS = int(os.environ.get("BENCH_EVENT_TICKETS", "400"))
+DEFAULT_REPEAT = int(os.environ.get("BENCH_REPEAT", "7"))
+
+
+class BenchError(Exception):
+    """Benchmark ne mjeri ono što treba (npr. ruta vraća grešku)."""
+
+
+def build_app():
+    """
+    Ista Flask app kao app.py (app_factory.create_app) — bez gevent patcha
+    i Socket.IO servera. Rate limit je isključen.
+    """
+    return create_app("bench", {"RATELIMIT_ENABLED": False})
+
+
+def _event_tickets(users, club_id, event_id, now):
+    """Prodane karte glavnog eventa (seed ih preskače, v. Context)."""
+    tickets_col.insert_many([{
+        "user_id": user["_id"],
+        "event_id": event_id,
+        "club_id": club_id,
+        "ticket_type_id": "lt-regular",
+        "ticket_type_name": "Regular",
+        "price_paid": 25.0,
+        "qr_code": f"bench-door-{i:06d}",
+        "status": "checked_in" if i % 5 == 0 else "valid",
+        "checked_in_at": now if i % 5 == 0 else None,
+        "checked_in_by": None,
+        "stripe_payment_intent_id": None,
+        "purchased_at": now - timedelta(minutes=i),
+        "guest": guest_snapshot(user),
+    } for i, user in enumerate(users)])
+
+
+def _history(user, club_id, events, reservation_id, waiter_id, now):
+    """Karte i narudžbe jednog gosta — za /my rute i konobarsku listu."""
+    tickets = [{
+        "user_id": user["_id"],
+        "event_id": events[i % len(events)],
+        "club_id": club_id,
+        "ticket_type_id": "lt-regular",
+        "ticket_type_name": "Regular",
+        "price_paid": 25.0,
+        "qr_code": f"bench-{i:06d}-{user['_id']}",
+        "status": "valid",
+        "checked_in_at": None,
+        "checked_in_by": None,
+        "stripe_payment_intent_id": None,
+        "purchased_at": now - timedelta(days=i),
+        "guest": guest_snapshot(user),
+    } for i in range(30)]
+    tickets_col.insert_many(tickets)
+
+    statuses = ["placed", "accepted", "preparing", "delivered", "delivered"]
+    orders = [{
+        "user_id": user["_id"],
+        "club_id": club_id,
+        "event_id": events[-1],
+        "table_reservation_id": reservation_id,
+        "table_id": "t-1",
+        "table_label": "VIP1",
+        "section_id": "sec-0",
+        "waiter_id": waiter_id,
+        "items": [{"menu_item_id": item["id"], "name": item["name"], "quantity": 2,
+                   "unit_price": item["price"], "subtotal": item["price"] * 2}
+                  for item in MENU[:3]],
+        "subtotal": 48.0,
+        "coupon_applied": 0.0,
+        "total": 48.0,
+        "payment_method": "cash",
+        "payment_status": "cash_pending" if i % 2 else "paid",
+        "stripe_payment_intent_id": None,
+        "order_status": statuses[i % len(statuses)],
+        "waiter_accepted_at": None,
+        "delivered_at": None,
+        "created_at": now - timedelta(minutes=i),
+    } for i in range(150)]
+    drink_orders_col.insert_many(orders)
+
+
+def _vip_reservation(user, club_id, event_id, table_id, label, section_id, now):
+    """Potvrđena VIP rezervacija s (praktički) neiscrpnim kuponom."""
+    return table_reservations_col.insert_one({
+        "user_id": user["_id"],
+        "event_id": event_id,
+        "club_id": club_id,
+        "table_id": table_id,
+        "table_type": "vip_separe",
+        "table_label": label,
+        "section_id": section_id,
+        "guests_count": 6,
+        "deposit_amount": 150.0,
+        "deposit_paid": True,
+        "deposit_coupon_remaining": 1e9,
+        "status": "confirmed",
+        "active_hold": True,
+        "cancellation_deadline": now,
+        "reminder_sent": False,
+        "checked_in_at": None,
+        "checked_in_by": None,
+        "created_at": now,
+        "guest": guest_snapshot(user),
+    }).inserted_id
+
+
+def _taken_tables(users, club_id, event_id, table_ids, now):
+    """Dio stolova glavnog eventa je zauzet — dostupnost i mapa nisu prazne."""
+    table_reservations_col.insert_many([{
+        "user_id": user["_id"],
+        "event_id": event_id,
+        "club_id": club_id,
+        "table_id": table_id,
+        "table_type": "standard",
+        "table_label": f"S{table_id[2:]}",
+        "guests_count": 4,
+        "deposit_amount": 0.0,
+        "deposit_paid": False,
+        "deposit_coupon_remaining": 0.0,
+        "status": "confirmed",
+        "active_hold": True,
+        "reminder_sent": False,
+        "checked_in_at": None,
+        "created_at": now,
+        "guest": guest_snapshot(user),
+    } for user, table_id in zip(users, table_ids)])
+
+
+class Context:
+    """Seedani podaci, test klijent i tokeni koje benchmarkovi dijele."""
+
+    def __init__(self):
+        random.seed(BENCH_SEED)
+        # Karte seed dodaje s array_filters koje mongomock ne podržava
+        with redirect_stdout(io.StringIO()):
+            manifest = seed(db, n_clubs=2, n_events=3, n_tables=BENCH_TABLES,
+                            n_users=BENCH_USERS, tickets_ratio=0)
+        now = datetime.utcnow()
+        club = manifest["clubs"][0]
+        users = list(users_col.find().sort("email", 1))
+
+        self.club_id = ObjectId(club["club_id"])
+        self.events = [ObjectId(e) for e in club["events"]]
+        self.main_event = ObjectId(club["main_event"])
+        self.standard_tables = club["standard_tables"]
+        self.menu_items = [item["id"] for item in MENU]
+        self.guest, self.reserver, self.orderer = users[0], users[1], users[2]
+        self.waiter_id = ObjectId(club["waiter_ids"][0])
+
+        self.reservation_id = _vip_reservation(
+            self.guest, self.club_id, self.main_event, "t-1", "VIP1", "sec-0", now)
+        self.order_reservation_id = _vip_reservation(
+            self.orderer, self.club_id, self.main_event, "t-11", "VIP11", "sec-2", now)
+        _taken_tables(users[3:], self.club_id, self.main_event,
+                      self.standard_tables[:TAKEN_TABLES], now)
+        _event_tickets(users[3:3 + EVENT_TICKETS], self.club_id, self.main_event, now)
+        _history(self.guest, self.club_id, self.events, self.reservation_id,
+                 self.waiter_id, now)
+
+        self.app = build_app()
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            self.tokens = {
+                "user": issue_tokens(self.guest["_id"], "user")["access_token"],
+                "waiter": issue_tokens(self.waiter_id, "waiter", self.club_id)["access_token"],
+                "hostess": issue_tokens(club["hostess_id"], "hostess",
+                                        self.club_id)["access_token"],
+                "admin": issue_tokens(ObjectId(), "admin", self.club_id)["access_token"],
+            }
+
+    def get(self, path, role=None):
+        headers = {"Authorization": f"Bearer {self.tokens[role]}"} if role else {}
+        resp = self.client.get(path, headers=headers)
+        if resp.status_code != 200:
+            raise BenchError(f"GET {path} → {resp.status_code}: {resp.get_data(as_text=True)}")
+        return resp
+
+
+def measure(run, number, repeat=DEFAULT_REPEAT, reset=None):
+    """
+    Vrijeme po pozivu (µs) kroz `repeat` rundi od `number` poziva.
+
+    Prije mjerenja jedan poziv zagrije cacheve (mapa stolova, JWT);
+    `reset` vraća stanje prije svake runde i ne ulazi u mjerenje. GC je
+    isključen unutar runde, kao u timeitu.
+    """
+    if reset:
+        reset()
+    run()
+    rounds = []
+    for _ in range(repeat):
+        if reset:
+            reset()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            for _ in range(number):
+                run()
+            rounds.append((time.perf_counter() - start) / number * 1e6)
+        finally:
+            gc.enable()
+    return {
+        "number": number,
+        "repeat": repeat,
+        "median_us": round(statistics.median(rounds), 2),
+        "min_us": round(min(rounds), 2),
+        "max_us": round(max(rounds), 2),
+    }
@@ -0,0 +1,109 @@
+"""
+Mikro-benchmark runner — vrijeme po pozivu za katalog iz suites.py.
+
+Rezultat je median/min/max µs po benchmarku; `--save-baseline` ga sprema
+kao JSON, a `--baseline` uspoređuje s pohranjenim i vraća exit code 1 kad
+je išta sporije od tolerancije (default 25 %). Uspoređuje se najbolja
+runda (min) — kao kod timeita, najmanje ovisi o šumu stroja. Baseline se
+snima na istom stroju prije promjene, a usporedba nakon nje.
+
+    python -m bench.runner --save-baseline bench/baseline.json
+    python -m bench.runner --baseline bench/baseline.json --only GET
+"""
+
+# Zamjene za Mongo/Redis moraju biti na mjestu prije importa db/extensions
+from bench import stand_ins
+
+stand_ins.install()
+
+import argparse
+import json
+import os
+import platform
+import sys
+from datetime import datetime
+
+from bench.harness import Context, measure
+from bench.suites import BENCHMARKS
+
+DEFAULT_TOLERANCE = float(os.environ.get("BENCH_TOLERANCE", "0.25"))
+
+
+def run(only=None):
+    ctx = Context()
+    results = {}
+    for name, spec in BENCHMARKS.items():
+        if only and only not in name:
+            continue
+        fn, reset = spec["factory"](ctx)
+        results[name] = measure(fn, spec["number"], reset=reset)
+        r = results[name]
+        print(f"  {name:<52} {r['median_us']:>10.1f} µs  "
+              f"(min {r['min_us']:.1f}, max {r['max_us']:.1f})")
+    return results
+
+
+def environment():
+    return {"python": platform.python_version(), "machine": platform.node()}
+
+
+def compare(baseline, results, tolerance):
+    """Lista regresija (min sporiji od baselinea za više od tolerancije)."""
+    base_env = baseline.get("environment", {})
+    if base_env and base_env != environment():
+        print(f"  ! baseline je snimljen na {base_env} — usporedba je samo okvirna")
+
+    regressions = []
+    for name, current in results.items():
+        base = baseline["results"].get(name)
+        if not base:
+            print(f"  {name:<52} novi benchmark (nema u baselineu)")
+            continue
+        ratio = current["min_us"] / base["min_us"] if base["min_us"] else 1.0
+        status = "OK"
+        if ratio > 1 + tolerance:
+            status = "REGRESIJA"
+            regressions.append(
+                f"{name}: {base['min_us']:.1f} → {current['min_us']:.1f} µs "
+                f"({(ratio - 1) * 100:+.0f}%)"
+            )
+        print(f"  {name:<52} {(ratio - 1) * 100:>+6.0f}%  {status}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mikro-benchmark vrućih funkcija i ruta")
+    parser.add_argument("--only", help="samo benchmarkovi čije ime sadrži ovaj tekst")
+    parser.add_argument("--save-baseline", help="spremi rezultat kao baseline (JSON)")
+    parser.add_argument("--baseline", help="usporedi s pohranjenim baselineom")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="dopušteno usporenje (0.25 = 25 %%)")
+    args = parser.parse_args()
+
+    print(f"▶ Benchmark ({len(BENCHMARKS)} u katalogu)")
+    results = run(args.only)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump({
+                "created_at": datetime.utcnow().isoformat(),
+                "environment": environment(),
+                "results": results,
+            }, f, indent=2, ensure_ascii=False)
+        print(f"✔ Baseline spremljen: {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print(f"▶ Usporedba s {args.baseline} (tolerancija {args.tolerance:.0%})")
+        regressions = compare(baseline, results, args.tolerance)
+        if regressions:
+            print("✘ Regresije:")
+            for line in regressions:
+                print(f"  - {line}")
+            sys.exit(1)
+        print("✔ Bez regresija")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+"""
+In-memory zamjene za MongoDB i Redis — benchmark radi bez ijednog servisa.
+
+`install()` se mora pozvati PRIJE prvog importa `db`, `extensions` ili
+`realtime`: oni klijente grade pri importu, pa se zamjenjuju same klase
+(pymongo.MongoClient → mongomock, redis.Redis → fakeredis). Sve ostalo
+(rute, servisi, serializacija) je stvarni produkcijski kod.
+
+mongomock i fakeredis su samo dev ovisnosti (requirements-dev.txt).
+"""
+
+import os
+
+
+def install():
+    import fakeredis
+    import mongomock
+    import pymongo
+    import redis
+
+    # Tokeni benchmarka potpisuju se lokalno (harness.Context)
+    os.environ.setdefault("JWT_SECRET", "bench-secret-not-for-production-use")
+
+    pymongo.MongoClient = mongomock.MongoClient
+    redis.Redis = fakeredis.FakeRedis
+    redis.StrictRedis = fakeredis.FakeRedis
+    # Socket.IO emitter (realtime.py) se spaja kroz Redis.from_url
+    redis.from_url = fakeredis.FakeRedis.from_url
@@ -0,0 +1,143 @@
+"""
+Katalog benchmarkova — vruće čiste funkcije, servisi i GET rute.
+
+Svaki benchmark je factory koja iz Contexta pripremi ulaz i vrati
+`(run, reset)`: `run` je jedan mjereni poziv, `reset` (ili None) vraća
+stanje baze prije svake runde da npr. rezervacije ne ponestane stolova.
+Mongo je mongomock — brojke mjere Python stranu (serializacija, validacija,
+Flask/JWT sloj), ne planove upita; za njih je loadtest/query_audit.py.
+"""
+
+from itertools import cycle
+
+from auth_utils import serialize
+from db import drink_orders_col, events_col, table_reservations_col, tickets_col
+from order_service import _resolve_items, place_order
+from reservation_service import apply_coupon, create_reservation
+from routes.events import _normalize_ticket_types
+from routes.menu import _normalize_categories
+
+BENCHMARKS = {}
+
+
+def benchmark(name, number):
+    def register(factory):
+        BENCHMARKS[name] = {"factory": factory, "number": number}
+        return factory
+    return register
+
+
+# ---------- čiste funkcije ----------
+
+@benchmark("serialize(event)", number=2000)
+def bench_serialize_event(ctx):
+    event = events_col.find_one({"_id": ctx.main_event})
+    return lambda: serialize(event), None
+
+
+@benchmark("serialize(200 tickets)", number=20)
+def bench_serialize_tickets(ctx):
+    tickets = list(tickets_col.find({"event_id": ctx.main_event}).limit(200))
+    return lambda: serialize(tickets), None
+
+
+@benchmark("_resolve_items", number=1000)
+def bench_resolve_items(ctx):
+    raw = [{"menu_item_id": item_id, "quantity": 2} for item_id in ctx.menu_items[:3]]
+    return lambda: _resolve_items(ctx.club_id, raw), None
+
+
+@benchmark("_normalize_ticket_types", number=2000)
+def bench_normalize_ticket_types(ctx):
+    raw = [{
+        "id": f"tt-{i}" if i % 2 else None,
+        "name": f"Tip {i}",
+        "price": str(10 + i * 5),
+        "total_quantity": "500",
+        "sale_start": "2026-07-01T18:00:00Z",
+        "sale_end": "2026-08-01T23:00:00.000Z",
+    } for i in range(6)]
+    return lambda: _normalize_ticket_types(raw), None
+
+
+@benchmark("_normalize_categories", number=200)
+def bench_normalize_categories(ctx):
+    raw = [{
+        "name": f"Kategorija {c}",
+        "items": [{
+            "id": f"item-{c}-{i}" if i % 2 else None,
+            "name": f"Piće {c}-{i}",
+            "price": "8.50",
+            "allergens": ["gluten"] if i % 3 == 0 else None,
+        } for i in range(15)],
+    } for c in range(6)]
+    return lambda: _normalize_categories(raw), None
+
+
+# ---------- servisi (pišu u bazu) ----------
+
+@benchmark("apply_coupon", number=500)
+def bench_apply_coupon(ctx):
+    reservation_id = str(ctx.reservation_id)
+    return lambda: apply_coupon(reservation_id, 42.0), None
+
+
+@benchmark("create_reservation", number=100)
+def bench_create_reservation(ctx):
+    user_id = str(ctx.reserver["_id"])
+    # Na glavnom eventu su stolovi već zauzeti (harness) — ovdje samo ostali
+    slots = [(str(e), t) for e in ctx.events if e != ctx.main_event
+             for t in ctx.standard_tables]
+    state = {}
+
+    def reset():
+        table_reservations_col.delete_many({"user_id": ctx.reserver["_id"]})
+        state["slots"] = cycle(slots)
+
+    def run():
+        event_id, table_id = next(state["slots"])
+        create_reservation(user_id, event_id, table_id, 2)
+
+    return run, reset
+
+
+@benchmark("place_order", number=300)
+def bench_place_order(ctx):
+    user_id = str(ctx.orderer["_id"])
+    reservation_id = str(ctx.order_reservation_id)
+    raw = [{"menu_item_id": item_id, "quantity": 1} for item_id in ctx.menu_items]
+
+    def reset():
+        drink_orders_col.delete_many({"user_id": ctx.orderer["_id"]})
+
+    return lambda: place_order(user_id, reservation_id, raw, "cash"), reset
+
+
+# ---------- GET rute (Flask test client) ----------
+# /api/clubs nije u katalogu: $lookup s `let` mongomock ne podržava
+
+def _get(name, path, role=None, number=200):
+    @benchmark(f"GET {name}", number=number)
+    def factory(ctx):
+        url = path.format(ctx=ctx)
+        return lambda: ctx.get(url, role), None
+    return factory
+
+
+_get("/api/events", "/api/events")
+_get("/api/events?club_id=", "/api/events?club_id={ctx.club_id}")
+_get("/api/events/upcoming", "/api/events/upcoming")
+_get("/api/events/<id>", "/api/events/{ctx.main_event}", number=500)
+_get("/api/reservations/event/<id>", "/api/reservations/event/{ctx.main_event}", number=500)
+_get("/api/floor-maps/event/<id>", "/api/floor-maps/event/{ctx.main_event}")
+_get("/api/floor-maps/event/<id>?format=compact",
+     "/api/floor-maps/event/{ctx.main_event}?format=compact")
+_get("/api/menu/club/<id>", "/api/menu/club/{ctx.club_id}", number=500)
+_get("/api/tickets/my", "/api/tickets/my", role="user")
+_get("/api/reservations/my", "/api/reservations/my", role="user")
+_get("/api/orders/my", "/api/orders/my", role="user")
+_get("/api/orders/waiter", "/api/orders/waiter", role="waiter")
+_get("/api/hostess/event/<id>/guests", "/api/hostess/event/{ctx.main_event}/guests",
+     role="hostess", number=20)
+_get("/api/events/<id>/tickets", "/api/events/{ctx.main_event}/tickets?limit=50",
+     role="admin", number=100)
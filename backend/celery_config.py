@@ -19,6 +19,26 @@ beat_schedule = {
         'task': 'tasks.expire_stale_payments',
         'schedule': 300.0,    # svakih 5 min oslobađa neplaćene rezervacije/karte
     },
+    'provision-stripe-customers': {
+        'task': 'tasks.provision_stripe_customers',
+        'schedule': 5.0,      # red je obično prazan; SPOP je jeftin
+    },
+    'sweep-missing-stripe-customers': {
+        'task': 'tasks.sweep_missing_stripe_customers',
+        'schedule': 3600.0,
+    },
+    'flush-email-outbox': {
+        'task': 'tasks.flush_email_outbox',
+        'schedule': 2.0,      # potvrde kupnje kasne najviše ~2 s, a idu u batchu
+    },
+    'retry-stuck-stripe-events': {
+        'task': 'tasks.retry_stuck_stripe_events',
+        'schedule': 60.0,
+    },
+    'archive-finished-events': {
+        'task': 'tasks.archive_finished_events',
+        'schedule': 86400.0,
+    },
 }
 
 timezone = 'UTC'
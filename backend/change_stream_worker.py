@@ -0,0 +1,312 @@
+"""
+Change stream consumer — jedini izvor real-time događaja i invalidacije.
+
+Samostalni proces (`python change_stream_worker.py`, servis
+`change_stream_worker` u docker-composeu) prati MongoDB change stream za
+events, floor_maps, menus, table_reservations, drink_orders, tickets i users i
+pretvara promjene u:
+
+- ažuriranje cachea zauzetih stolova (table_availability) + `table_updated`;
+  obrisana rezervacija odbacuje cache stolova svog eventa
+- `order_updated` (konobar / bar) za svaku promjenu statusa narudžbe
+- `ticket_updated` (osoblje eventa) — npr. check-in karte
+- `event_updated` (sobe eventa), spojeno na najviše jedno u EMIT_COALESCE_MS
+  — kupnje na flash saleu mijenjaju event (kvote) stotine puta u sekundi
+- `menu_updated` (sobe današnjih/nadolazećih evenata kluba)
+- `floor_map_changed` (editori mape) za izmjene izvan PATCH razlika (PUT,
+  pozadina) — PATCH označi `patched_version`, a razliku emitira ruta
+- `propagate_guest_profile` (Celery) kad se korisniku promijeni ime, email
+  ili telefon — snapshot `guest` na kartama i rezervacijama
+- `live_stats` / `hostess_stats` — snapshot statistika eventa (event_stats.py)
+  nakon promjene karata, rezervacija ili narudžbi, samo za gledane evente i
+  najviše jednom u STATS_PUSH_INTERVAL_MS
+
+Mutacijska mjesta zato više ne moraju ručno zvati realtime.publish.
+Resume token se sprema u `change_stream_state` tek nakon što su događaji
+obrađeni i emitirani (at-least-once), pa restart nastavlja gdje je stao.
+Ako je token prestar (oplog je rotirao), stream kreće od sada, a cache
+zauzetih stolova se briše jer su promjene propuštene.
+
+Change stream zahtijeva replica set — compose pokreće Mongo kao
+jednočlani replica set `rs0`.
+"""
+
+import os
+import time
+from datetime import datetime, timedelta
+
+from prometheus_client import Counter, Gauge, start_http_server
+from pymongo.errors import OperationFailure, PyMongoError
+
+import event_stats
+from db import change_stream_state_col, db, events_col, table_reservations_archive_col
+from guest_profile import GUEST_FIELDS
+from extensions import redis_client
+from order_service import publish_order_update
+from realtime import publish
+from reservation_service import ACTIVE_STATUSES
+from table_availability import AVAILABILITY_KEY_PATTERN, invalidate_taken, table_changed
+from tasks import propagate_guest_profile
+
+WATCHED_COLLECTIONS = [
+    "events", "floor_maps", "menus", "table_reservations", "drink_orders", "tickets",
+    "users",
+]
+STATE_ID = "realtime"
+EMIT_COALESCE_MS = int(os.environ.get("EMIT_COALESCE_MS", "500"))
+CHANGE_STREAM_METRICS_PORT = int(os.environ.get("CHANGE_STREAM_METRICS_PORT", "0"))
+STATS_PUSH_INTERVAL_MS = event_stats.STATS_PUSH_INTERVAL_MS
+
+# Polja čija promjena znači novi status stola / narudžbe
+RESERVATION_FIELDS = {"status", "active_hold"}
+ORDER_FIELDS = {"order_status", "payment_status", "waiter_id"}
+TICKET_STAFF_STATUSES = {"checked_in", "cancelled", "refunded"}
+# ChangeStreamHistoryLost / resume token više nije u oplogu
+HISTORY_LOST_CODES = {280, 286}
+
+CHANGES = Counter(
+    "change_stream_events_total",
+    "Change stream events by collection and operation",
+    ["collection", "operation"],
+)
+
+CHANGE_LAG = Gauge(
+    "change_stream_lag_seconds",
+    "Seconds between the last processed change and now",
+)
+
+
+def _updated_fields(change):
+    description = change.get("updateDescription") or {}
+    fields = set(description.get("updatedFields") or {})
+    fields.update(description.get("removedFields") or [])
+    # "tables.3.x" → "tables"
+    return {f.split(".", 1)[0] for f in fields}
+
+
+def _touches(change, fields):
+    return change["operationType"] in ("insert", "replace") or bool(
+        _updated_fields(change) & fields
+    )
+
+
+def _table_status(reservation):
+    if not reservation.get("active_hold") or reservation.get("status") not in ACTIVE_STATUSES:
+        return "free"
+    return "checked_in" if reservation["status"] == "checked_in" else "reserved"
+
+
+def _upcoming_event_ids(club_id):
+    since = datetime.utcnow() - timedelta(hours=12)
+    return [str(e["_id"]) for e in events_col.find(
+        {"club_id": club_id, "date": {"$gte": since}}, {"_id": 1}
+    )]
+
+
+class ChangeRouter:
+    """Promjena → emit; event_updated se skuplja i šalje u flush()."""
+
+    def __init__(self):
+        self.pending_events = {}
+        self.dirty_stats = set()
+        self.last_stats_push = {}
+        self.deleted_reservations = set()
+
+    def handle(self, change):
+        collection = change["ns"]["coll"]
+        operation = change["operationType"]
+        CHANGES.labels(collection, operation).inc()
+        doc = change.get("fullDocument")
+        handler = getattr(self, f"_on_{collection}", None)
+        if handler and (doc is not None or operation == "delete"):
+            handler(change, doc)
+
+    def _on_table_reservations(self, change, doc):
+        if doc is None:
+            # Delete nosi samo _id — event se razriješi u flush()
+            self.deleted_reservations.add(change["documentKey"]["_id"])
+            return
+        if _touches(change, RESERVATION_FIELDS):
+            table_changed(doc["event_id"], doc["table_id"], _table_status(doc))
+            self.dirty_stats.add(str(doc["event_id"]))
+
+    def _on_drink_orders(self, change, doc):
+        if doc and _touches(change, ORDER_FIELDS):
+            publish_order_update(doc)
+            self.dirty_stats.add(str(doc["event_id"]))
+
+    def _on_tickets(self, change, doc):
+        if not doc or not _touches(change, {"status"}):
+            return
+        self.dirty_stats.add(str(doc["event_id"]))
+        # Potvrde kupnje (pending → valid) su kvote eventa, ne posao za osoblje
+        if doc.get("status") in TICKET_STAFF_STATUSES:
+            publish("ticket_updates", {
+                "ticket_id": str(doc["_id"]),
+                "event_id": str(doc["event_id"]),
+                "status": doc.get("status"),
+                "ticket_type_id": doc.get("ticket_type_id"),
+                "checked_in_at": doc["checked_in_at"].isoformat()
+                if doc.get("checked_in_at") else None,
+            })
+
+    def _on_events(self, change, doc):
+        event_id = str(change["documentKey"]["_id"])
+        if doc is None:
+            self.pending_events[event_id] = {"event_id": event_id, "deleted": True}
+            return
+        pending = self.pending_events.setdefault(event_id, {"event_id": event_id, "fields": set()})
+        pending["fields"] |= _updated_fields(change) or {"*"}
+        pending["is_cancelled"] = bool(doc.get("is_cancelled"))
+        pending["ticket_types"] = [
+            {"id": t.get("id"),
+             "remaining": max(0, (t.get("total_quantity") or 0) - (t.get("sold_quantity") or 0))}
+            for t in doc.get("ticket_types") or []
+        ]
+
+    def _on_menus(self, change, doc):
+        if doc:
+            publish("menu_updates", {
+                "menu_id": str(doc["_id"]),
+                "club_id": str(doc["club_id"]),
+                "event_ids": _upcoming_event_ids(doc["club_id"]),
+            })
+
+    def _on_users(self, change, doc):
+        # Insert nema karata ni rezervacija — samo izmjena profila
+        if doc and change["operationType"] != "insert" and _touches(change, set(GUEST_FIELDS)):
+            propagate_guest_profile.delay(str(doc["_id"]))
+
+    def _on_floor_maps(self, change, doc):
+        # PATCH razliku emitira sama ruta (`floor_map_updated`)
+        if doc and doc.get("patched_version") != doc.get("version", 0):
+            publish("floor_map_changes", {
+                "map_id": str(doc["_id"]),
+                "version": doc.get("version", 0),
+            })
+
+    def flush(self):
+        for payload in self.pending_events.values():
+            if "fields" in payload:
+                payload["fields"] = sorted(payload["fields"])
+            publish("event_updates", payload)
+        self.pending_events.clear()
+        self._flush_deleted_reservations()
+        self._flush_stats()
+
+    def _flush_deleted_reservations(self):
+        """
+        Obrisane rezervacije: event se čita iz arhivske kopije (brisanje radi
+        archive_service nakon kopiranja) i njegov cache stolova se odbacuje.
+        Za brisanje mimo arhive event nije poznat — odbaci se cijeli cache.
+        """
+        if not self.deleted_reservations:
+            return
+        ids = list(self.deleted_reservations)
+        self.deleted_reservations.clear()
+        archived = {d["_id"]: d["event_id"] for d in table_reservations_archive_col.find(
+            {"_id": {"$in": ids}}, {"event_id": 1},
+        )}
+        for event_id in set(archived.values()):
+            invalidate_taken(event_id)
+            self.dirty_stats.add(str(event_id))
+        if len(archived) < len(ids):
+            _drop_availability_cache()
+
+    def _flush_stats(self):
+        now = time.monotonic()
+        for event_id in list(self.dirty_stats):
+            if (now - self.last_stats_push.get(event_id, 0)) * 1000 < STATS_PUSH_INTERVAL_MS:
+                continue  # ostaje prljav do sljedećeg flusha
+            self.dirty_stats.discard(event_id)
+            if not event_stats.is_watched(event_id):
+                # Nitko ne gleda — ne računaj, ali ne ostavljaj zastarjeli snapshot
+                event_stats.invalidate(event_id)
+                continue
+            self.last_stats_push[event_id] = now
+            try:
+                event_stats.refresh(event_id)
+            except PyMongoError as exc:
+                print(f"[change_stream] Statistike eventa {event_id} nisu osvježene: {exc}")
+
+    def has_pending(self):
+        return bool(self.pending_events or self.dirty_stats or self.deleted_reservations)
+
+
+def _load_token():
+    state = change_stream_state_col.find_one({"_id": STATE_ID})
+    return (state or {}).get("resume_token")
+
+
+def _save_token(token):
+    change_stream_state_col.update_one(
+        {"_id": STATE_ID},
+        {"$set": {"resume_token": token, "updated_at": datetime.utcnow()}},
+        upsert=True,
+    )
+
+
+def _drop_availability_cache():
+    """Propuštene promjene → cache zauzetih stolova se puni iznova iz Monga."""
+    for key in redis_client.scan_iter(match=AVAILABILITY_KEY_PATTERN, count=500):
+        redis_client.delete(key)
+
+
+def run():
+    pipeline = [{"$match": {
+        "ns.coll": {"$in": WATCHED_COLLECTIONS},
+        "operationType": {"$in": ["insert", "update", "replace", "delete"]},
+        # users: samo izmjene polja gosta (ne npr. stripe_customer_id iz
+        # provisioninga) — inače bi svaka promjena platila updateLookup
+        "$or": [
+            {"ns.coll": {"$ne": "users"}},
+            {"operationType": "replace"},
+            *({f"updateDescription.updatedFields.{f}": {"$exists": True}}
+              for f in GUEST_FIELDS),
+        ],
+    }}]
+    router = ChangeRouter()
+    backoff = 1
+
+    while True:
+        token = _load_token()
+        try:
+            with db.watch(pipeline, full_document="updateLookup", resume_after=token,
+                          max_await_time_ms=EMIT_COALESCE_MS) as stream:
+                print(f"[change_stream] Slušam {', '.join(WATCHED_COLLECTIONS)}"
+                      f" ({'nastavak' if token else 'od sada'})")
+                backoff = 1
+                last_flush = time.monotonic()
+                dirty = False
+                while stream.alive:
+                    change = stream.try_next()
+                    if change is not None:
+                        router.handle(change)
+                        dirty = True
+                        cluster_time = change.get("clusterTime")
+                        if cluster_time is not None:
+                            CHANGE_LAG.set(max(0.0, time.time() - cluster_time.time))
+                    if dirty and (change is None
+                                  or (time.monotonic() - last_flush) * 1000 >= EMIT_COALESCE_MS):
+                        router.flush()
+                        _save_token(stream.resume_token)
+                        # Prigušene statistike čekaju idući flush
+                        last_flush, dirty = time.monotonic(), router.has_pending()
+        except OperationFailure as exc:
+            if exc.code in HISTORY_LOST_CODES:
+                print(f"[change_stream] Resume token je prestar — kreće od sada: {exc}")
+                change_stream_state_col.delete_one({"_id": STATE_ID})
+                _drop_availability_cache()
+                continue
+            print(f"[change_stream] Greška streama: {exc}")
+        except PyMongoError as exc:
+            print(f"[change_stream] Mongo nedostupan: {exc}")
+        time.sleep(backoff)
+        backoff = min(30, backoff * 2)
+
+
+if __name__ == "__main__":
+    if CHANGE_STREAM_METRICS_PORT:
+        start_http_server(CHANGE_STREAM_METRICS_PORT)
+        print(f"[metrics] Change stream metrike na :{CHANGE_STREAM_METRICS_PORT}/metrics")
+    run()
@@ -0,0 +1,58 @@
+"""
+Stripe customeri unaprijed — skida `Customer.create` s puta kupnje.
+
+Korisnik se stavlja u Redis set (db3) kad se registrira, prijavi OAuthom
+ili pokaže interes za event (join_event soba, pregled stranice eventa).
+Celery task `provision_stripe_customers` svakih nekoliko sekundi prazni set
+u batchevima i kreira customere paralelno (ograničeno bulkheadom gatewaya),
+pa je na flash sale `stripe_customer_id` u pravilu već postavljen.
+
+Kreiranje je idempotentno: Stripe idempotency key je `customer:<user_id>`,
+a u Mongo se upisuje samo ako je polje još prazno — inline fallback na
+kupnji i task se ne mogu posvađati oko dva različita customera.
+"""
+
+import stripe_service
+from db import users_col
+from extensions import redis_client
+
+PROVISION_QUEUE_KEY = "stripe_customer_queue"
+
+
+def queue_customers(user_ids):
+    """Stavi korisnike u red za provisioning; greška Redisa nije fatalna."""
+    ids = [str(uid) for uid in user_ids if uid]
+    if not ids:
+        return
+    try:
+        redis_client.sadd(PROVISION_QUEUE_KEY, *ids)
+    except Exception as exc:
+        print(f"[customers] Queue nije uspio: {exc}")
+
+
+def queue_customer(user):
+    if user and not user.get("stripe_customer_id"):
+        queue_customers([user["_id"]])
+
+
+def pop_batch(size):
+    return redis_client.spop(PROVISION_QUEUE_KEY, size) or []
+
+
+def ensure_customer(user):
+    """
+    Vraća stripe_customer_id, kreira ga ako ne postoji. Atomarni guard
+    (`stripe_customer_id: None`) čuva customera kojeg je netko upisao prvi.
+    """
+    if user.get("stripe_customer_id"):
+        return user["stripe_customer_id"]
+    customer_id = stripe_service.get_or_create_stripe_customer(user)
+    result = users_col.find_one_and_update(
+        {"_id": user["_id"], "stripe_customer_id": None},
+        {"$set": {"stripe_customer_id": customer_id}},
+    )
+    if result is None:
+        stored = users_col.find_one({"_id": user["_id"]}, {"stripe_customer_id": 1})
+        customer_id = (stored or {}).get("stripe_customer_id") or customer_id
+    user["stripe_customer_id"] = customer_id
+    return customer_id
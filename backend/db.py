@@ -6,12 +6,62 @@ Sve kolekcije nove sheme na jednom mjestu + kreiranje indeksa pri startu.
 
 import os
 
-from pymongo import ASCENDING, DESCENDING, MongoClient
+from pymongo import ASCENDING, DESCENDING, MongoClient, ReadPreference
+
+from db_monitoring import event_listeners
 
 MONGO_URI = os.environ.get("MONGO_URI", "mongodb://mongo:27017")
 
-client = MongoClient(MONGO_URI, connect=False)
+# Pool je dijeljen između gevent greenleta (API) i Celery taskova u istom
+# procesu — veličina i timeoutovi su podesivi kroz okolinu.
+MONGO_MAX_POOL_SIZE = int(os.environ.get("MONGO_MAX_POOL_SIZE", "50"))
+MONGO_MIN_POOL_SIZE = int(os.environ.get("MONGO_MIN_POOL_SIZE", "5"))
+# Koliko dugo greenlet čeka slobodnu konekciju prije greške (iscrpljen pool)
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.environ.get("MONGO_WAIT_QUEUE_TIMEOUT_MS", "2000"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.environ.get("MONGO_CONNECT_TIMEOUT_MS", "5000"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(
+    os.environ.get("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000")
+)
+# Gornja granica trajanja svake operacije (client-side timeoutMS); 0 = bez limita
+MONGO_TIMEOUT_MS = int(os.environ.get("MONGO_TIMEOUT_MS", "0"))
+
+# Analitika (dashboard, izvještaji) čita sa sekundara kad postoje i ima
+# vlastiti maxTimeMS da teški agregati ne drže konekcije API-ja
+ANALYTICS_READ_PREFERENCE = os.environ.get("ANALYTICS_READ_PREFERENCE", "secondaryPreferred")
+ANALYTICS_MAX_TIME_MS = int(os.environ.get("ANALYTICS_MAX_TIME_MS", "15000"))
+
+# Arhive završenih evenata (archive_service.py) se rijetko čitaju — jača
+# kompresija bloka nego default snappy
+ARCHIVE_BLOCK_COMPRESSOR = os.environ.get("ARCHIVE_BLOCK_COMPRESSOR", "zstd")
+
+_READ_PREFERENCES = {
+    "primary": ReadPreference.PRIMARY,
+    "primaryPreferred": ReadPreference.PRIMARY_PREFERRED,
+    "secondary": ReadPreference.SECONDARY,
+    "secondaryPreferred": ReadPreference.SECONDARY_PREFERRED,
+    "nearest": ReadPreference.NEAREST,
+}
+
+_client_options = {
+    "connect": False,
+    "maxPoolSize": MONGO_MAX_POOL_SIZE,
+    "minPoolSize": MONGO_MIN_POOL_SIZE,
+    "waitQueueTimeoutMS": MONGO_WAIT_QUEUE_TIMEOUT_MS,
+    "connectTimeoutMS": MONGO_CONNECT_TIMEOUT_MS,
+    "serverSelectionTimeoutMS": MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    "event_listeners": event_listeners(),
+}
+if MONGO_TIMEOUT_MS:
+    _client_options["timeoutMS"] = MONGO_TIMEOUT_MS
+
+client = MongoClient(MONGO_URI, **_client_options)
 db = client["mydb"]
+analytics_db = client.get_database(
+    "mydb",
+    read_preference=_READ_PREFERENCES.get(
+        ANALYTICS_READ_PREFERENCE, ReadPreference.SECONDARY_PREFERRED
+    ),
+)
 
 superadmins_col = db["superadmins"]
 clubs_col = db["clubs"]
@@ -26,12 +76,57 @@ table_reservations_col = db["table_reservations"]
 menus_col = db["menus"]
 drink_orders_col = db["drink_orders"]
 reports_col = db["reports"]
+stripe_events_col = db["stripe_events"]
+# Resume token change stream consumera (change_stream_worker.py)
+change_stream_state_col = db["change_stream_state"]
+# HMAC ključevi potpisanih QR kodova po eventu (ticket_signing.py) — odvojeno
+# od eventa jer se dokument eventa javno serializira
+ticket_keys_col = db["ticket_keys"]
+# Hladne kopije dokumenata arhiviranih evenata (archive_service.py)
+tickets_archive_col = db["tickets_archive"]
+table_reservations_archive_col = db["table_reservations_archive"]
+drink_orders_archive_col = db["drink_orders_archive"]
+ARCHIVE_COLLECTIONS = (
+    tickets_archive_col, table_reservations_archive_col, drink_orders_archive_col,
+)
+
+
+def _ensure_archive_collections():
+    """Arhive se kreiraju eksplicitno da bi dobile ARCHIVE_BLOCK_COMPRESSOR."""
+    existing = set(db.list_collection_names())
+    for col in ARCHIVE_COLLECTIONS:
+        if col.name not in existing:
+            db.create_collection(col.name, storageEngine={
+                "wiredTiger": {"configString": f"block_compressor={ARCHIVE_BLOCK_COMPRESSOR}"},
+            })
+
+
+# Jednostruki indeksi starih baza koje pokriva prefiks složenog indeksa (ili
+# ih nijedan upit ne koristi) — samo usporavaju upise i troše RAM.
+# ensure_indexes ih briše; loadtest/query_audit.py javlja nove kao REDUNDANT.
+DROPPED_INDEXES = {
+    "events": ["club_id_1", "is_published_1"],     # (club_id, date), (is_published, date, …)
+    "tickets": ["user_id_1", "event_id_1"],        # (user_id, purchased_at), (event_id, …)
+    "table_reservations": ["user_id_1", "event_id_1"],  # (user_id, created_at), (event_id, …)
+    # (event_id, order_status, created_at); ostali nemaju upit bez club_id/event_id/_id
+    "drink_orders": ["event_id_1", "order_status_1", "waiter_id_1", "table_reservation_id_1"],
+}
+
+
+def _drop_redundant_indexes():
+    for name, indexes in DROPPED_INDEXES.items():
+        existing = db[name].index_information()
+        for index in indexes:
+            if index in existing:
+                db[name].drop_index(index)
+                print(f"[indexes] {name}.{index} obrisan (suvišan, vidi DROPPED_INDEXES).")
 
 
 def ensure_indexes():
     """
     Kreira sve indekse nove sheme. Idempotentno — pymongo preskače
-    postojeće indekse s istim imenom i opcijama.
+    postojeće indekse s istim imenom i opcijama. Složeni indeksi za vruće
+    upite slijede prijedloge `python -m loadtest.query_audit` (ESR).
     """
     try:
         superadmins_col.create_index([("username", ASCENDING)], unique=True)
@@ -51,26 +146,59 @@ def ensure_indexes():
 
         users_col.create_index([("email", ASCENDING)], unique=True)
         users_col.create_index([("auth_provider_id", ASCENDING)], sparse=True)
+        # sweep_missing_stripe_customers: aktivni bez customera iz zadnjih N dana
+        # (null na ključu hvata i korisnike bez polja)
+        users_col.create_index(
+            [("stripe_customer_id", ASCENDING), ("created_at", ASCENDING)],
+            partialFilterExpression={"is_active": True},
+        )
 
-        events_col.create_index([("club_id", ASCENDING)])
         events_col.create_index([("date", ASCENDING)])
-        events_col.create_index([("is_published", ASCENDING)])
+        # Javni feed: objavljeni po datumu; is_cancelled ($ne) se filtrira na ključevima
+        events_col.create_index(
+            [("is_published", ASCENDING), ("date", ASCENDING), ("is_cancelled", ASCENDING)]
+        )
+        events_col.create_index([("club_id", ASCENDING), ("date", ASCENDING)])
 
-        tickets_col.create_index([("user_id", ASCENDING)])
-        tickets_col.create_index([("event_id", ASCENDING)])
         tickets_col.create_index([("qr_code", ASCENDING)], unique=True)
         tickets_col.create_index([("stripe_payment_intent_id", ASCENDING)], sparse=True)
         # Za expiry task (pending karte starije od TTL-a)
         tickets_col.create_index([("status", ASCENDING), ("purchased_at", ASCENDING)])
+        # Lista gostiju na ulazu: pretraga po snapshotu imena (guest_profile.py)
+        tickets_col.create_index([("event_id", ASCENDING), ("guest.name_norm", ASCENDING)])
+        # Keyset paginacija admin liste i izvoz (exports.py)
+        tickets_col.create_index(
+            [("event_id", ASCENDING), ("purchased_at", DESCENDING), ("_id", DESCENDING)]
+        )
+        tickets_col.create_index([("user_id", ASCENDING), ("purchased_at", DESCENDING)])
+        # Idempotentna kupnja: ponovljeni zahtjev s istim purchase_key
+        tickets_col.create_index(
+            [("user_id", ASCENDING), ("purchase_key", ASCENDING)],
+            partialFilterExpression={"purchase_key": {"$exists": True}},
+        )
+        # Dashboard i dnevni izvještaj: prihod kluba od karata u periodu
+        tickets_col.create_index(
+            [("club_id", ASCENDING), ("status", ASCENDING), ("purchased_at", ASCENDING)]
+        )
 
         floor_maps_col.create_index([("club_id", ASCENDING)])
 
-        table_reservations_col.create_index([("user_id", ASCENDING)])
-        table_reservations_col.create_index([("event_id", ASCENDING)])
         # Za expiry task (pending rezervacije starije od TTL-a)
         table_reservations_col.create_index(
             [("status", ASCENDING), ("created_at", ASCENDING)]
         )
+        table_reservations_col.create_index(
+            [("event_id", ASCENDING), ("guest.name_norm", ASCENDING)]
+        )
+        table_reservations_col.create_index(
+            [("event_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]
+        )
+        table_reservations_col.create_index([("user_id", ASCENDING), ("created_at", DESCENDING)])
+        # Podsjetnici: potvrđene rezervacije sutrašnjih evenata bez poslanog maila
+        table_reservations_col.create_index(
+            [("event_id", ASCENDING), ("status", ASCENDING), ("reminder_sent", ASCENDING)]
+        )
+        table_reservations_col.create_index([("club_id", ASCENDING), ("created_at", ASCENDING)])
         # Garancija da jedan stol na jednom eventu drži najviše jedna aktivna
         # rezervacija (pending/confirmed/checked_in imaju active_hold=True).
         # Partial unique indeks jer Mongo ne podržava $in u partialFilterExpression.
@@ -83,13 +211,46 @@ def ensure_indexes():
 
         menus_col.create_index([("club_id", ASCENDING)])
 
-        drink_orders_col.create_index([("event_id", ASCENDING)])
-        drink_orders_col.create_index([("waiter_id", ASCENDING)])
-        drink_orders_col.create_index([("table_reservation_id", ASCENDING)])
-        drink_orders_col.create_index([("order_status", ASCENDING)])
+        drink_orders_col.create_index([("user_id", ASCENDING), ("created_at", DESCENDING)])
+        # Konobarski i barski prikaz: aktivni statusi, najstarije prvo
+        drink_orders_col.create_index(
+            [("club_id", ASCENDING), ("order_status", ASCENDING), ("created_at", ASCENDING)]
+        )
+        drink_orders_col.create_index(
+            [("event_id", ASCENDING), ("order_status", ASCENDING), ("created_at", ASCENDING)]
+        )
+        # Dashboard i dnevni izvještaj: plaćene narudžbe kluba u periodu
+        drink_orders_col.create_index(
+            [("club_id", ASCENDING), ("payment_status", ASCENDING), ("created_at", ASCENDING)]
+        )
 
         reports_col.create_index([("club_id", ASCENDING), ("date", DESCENDING)])
 
+        # Webhook inbox (_id = Stripe event id): sweeper, backlog i redoslijed po intentu
+        stripe_events_col.create_index([("status", ASCENDING), ("received_at", ASCENDING)])
+        stripe_events_col.create_index(
+            [("payment_intent_id", ASCENDING), ("created", ASCENDING)], sparse=True
+        )
+
+        ticket_keys_col.create_index([("event_id", ASCENDING)], unique=True)
+
+        # Arhive: samo povijest korisnika i admin liste/izvozi po eventu
+        _ensure_archive_collections()
+        tickets_archive_col.create_index([("user_id", ASCENDING), ("purchased_at", DESCENDING)])
+        tickets_archive_col.create_index(
+            [("event_id", ASCENDING), ("purchased_at", DESCENDING), ("_id", DESCENDING)]
+        )
+        table_reservations_archive_col.create_index(
+            [("user_id", ASCENDING), ("created_at", DESCENDING)]
+        )
+        table_reservations_archive_col.create_index(
+            [("event_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]
+        )
+        drink_orders_archive_col.create_index([("user_id", ASCENDING), ("created_at", DESCENDING)])
+        drink_orders_archive_col.create_index([("event_id", ASCENDING)])
+
+        # Tek nakon složenih — upiti nikad ne ostanu bez indeksa
+        _drop_redundant_indexes()
         print("[indexes] MongoDB indeksi (v2 shema) su osigurani.")
     except Exception as exc:
         print(f"[indexes] Greška pri kreiranju indeksa: {exc}")
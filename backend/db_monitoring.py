@@ -0,0 +1,154 @@
+"""
+pymongo event listeneri → Prometheus metrike (connection pool + komande).
+
+Registriraju se na MongoClient u db.py, pa vrijede jednako za API worker
+(gevent greenleti) i Celery worker. Iscrpljenje poola vidi se kao rast
+`mongo_pool_checkout_seconds` i `mongo_pool_checkout_failures_total`
+umjesto kao neobjašnjiva latencija ruta.
+"""
+
+import os
+
+from prometheus_client import Counter, Gauge, Histogram
+from pymongo import monitoring
+
+import request_profiling
+
+# Komande sporije od ovoga broje se u mongo_slow_commands_total
+SLOW_COMMAND_MS = float(os.environ.get("MONGO_SLOW_COMMAND_MS", "100"))
+
+# Interne komande drivera — ne zanimaju nas u metrikama po kolekciji
+_IGNORED_COMMANDS = {
+    "hello", "ismaster", "isMaster", "ping", "saslStart", "saslContinue",
+    "endSessions", "killCursors",
+}
+
+MONGO_COMMAND_LATENCY = Histogram(
+    "mongo_command_duration_seconds",
+    "MongoDB command latency",
+    ["command", "collection"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+
+MONGO_COMMAND_FAILURES = Counter(
+    "mongo_command_failures_total",
+    "Failed MongoDB commands",
+    ["command", "collection"],
+)
+
+MONGO_SLOW_COMMANDS = Counter(
+    "mongo_slow_commands_total",
+    "MongoDB commands slower than MONGO_SLOW_COMMAND_MS",
+    ["command", "collection"],
+)
+
+MONGO_POOL_CHECKOUT_LATENCY = Histogram(
+    "mongo_pool_checkout_seconds",
+    "Time spent waiting for a pooled MongoDB connection",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+
+MONGO_POOL_CHECKOUT_FAILURES = Counter(
+    "mongo_pool_checkout_failures_total",
+    "Failed connection checkouts (timeout = pool exhausted)",
+    ["reason"],
+)
+
+MONGO_POOL_IN_USE = Gauge(
+    "mongo_pool_connections_in_use",
+    "Connections currently checked out of the pool",
+)
+
+MONGO_POOL_OPEN = Gauge(
+    "mongo_pool_connections_open",
+    "Open connections (in use + idle)",
+)
+
+
+class CommandMetricsListener(monitoring.CommandListener):
+    """Latencija i greške po komandi/kolekciji + brojač sporih komandi."""
+
+    def __init__(self):
+        # request_id → (command, collection); succeeded/failed event ne nosi
+        # samu komandu pa naziv kolekcije pamtimo iz started eventa
+        self._inflight = {}
+
+    def started(self, event):
+        if event.command_name in _IGNORED_COMMANDS:
+            return
+        collection = event.command.get(event.command_name)
+        if not isinstance(collection, str):
+            collection = "-"
+        self._inflight[(event.connection_id, event.request_id)] = (
+            event.command_name, collection,
+        )
+
+    def _finish(self, event):
+        return self._inflight.pop((event.connection_id, event.request_id), None)
+
+    def succeeded(self, event):
+        labels = self._finish(event)
+        if not labels:
+            return
+        seconds = event.duration_micros / 1_000_000
+        MONGO_COMMAND_LATENCY.labels(*labels).observe(seconds)
+        request_profiling.record("mongo", seconds)
+        if seconds * 1000 >= SLOW_COMMAND_MS:
+            MONGO_SLOW_COMMANDS.labels(*labels).inc()
+
+    def failed(self, event):
+        labels = self._finish(event)
+        if not labels:
+            return
+        seconds = event.duration_micros / 1_000_000
+        MONGO_COMMAND_LATENCY.labels(*labels).observe(seconds)
+        request_profiling.record("mongo", seconds)
+        MONGO_COMMAND_FAILURES.labels(*labels).inc()
+
+
+class PoolMetricsListener(monitoring.ConnectionPoolListener):
+    """Čekanje na konekciju, konekcije u upotrebi i otvorene konekcije."""
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        MONGO_POOL_OPEN.inc()
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        MONGO_POOL_OPEN.dec()
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        MONGO_POOL_CHECKOUT_FAILURES.labels(reason=str(event.reason)).inc()
+        duration = getattr(event, "duration", None)
+        if duration is not None:
+            MONGO_POOL_CHECKOUT_LATENCY.observe(duration)
+
+    def connection_checked_out(self, event):
+        MONGO_POOL_IN_USE.inc()
+        # `duration` (sekunde) postoji od pymongo 4.7
+        duration = getattr(event, "duration", None)
+        if duration is not None:
+            MONGO_POOL_CHECKOUT_LATENCY.observe(duration)
+
+    def connection_checked_in(self, event):
+        MONGO_POOL_IN_USE.dec()
+
+
+def event_listeners():
+    return [CommandMetricsListener(), PoolMetricsListener()]
@@ -1,67 +1,301 @@
 """
-Email servis — potvrde kupnje i podsjetnici.
+Email servis — potvrde kupnje i podsjetnici, isključivo kroz Celery.
 
-Koristi SendGrid ako je SENDGRID_API_KEY postavljen; u suprotnom samo
-logira (dovoljno za lokalni razvoj bez vanjskih servisa).
+Put plaćanja samo doda kratku poruku u Redis outbox (`queue_*`), bez
+Mongo lookupa i bez vanjskog HTTP-a. Celery task `flush_email_outbox`
+svakih par sekundi:
+
+1. premjesti do EMAIL_FLUSH_SIZE poruka iz outboxa u processing listu;
+   briše ih tek nakon što su svi batchevi predani Celeryju (ack), a greška
+   ili pad workera vraća ih u outbox. Svaka poruka se validira i renderira
+   zasebno — neispravna ide u dead-letter listu i ne blokira ostale
+2. batch-dohvati karte/rezervacije, korisnike i evente (`$in` umjesto
+   dva lookupa po mailu)
+3. grupira poruke po (predložak, event): dijelovi eventa su pred-renderirani
+   i keširani (email_templates.py), a po gostu idu samo `substitutions` —
+   jedan SendGrid multi-personalization zahtjev po eventu (do 1000 gostiju)
+4. potvrda kupnje je jedna poruka (i jedan mail) sa svim kartama kupnje;
+   QR slika karte generira se lijeno i kešira (qr_service.py); u mailu je
+   link na PNG umjesto sirovog UUID-a
+5. svaki zahtjev šalje task `send_email_batch` — rate limit, retry s
+   eksponencijalnim backoffom, jedna keep-alive HTTP sesija po workeru;
+   kad retryji isteknu, samo poruke tog zahtjeva vraćaju se u outbox
+
+Bez SENDGRID_API_KEY mailovi se samo logiraju. Za offline testiranje
+SENDGRID_API_URL se usmjeri na lokalni sink (loadtest/fakes.py).
 """
 
+import html
+import json
 import os
+from datetime import datetime, timezone
 
 import requests
+from bson import ObjectId
+from bson.errors import InvalidId
+from requests.adapters import HTTPAdapter
+
+from email_templates import apply_substitutions, render_for_event, substitutions
+from extensions import redis_client
+from qr_service import qr_image_url
 
 SENDGRID_API_KEY = os.environ.get("SENDGRID_API_KEY")
+# Može se preusmjeriti na lokalni stand-in (loadtest/fakes.py)
+SENDGRID_API_URL = os.environ.get("SENDGRID_API_URL", "https://api.sendgrid.com/v3/mail/send")
 FROM_EMAIL = os.environ.get("EMAIL_FROM", "noreply@nightclub-manager.hr")
+EMAIL_TIMEOUT_SECONDS = float(os.environ.get("EMAIL_TIMEOUT_SECONDS", "10"))
 
+OUTBOX_KEY = "email_outbox"
+OUTBOX_PROCESSING_KEY = "email_outbox:processing"
+# Poruke koje se ne mogu poslati; čuva se zadnjih OUTBOX_DEAD_MAX za uvid
+OUTBOX_DEAD_KEY = "email_outbox:dead"
+OUTBOX_DEAD_MAX = int(os.environ.get("EMAIL_DEAD_LETTER_MAX", "10000"))
+# SendGrid limit personalizacija po zahtjevu
+MAX_PERSONALIZATIONS = 1000
 
-def _send(to_email, subject, body):
-    if not to_email:
-        return
-    if not SENDGRID_API_KEY:
-        print(f"[email] (dev-mode) Za: {to_email} | {subject}\n{body}")
-        return
+
+class EmailDeliveryError(Exception):
+    """SendGrid je vratio grešku koju vrijedi ponoviti (429 / 5xx)."""
+
+
+class EmailRejectedError(Exception):
+    """SendGrid je odbio zahtjev (4xx) — ponavljanje ne pomaže."""
+
+
+_session = None
+
+
+def _http():
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        _session.mount("https://", HTTPAdapter(pool_maxsize=20))
+        _session.mount("http://", HTTPAdapter(pool_maxsize=20))
+    return _session
+
+
+# ---------- put plaćanja: samo outbox ----------
+
+def _enqueue(message):
     try:
-        requests.post(
-            "https://api.sendgrid.com/v3/mail/send",
-            headers={"Authorization": f"Bearer {SENDGRID_API_KEY}"},
-            json={
-                "personalizations": [{"to": [{"email": to_email}]}],
-                "from": {"email": FROM_EMAIL},
-                "subject": subject,
-                "content": [{"type": "text/plain", "value": body}],
-            },
-            timeout=10,
-        )
+        redis_client.rpush(OUTBOX_KEY, json.dumps(message))
     except Exception as exc:
-        print(f"[email] Greška pri slanju: {exc}")
+        print(f"[email] Outbox nije dostupan, mail izgubljen ({message}): {exc}")
+
+
+def queue_ticket_confirmation(tickets):
+    """Jedan mail po kupnji — sve potvrđene karte istog PaymentIntenta."""
+    _enqueue({"template": "ticket_confirmation", "ticket_ids": [str(t["_id"]) for t in tickets]})
+
+
+def queue_reservation_reminder(reservation):
+    _enqueue({"template": "reservation_reminder", "reservation_id": str(reservation["_id"])})
+
+
+# ---------- worker: render + batch ----------
+
+# Atomarno: do ARGV[1] poruka s početka outboxa → kraj processing liste
+_CLAIM_OUTBOX = redis_client.register_script("""
+local items = redis.call('lrange', KEYS[1], 0, tonumber(ARGV[1]) - 1)
+for i = 1, #items do
+    redis.call('rpush', KEYS[2], items[i])
+end
+if #items > 0 then
+    redis.call('ltrim', KEYS[1], #items, -1)
+end
+return items
+""")
+
+
+def claim_outbox(limit):
+    """
+    Preuzmi poruke za flush (sirovi JSON stringovi). Ostatak prethodnog
+    flusha koji nije potvrđen (pad workera) prvo se vraća na početak
+    outboxa pa ide prvi.
+    """
+    requeue_outbox()
+    raw = _CLAIM_OUTBOX(keys=[OUTBOX_KEY, OUTBOX_PROCESSING_KEY], args=[limit])
+    return [m.decode() if isinstance(m, bytes) else m for m in raw]
+
+
+def ack_outbox():
+    redis_client.delete(OUTBOX_PROCESSING_KEY)
 
 
-def send_ticket_confirmation(ticket):
-    from db import events_col, users_col
-    user = users_col.find_one({"_id": ticket["user_id"]})
-    event = events_col.find_one({"_id": ticket["event_id"]})
-    if not user or not event:
+def requeue_outbox():
+    """Processing lista → početak outboxa, istim redoslijedom."""
+    while redis_client.rpoplpush(OUTBOX_PROCESSING_KEY, OUTBOX_KEY) is not None:
+        pass
+
+
+def requeue_messages(messages):
+    """Poruke čije slanje nije prošlo (prolazna greška) → kraj outboxa."""
+    if messages:
+        redis_client.rpush(OUTBOX_KEY, *messages)
+
+
+def dead_letter(messages, reason):
+    """
+    Poruke koje se ne mogu poslati ni ponavljanjem (neispravan JSON, loš id,
+    greška u renderu, SendGrid 4xx) → OUTBOX_DEAD_KEY, da ne blokiraju ostale.
+    """
+    if not messages:
         return
-    _send(
-        user.get("email"),
-        f"Potvrda kupnje karte — {event['name']}",
-        (
-            f"Bok {user.get('name', '')},\n\n"
-            f"tvoja karta za {event['name']} ({event['date']}) je potvrđena.\n"
-            f"Tip karte: {ticket.get('ticket_type_name')}\n"
-            f"QR kod: {ticket.get('qr_code')}\n\n"
-            "Pokaži QR kod hostesi na ulazu. Vidimo se!"
-        ),
-    )
+    print(f"[email] {len(messages)} poruka u dead-letter ({reason}): {messages[:3]}")
+    at = datetime.now(timezone.utc).isoformat()
+    redis_client.rpush(OUTBOX_DEAD_KEY, *(
+        json.dumps({"message": m, "reason": reason, "at": at}) for m in messages
+    ))
+    redis_client.ltrim(OUTBOX_DEAD_KEY, -OUTBOX_DEAD_MAX, -1)
+
+
+def _by_id(col, ids, projection=None):
+    ids = list({i for i in ids if i})
+    return {d["_id"]: d for d in col.find({"_id": {"$in": ids}}, projection)} if ids else {}
+
+
+def _qr_url(qr_code):
+    try:
+        return qr_image_url(qr_code)
+    except Exception as exc:
+        print(f"[email] QR slika nije generirana: {exc}")
+        return qr_code
+
+
+def _parse(raw):
+    """
+    Sirova poruka → (predložak, tuple ObjectId-eva) ili ValueError. Potvrda
+    kupnje nosi sve karte kupnje (`ticket_ids`; stare poruke `ticket_id`).
+    """
+    try:
+        message = json.loads(raw)
+        template = message["template"]
+        if template == "ticket_confirmation":
+            ids = message.get("ticket_ids") or [message["ticket_id"]]
+        elif template == "reservation_reminder":
+            ids = [message["reservation_id"]]
+        else:
+            raise KeyError(template)
+        return template, tuple(ObjectId(i) for i in ids)
+    except (InvalidId, ValueError, TypeError, KeyError) as exc:
+        raise ValueError(f"neispravna poruka: {exc!r}") from exc
 
 
-def send_reservation_reminder(reservation, event, user):
-    _send(
-        user.get("email"),
-        f"Podsjetnik — sutra je {event['name']}",
-        (
-            f"Bok {user.get('name', '')},\n\n"
-            f"podsjećamo te na rezervaciju stola {reservation.get('table_label')} "
-            f"za event {event['name']} ({event['date']}).\n\n"
-            "Vidimo se!"
-        ),
+def _ticket_values(docs):
+    """Sve karte kupnje u jednom mailu: popis za tekst i QR slike za HTML."""
+    lines, blocks = [], []
+    for doc in docs:
+        ticket_type, qr_url = doc.get("ticket_type_name") or "", _qr_url(doc.get("qr_code"))
+        lines.append(f"- {ticket_type}: {qr_url}")
+        blocks.append(
+            f"<p>{html.escape(ticket_type)}<br>"
+            f'<img src="{html.escape(qr_url)}" alt="QR kod karte" width="240" height="240"></p>'
+        )
+    return {"ticket_count": len(docs), "tickets": "\n".join(lines)}, {"tickets": "".join(blocks)}
+
+
+def render_batches(messages):
+    """
+    Sirove poruke iz outboxa → [{content, personalizations, messages}] —
+    jedna grupa po (predložak, event); `messages[i]` je sirova poruka iz
+    koje je nastao `personalizations[i]`. Poruke čiji entitet više ne
+    postoji se preskaču; neispravne poruke i one čiji render pukne idu u
+    dead-letter, pojedinačno — ostale se šalju normalno.
+    """
+    from db import clubs_col, events_col, table_reservations_col, tickets_col, users_col
+
+    # Duplikati iste poruke → jedan mail, ack za sve
+    raws_by_key = {}
+    for raw in messages:
+        try:
+            key = _parse(raw)
+        except ValueError as exc:
+            dead_letter([raw], str(exc))
+            continue
+        raws_by_key.setdefault(key, []).append(raw)
+
+    collections = {"ticket_confirmation": tickets_col, "reservation_reminder": table_reservations_col}
+    found = {}
+    for template, col in collections.items():
+        found.update(_by_id(col, [oid for (t, ids) in raws_by_key if t == template for oid in ids]))
+    docs_by_key = {}
+    for key in raws_by_key:
+        docs = [found[oid] for oid in key[1] if oid in found]
+        if docs:
+            docs_by_key[key] = docs
+    first_docs = [docs[0] for docs in docs_by_key.values()]
+    users = _by_id(users_col, [d.get("user_id") for d in first_docs], {"email": 1, "name": 1})
+    events = _by_id(events_col, [d.get("event_id") for d in first_docs],
+                    {"name": 1, "date": 1, "club_id": 1, "created_at": 1, "updated_at": 1})
+    clubs = _by_id(clubs_col, [e.get("club_id") for e in events.values()],
+                   {"name": 1, "location": 1})
+
+    grouped = {}
+    for (template, ids), docs in docs_by_key.items():
+        raws = raws_by_key[(template, ids)]
+        user = users.get(docs[0].get("user_id"))
+        event = events.get(docs[0].get("event_id"))
+        if not user or not user.get("email") or not event:
+            continue
+        try:
+            html_values = None
+            if template == "ticket_confirmation":
+                values, html_values = _ticket_values(docs)
+            else:
+                values = {"table_label": docs[0].get("table_label")}
+            values["name"] = user.get("name")
+
+            group = grouped.get((template, event["_id"]))
+            if group is None:
+                group = {
+                    "content": render_for_event(template, event, clubs.get(event.get("club_id"))),
+                    "personalizations": [],
+                    "messages": [],
+                }
+            personalization = {
+                "to": [{"email": user["email"]}],
+                "substitutions": substitutions(values, html_values),
+            }
+        except Exception as exc:
+            dead_letter(raws, f"render nije uspio: {exc!r}")
+            continue
+        grouped[(template, event["_id"])] = group
+        group["personalizations"].append(personalization)
+        group["messages"].append(raws[0])
+    return list(grouped.values())
+
+
+def chunked(batch, size=MAX_PERSONALIZATIONS):
+    """Grupa → (personalizations, messages) komadi do `size` gostiju."""
+    personalizations, messages = batch["personalizations"], batch["messages"]
+    for i in range(0, len(personalizations), size):
+        yield personalizations[i:i + size], messages[i:i + size]
+
+
+def send_batch(content, personalizations):
+    """Jedan SendGrid zahtjev: do 1000 gostiju istog eventa i predloška."""
+    if not SENDGRID_API_KEY:
+        for p in personalizations:
+            subs = p["substitutions"]
+            print(f"[email] (dev-mode) Za: {p['to'][0]['email']} | {content['subject']}\n"
+                  f"{apply_substitutions(content['text'], subs)}")
+        return
+    resp = _http().post(
+        SENDGRID_API_URL,
+        headers={"Authorization": f"Bearer {SENDGRID_API_KEY}"},
+        json={
+            "personalizations": personalizations,
+            "from": {"email": FROM_EMAIL},
+            "subject": content["subject"],
+            "content": [
+                {"type": "text/plain", "value": content["text"]},
+                {"type": "text/html", "value": content["html"]},
+            ],
+        },
+        timeout=EMAIL_TIMEOUT_SECONDS,
     )
+    if resp.status_code == 429 or resp.status_code >= 500:
+        raise EmailDeliveryError(f"SendGrid {resp.status_code}")
+    if resp.status_code >= 400:
+        # Neispravan zahtjev se ne popravlja ponavljanjem
+        raise EmailRejectedError(f"SendGrid {resp.status_code}: {resp.text[:300]}")
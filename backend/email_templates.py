@@ -0,0 +1,114 @@
+"""
+Email predlošci — dijelovi po eventu renderiraju se jednom i keširaju.
+
+Predložak ima dvije razine:
+- `{event_name}`, `{event_date}`, `{club_name}`, `{club_address}` — isti za
+  sve goste eventa; popunjavaju se ovdje, jednom po (event, verzija)
+- `-name-`, `-tickets-`, … — po primatelju; popunjava ih SendGrid iz
+  `substitutions`, pa svi gosti jednog eventa idu u jedan zahtjev
+
+Vrijednosti su korisnički unos (ime, naziv eventa), pa HTML dio dobiva
+escapane dijelove eventa i vlastite tagove (`-name_html-`, …) s escapanim
+vrijednostima — SendGrid istu zamjenu radi u svim dijelovima maila.
+
+Verzija eventa je `updated_at` (ili `created_at`); promjena eventa tako
+sama poništi cache, a TTL pokriva promjene kluba.
+"""
+
+import html
+import time
+from collections import OrderedDict
+
+CACHE_MAX_ENTRIES = 512
+CACHE_TTL_SECONDS = 600
+
+TEMPLATES = {
+    "ticket_confirmation": {
+        "subject": "Potvrda kupnje karata — {event_name}",
+        "text": (
+            "Bok -name-,\n\n"
+            "tvoja kupnja za {event_name} ({event_date}, {club_name}) je potvrđena.\n"
+            "Broj karata: -ticket_count-\n"
+            "-tickets-\n\n"
+            "Adresa: {club_address}\n"
+            "Pokaži QR kodove hostesi na ulazu. Vidimo se!"
+        ),
+        "html": (
+            "<p>Bok -name_html-,</p>"
+            "<p>tvoja kupnja za <strong>{event_name}</strong> ({event_date}, "
+            "{club_name}) je potvrđena.<br>Broj karata: -ticket_count_html-</p>"
+            "-tickets_html-"
+            "<p>Adresa: {club_address}<br>Pokaži QR kodove hostesi na ulazu. Vidimo se!</p>"
+        ),
+    },
+    "reservation_reminder": {
+        "subject": "Podsjetnik — sutra je {event_name}",
+        "text": (
+            "Bok -name-,\n\n"
+            "podsjećamo te na rezervaciju stola -table_label- "
+            "za event {event_name} ({event_date}) u klubu {club_name}.\n"
+            "Adresa: {club_address}\n\n"
+            "Vidimo se!"
+        ),
+        "html": (
+            "<p>Bok -name_html-,</p>"
+            "<p>podsjećamo te na rezervaciju stola <strong>-table_label_html-</strong> "
+            "za event <strong>{event_name}</strong> ({event_date}) u klubu {club_name}.</p>"
+            "<p>Adresa: {club_address}<br>Vidimo se!</p>"
+        ),
+    },
+}
+
+_cache = OrderedDict()
+
+
+def _event_parts(event, club):
+    location = (club or {}).get("location") or {}
+    address = ", ".join(p for p in (location.get("address"), location.get("city")) if p)
+    return {
+        "event_name": event["name"],
+        "event_date": event["date"].strftime("%d.%m.%Y. u %H:%M"),
+        "club_name": (club or {}).get("name", ""),
+        "club_address": address,
+    }
+
+
+def render_for_event(template, event, club):
+    """{subject, text, html} s popunjenim dijelovima eventa (iz cachea)."""
+    key = (template, event["_id"], event.get("updated_at") or event.get("created_at"))
+    hit = _cache.get(key)
+    if hit and time.monotonic() - hit[0] < CACHE_TTL_SECONDS:
+        _cache.move_to_end(key)
+        return hit[1]
+
+    parts = _event_parts(event, club)
+    escaped = {k: html.escape(v) for k, v in parts.items()}
+    rendered = {name: text.format(**(escaped if name == "html" else parts))
+                for name, text in TEMPLATES[template].items()}
+    _cache[key] = (time.monotonic(), rendered)
+    if len(_cache) > CACHE_MAX_ENTRIES:
+        _cache.popitem(last=False)
+    return rendered
+
+
+def substitutions(values, html_blocks=None):
+    """
+    {"name": "Ana"} → tagovi za tekst (`-name-`) i escapani za HTML (`-name_html-`).
+    `html_blocks` su već escapani HTML dijelovi — idu kao `-<ime>_html-` bez
+    dodatnog escapanja.
+    """
+    subs = {}
+    for name, value in values.items():
+        value = str(value or "")
+        subs[f"-{name}-"] = value
+        subs[f"-{name}_html-"] = html.escape(value)
+    for name, block in (html_blocks or {}).items():
+        subs[f"-{name}_html-"] = block
+    return subs
+
+
+def apply_substitutions(text, substitutions):
+    """Lokalno popunjavanje (dev-mode log) — isto što SendGrid radi na svojoj strani."""
+    for tag, value in substitutions.items():
+        text = text.replace(tag, value)
+    return text
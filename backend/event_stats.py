@@ -0,0 +1,164 @@
+"""
+Live statistike eventa — jedan snapshot za admin live prikaz i hostesu.
+
+Umjesto da svaki tablet svakih 5–15 s ponovno broji karte, rezervacije i
+narudžbe, snapshot se računa jednom i dijeli:
+
+- `snapshot(event_id)` čita Redis (`event_stats:<event_id>`), a na promašaj
+  ga izračuna (tri agregacije: karte i rezervacije grupirane po statusu,
+  narudžbe kroz $facet) i spremi
+- change_stream_worker za promjene karata, rezervacija i narudžbi označi
+  event kao prljav; pri flushu (EMIT_COALESCE_MS, najviše jednom u
+  STATS_PUSH_INTERVAL_MS po eventu) izračuna novi snapshot i, ako se
+  promijenio, emitira `live_stats` (soba `live_{event_id}`) i
+  `hostess_stats` (soba `hostess_{event_id}`)
+- snapshot se računa samo za evente koje netko gleda: join u sobu postavlja
+  `event_stats_watched:<event_id>` (TTL STATS_WATCH_TTL_SECONDS); promjena
+  eventa koji nitko ne gleda samo briše snapshot, pa prvi idući pogled
+  računa svježe brojke umjesto zastarjelih iz cachea
+
+Join u sobu odmah vraća trenutni snapshot (catch-up), pa klijent ne treba
+zaseban REST poziv; REST rute ostaju za prvi prikaz i klijente bez socketa.
+"""
+
+import json
+import os
+
+from bson import ObjectId
+
+from db import drink_orders_col, table_reservations_col, tickets_col
+from extensions import redis_client
+from realtime import publish
+
+STATS_CACHE_TTL_SECONDS = int(os.environ.get("STATS_CACHE_TTL_SECONDS", "300"))
+STATS_WATCH_TTL_SECONDS = int(os.environ.get("STATS_WATCH_TTL_SECONDS", "3600"))
+STATS_PUSH_INTERVAL_MS = int(os.environ.get("STATS_PUSH_INTERVAL_MS", "1000"))
+
+ACTIVE_ORDER_STATUSES = ["placed", "accepted", "preparing"]
+
+# Polja za hostesu (podskup live snapshota, imena kao /api/hostess/.../stats)
+HOSTESS_FIELDS = {
+    "tickets_sold": "tickets_sold",
+    "tickets_checked_in": "tickets_checked_in",
+    "reservations_confirmed": "reservations_active",
+    "reservations_checked_in": "reservations_checked_in",
+    "total_inside": "guests_inside",
+}
+
+
+def _cache_key(event_id):
+    return f"event_stats:{event_id}"
+
+
+def _watch_key(event_id):
+    return f"event_stats_watched:{event_id}"
+
+
+def _counts_by_status(col, oid):
+    return {
+        row["_id"]: row["count"]
+        for row in col.aggregate([
+            {"$match": {"event_id": oid}},
+            {"$group": {"_id": "$status", "count": {"$sum": 1}}},
+        ])
+    }
+
+
+def compute(event_id):
+    """Svježi snapshot iz Monga (tri agregacije umjesto šest brojanja)."""
+    oid = ObjectId(event_id)
+    tickets = _counts_by_status(tickets_col, oid)
+    reservations = _counts_by_status(table_reservations_col, oid)
+    orders = list(drink_orders_col.aggregate([
+        {"$match": {"event_id": oid}},
+        {"$facet": {
+            "active": [
+                {"$match": {"order_status": {"$in": ACTIVE_ORDER_STATUSES}}},
+                {"$count": "n"},
+            ],
+            "revenue": [
+                {"$match": {"payment_status": "paid"}},
+                {"$group": {"_id": None, "total": {"$sum": "$total"}}},
+            ],
+        }},
+    ]))[0]
+
+    checked_in = tickets.get("checked_in", 0)
+    reservations_in = reservations.get("checked_in", 0)
+    return {
+        "event_id": str(event_id),
+        "tickets_sold": tickets.get("valid", 0) + checked_in,
+        "tickets_checked_in": checked_in,
+        "reservations_active": reservations.get("confirmed", 0) + reservations_in,
+        "reservations_checked_in": reservations_in,
+        "guests_inside": checked_in + reservations_in,
+        "active_drink_orders": orders["active"][0]["n"] if orders["active"] else 0,
+        "drink_revenue": round(orders["revenue"][0]["total"] if orders["revenue"] else 0, 2),
+    }
+
+
+def hostess_view(stats):
+    """Snapshot u obliku koji vraća /api/hostess/event/<id>/stats."""
+    return {"event_id": stats["event_id"],
+            **{field: stats[source] for field, source in HOSTESS_FIELDS.items()}}
+
+
+def store(event_id, stats):
+    try:
+        redis_client.set(_cache_key(event_id), json.dumps(stats), ex=STATS_CACHE_TTL_SECONDS)
+    except Exception as exc:
+        print(f"[event_stats] Snapshot nije spremljen ({event_id}): {exc}")
+
+
+def cached(event_id):
+    try:
+        raw = redis_client.get(_cache_key(event_id))
+    except Exception:
+        return None
+    return json.loads(raw) if raw else None
+
+
+def snapshot(event_id):
+    """Zadnji snapshot (Redis) ili svježe izračunat."""
+    stats = cached(event_id)
+    if stats is None:
+        stats = compute(event_id)
+        store(event_id, stats)
+    return stats
+
+
+def invalidate(event_id):
+    try:
+        redis_client.delete(_cache_key(event_id))
+    except Exception as exc:
+        print(f"[event_stats] Snapshot nije obrisan ({event_id}): {exc}")
+
+
+def watch(event_id):
+    """Netko gleda live prikaz — change stream worker održava snapshot."""
+    try:
+        redis_client.set(_watch_key(event_id), 1, ex=STATS_WATCH_TTL_SECONDS)
+    except Exception as exc:
+        print(f"[event_stats] Praćenje nije zapisano ({event_id}): {exc}")
+
+
+def is_watched(event_id):
+    try:
+        return redis_client.exists(_watch_key(event_id)) == 1
+    except Exception:
+        return True
+
+
+def refresh(event_id):
+    """
+    Worker: novi snapshot nakon promjene; emitira ga samo ako se razlikuje
+    od zadnjeg. Vraća True ako je emitiran.
+    """
+    stats = compute(event_id)
+    changed = stats != cached(event_id)
+    store(event_id, stats)
+    if not changed:
+        return False
+    publish("live_stats", stats)
+    publish("hostess_stats", hostess_view(stats))
+    return True
@@ -0,0 +1,130 @@
+"""
+Admin liste i izvozi karata/rezervacija eventa — keyset paginacija i stream.
+
+Liste (`?limit=&cursor=`) se listaju po (vrijeme, _id) silazno; `next_cursor`
+je neprozirni token zadnjeg retka, pa svaka stranica ide kroz indeks
+(event_id, vrijeme) bez `skip` — stranica 40 košta isto kao prva.
+
+Izvoz (`/export?format=csv|ndjson`) iterira Mongo cursor u batchevima od
+EXPORT_BATCH_SIZE: svaki batch dobije snapshot gosta (guest_profile, jedan
+`$in` samo za dokumente bez njega), pretvori se u retke i generator ih
+preda Flasku kao jedan chunk odgovora. Memorija je konstantna bez obzira
+na veličinu eventa — u njoj je uvijek samo jedan batch.
+"""
+
+import base64
+import csv
+import io
+import json
+import os
+from datetime import datetime
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from flask import Response, stream_with_context
+
+from guest_profile import attach_missing
+
+EXPORT_BATCH_SIZE = int(os.environ.get("EXPORT_BATCH_SIZE", "500"))
+EXPORT_FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+
+class CursorError(ValueError):
+    """Neispravan `cursor` parametar liste."""
+
+
+def encode_cursor(doc, sort_field):
+    raw = json.dumps({"t": doc[sort_field].isoformat(), "id": str(doc["_id"])})
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(data["t"]), ObjectId(data["id"])
+    except (ValueError, KeyError, TypeError, InvalidId) as exc:
+        raise CursorError("Neispravan cursor") from exc
+
+
+def keyset_page(col, query, sort_field, limit, cursor=None):
+    """Jedna stranica (najnovije prvo) i token sljedeće (None na kraju)."""
+    if cursor:
+        after_time, after_id = decode_cursor(cursor)
+        query = {"$and": [query, {"$or": [
+            {sort_field: {"$lt": after_time}},
+            {sort_field: after_time, "_id": {"$lt": after_id}},
+        ]}]}
+    docs = list(col.find(query).sort([(sort_field, -1), ("_id", -1)]).limit(limit + 1))
+    next_cursor = encode_cursor(docs[limit - 1], sort_field) if len(docs) > limit else None
+    return attach_missing(docs[:limit]), next_cursor
+
+
+def _batches(cursor):
+    batch = []
+    for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= EXPORT_BATCH_SIZE:
+            yield attach_missing(batch)
+            batch = []
+    if batch:
+        yield attach_missing(batch)
+
+
+def _cell(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, ObjectId):
+        return str(value)
+    return value
+
+
+# Excel/LibreOffice ćeliju koja počinje ovim znakom izvrše kao formulu
+_FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def _csv_safe(value):
+    """Ime/email/napomenu gosta ne smije se moći izvršiti kao formula (CSV injection)."""
+    if isinstance(value, str) and value.startswith(_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def _csv_chunk(rows, columns, header=False):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction="ignore")
+    if header:
+        writer.writeheader()
+    writer.writerows({k: _csv_safe(v) for k, v in row.items()} for row in rows)
+    return buffer.getvalue()
+
+
+def stream_export(col, query, sort_field, columns, to_row, fmt, filename):
+    """Flask Response koji chunk po chunk streama izvoz (CSV ili NDJSON)."""
+    cursor = col.find(query, batch_size=EXPORT_BATCH_SIZE).sort(sort_field, 1)
+
+    def generate():
+        try:
+            if fmt == "csv":
+                yield "\ufeff" + _csv_chunk([], columns, header=True)  # BOM za Excel
+            for batch in _batches(cursor):
+                rows = [{k: _cell(v) for k, v in to_row(doc).items()} for doc in batch]
+                if fmt == "csv":
+                    yield _csv_chunk(rows, columns)
+                else:
+                    yield "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows)
+        finally:
+            cursor.close()
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype=EXPORT_FORMATS[fmt],
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}.{fmt}"',
+            # Traefik/NGINX ne smiju bufferirati cijeli izvoz
+            "X-Accel-Buffering": "no",
+        },
+    )
@@ -11,9 +11,20 @@ import redis
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 
+import request_profiling
+
 REDIS_HOST = os.environ.get("REDIS_HOST", "redis")
 
-redis_client = redis.Redis(host=REDIS_HOST, port=6379, db=3, decode_responses=True)
+
+class ProfiledRedis(redis.Redis):
+    """Redis klijent koji svaki round-trip pribraja profilu zahtjeva."""
+
+    def execute_command(self, *args, **options):
+        with request_profiling.track("redis"):
+            return super().execute_command(*args, **options)
+
+
+redis_client = ProfiledRedis(host=REDIS_HOST, port=6379, db=3, decode_responses=True)
 
 limiter = Limiter(
     key_func=get_remote_address,
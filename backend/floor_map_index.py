@@ -0,0 +1,425 @@
+"""
+Kompilirani tlocrt — indeks stolova po verziji mape.
+
+Mapa u Mongu je lista slobodnih dictova (`tables`); svaka rezervacija,
+narudžba i SVG prikaz ju je prije učitavali cijelu i tražili stol
+linearno. `compile_map` jednom po verziji složi:
+
+- `id → redak` i stupce (label, tip, kapacitet, depozit, min_spend, sekcija)
+- članstvo u sekcijama (`section_id` stola ili `sections[].table_ids`)
+- grid prostorni indeks (% koordinate) za `hit_test`
+- kompaktni format za mobilnu mapu: nazivi stupaca + reci kao liste, a
+  puni (stol kao dict) iz istih redaka — bez ponovnog čitanja dokumenta
+
+Verzija je cijeli broj `version` koji svaka izmjena mape poveća za 1.
+Editor šalje samo razliku (`normalize_ops` → `apply_changes`): pomaci i
+izmjene idu pozicijskim `$set` s array_filters, dodavanja/brisanja jednim
+pipeline updateom — uvijek uz `version` u filteru (optimistic concurrency).
+Svaka razlika se zapiše u Redis (`floor_map_changes:<map_id>`), pa procesi
+koji imaju stariju verziju u cacheu samo dopune retke umjesto da ponovno
+učitaju i kompiliraju cijelu mapu.
+"""
+
+import json
+from collections import OrderedDict
+from datetime import datetime
+
+from db import floor_maps_col
+from extensions import redis_client
+
+# Grid 10×10 ćelija preko koordinata 0–100 (% širine/visine mape)
+GRID_CELLS = 10
+CACHE_MAX_MAPS = 256
+# Koliko dugo se čuva povijest razlika za inkrementalno osvježavanje
+CHANGES_TTL_SECONDS = 24 * 3600
+
+COMPACT_COLUMNS = [
+    "id", "label", "type", "x", "y", "width", "height",
+    "capacity", "min_spend", "deposit", "section_id",
+]
+TABLE_TYPES = {"standard", "standing", "separe", "vip_separe"}
+# Polja koja editor smije mijenjati; id je nepromjenjiv
+EDITABLE_FIELDS = set(COMPACT_COLUMNS[1:]) | {"description"}
+_COLUMN_SET = set(COMPACT_COLUMNS)
+
+_cache = OrderedDict()
+
+
+class FloorMapError(Exception):
+    pass
+
+
+class CompiledFloorMap:
+    """Read-only indeks jedne verzije mape (dijeli se između zahtjeva)."""
+
+    __slots__ = ("map_id", "club_id", "version", "meta", "sections", "rows",
+                 "by_id", "section_by_table", "grid", "extras")
+
+    def __init__(self, doc):
+        self.map_id = doc["_id"]
+        self.club_id = doc.get("club_id")
+        self.version = doc.get("version", 0)
+        self.meta = {k: doc.get(k) for k in (
+            "name", "background_image_url", "background_image_variants", "width", "height",
+        )}
+        self.sections = doc.get("sections") or []
+
+        # Sekcija stola: eksplicitni section_id ima prednost nad listom u sekciji
+        self.section_by_table = {}
+        for section in self.sections:
+            for table_id in section.get("table_ids") or []:
+                self.section_by_table.setdefault(table_id, section.get("id"))
+
+        self.rows = []
+        self.by_id = {}
+        self.grid = {}
+        # Polja stola izvan stupaca (npr. description) — samo za puni format
+        self.extras = {}
+        for table in doc.get("tables") or []:
+            self._add_row(table)
+
+    def _row(self, table):
+        if table.get("section_id"):
+            self.section_by_table[table["id"]] = table["section_id"]
+        return (
+            table["id"],
+            table.get("label", table["id"]),
+            table.get("type", "standard"),
+            float(table.get("x") or 0),
+            float(table.get("y") or 0),
+            float(table.get("width") or 0),
+            float(table.get("height") or 0),
+            table.get("capacity"),
+            table.get("min_spend"),
+            float(table.get("deposit") or 0),
+            self.section_by_table.get(table["id"]),
+        )
+
+    def _add_row(self, table):
+        row = self._row(table)
+        index = len(self.rows)
+        self.by_id[row[0]] = index
+        self.rows.append(row)
+        extras = {k: v for k, v in table.items() if k not in _COLUMN_SET}
+        if extras:
+            self.extras[row[0]] = extras
+        for cell in _cells(row[3], row[4], row[5], row[6]):
+            self.grid.setdefault(cell, []).append(index)
+
+    def _drop_row(self, table_id):
+        index = self.by_id.pop(table_id)
+        row = self.rows[index]
+        for cell in _cells(row[3], row[4], row[5], row[6]):
+            self.grid[cell].remove(index)
+        # Tombstone — indeksi ostalih redaka ostaju valjani
+        self.rows[index] = None
+        self.section_by_table.pop(table_id, None)
+        self.extras.pop(table_id, None)
+        return row
+
+    def with_changes(self, changes, version):
+        """
+        Nova verzija s primijenjenom razlikom — dira samo promijenjene retke
+        i njihove ćelije grida; ostalo se kopira plitko.
+        """
+        clone = CompiledFloorMap.__new__(CompiledFloorMap)
+        clone.map_id, clone.club_id, clone.meta = self.map_id, self.club_id, self.meta
+        clone.version = version
+        clone.rows = list(self.rows)
+        clone.by_id = dict(self.by_id)
+        clone.section_by_table = dict(self.section_by_table)
+        clone.grid = {cell: list(indices) for cell, indices in self.grid.items()}
+        clone.extras = dict(self.extras)
+
+        deleted = set(changes.get("deleted") or [])
+        clone.sections = [
+            {**s, "table_ids": [t for t in s.get("table_ids") or [] if t not in deleted]}
+            for s in self.sections
+        ] if deleted else self.sections
+
+        for table_id in deleted:
+            if table_id in clone.by_id:
+                clone._drop_row(table_id)
+        for table_id, patch in (changes.get("patched") or {}).items():
+            if table_id not in clone.by_id:
+                continue
+            extras = clone.extras.get(table_id, {})
+            old = dict(zip(COMPACT_COLUMNS, clone._drop_row(table_id)))
+            clone._add_row({**old, **extras, **patch})
+        for table in changes.get("added") or []:
+            clone._add_row(table)
+        return clone
+
+    def table(self, table_id):
+        """Stol kao dict (stupci COMPACT_COLUMNS) ili None."""
+        index = self.by_id.get(table_id)
+        if index is None:
+            return None
+        return dict(zip(COMPACT_COLUMNS, self.rows[index]))
+
+    def section_of(self, table_id):
+        return self.section_by_table.get(table_id)
+
+    def hit_test(self, x, y):
+        """Id stola na točki (x, y) u % koordinatama ili None."""
+        for index in self.grid.get(_cell(x, y), ()):
+            row = self.rows[index]
+            if abs(x - row[3]) <= row[5] / 2 and abs(y - row[4]) <= row[6] / 2:
+                return row[0]
+        return None
+
+    def compact_payload(self, status_by_table):
+        """SVG payload: stupci + reci (uz zadnji stupac `status`, None = slobodan)."""
+        return {
+            "_id": str(self.map_id),
+            "club_id": str(self.club_id) if self.club_id else None,
+            **self.meta,
+            "sections": self.sections,
+            "version": self.version,
+            "format": "compact",
+            "table_columns": COMPACT_COLUMNS + ["status"],
+            "tables": [list(row) + [status_by_table.get(row[0])]
+                       for row in self.rows if row is not None],
+        }
+
+    def full_payload(self, status_by_table):
+        """Stolovi kao dictovi uz `reservation_status` i `is_available`."""
+        tables = []
+        for row in self.rows:
+            if row is None:
+                continue
+            status = status_by_table.get(row[0])
+            tables.append({**dict(zip(COMPACT_COLUMNS, row)), **self.extras.get(row[0], {}),
+                           "reservation_status": status, "is_available": status is None})
+        return {
+            "_id": str(self.map_id),
+            "club_id": str(self.club_id) if self.club_id else None,
+            **self.meta,
+            "sections": self.sections,
+            "version": self.version,
+            "tables": tables,
+        }
+
+
+def _axis_cell(value):
+    return min(GRID_CELLS - 1, max(0, int(value // (100 / GRID_CELLS))))
+
+
+def _cell(x, y):
+    return _axis_cell(x), _axis_cell(y)
+
+
+def _cells(x, y, width, height):
+    x0, y0 = _cell(x - width / 2, y - height / 2)
+    x1, y1 = _cell(x + width / 2, y + height / 2)
+    return [(cx, cy) for cx in range(x0, x1 + 1) for cy in range(y0, y1 + 1)]
+
+
+def _remember(compiled):
+    _cache[compiled.map_id] = compiled
+    _cache.move_to_end(compiled.map_id)
+    if len(_cache) > CACHE_MAX_MAPS:
+        _cache.popitem(last=False)
+    return compiled
+
+
+def compile_map(doc):
+    """Kompilira dokument mape (ili vraća verziju iz cachea)."""
+    hit = _cache.get(doc["_id"])
+    if hit is not None and hit.version == doc.get("version", 0):
+        _cache.move_to_end(doc["_id"])
+        return hit
+    return _remember(CompiledFloorMap(doc))
+
+
+def _changes_key(map_id):
+    return f"floor_map_changes:{map_id}"
+
+
+def _replay(compiled, version):
+    """Dopuni cache razlikama iz Redisa; None ako neka nedostaje."""
+    wanted = [str(v) for v in range(compiled.version + 1, version + 1)]
+    try:
+        raw = redis_client.hmget(_changes_key(compiled.map_id), wanted)
+    except Exception:
+        return None
+    if not raw or any(r is None for r in raw):
+        return None
+    for step, payload in zip(wanted, raw):
+        compiled = compiled.with_changes(json.loads(payload), int(step))
+    return compiled
+
+
+def active_map(club_id):
+    """Kompilirana aktivna mapa kluba ili None."""
+    head = floor_maps_col.find_one(
+        {"club_id": club_id, "is_active": True}, {"version": 1}
+    )
+    if not head:
+        return None
+    version = head.get("version", 0)
+    hit = _cache.get(head["_id"])
+    if hit is not None and hit.version == version:
+        _cache.move_to_end(head["_id"])
+        return hit
+    if hit is not None and hit.version < version:
+        replayed = _replay(hit, version)
+        if replayed is not None:
+            return _remember(replayed)
+    doc = floor_maps_col.find_one({"_id": head["_id"]})
+    return compile_map(doc) if doc else None
+
+
+# ---------- editor: razlike ----------
+
+def _clean_fields(fields, section_ids):
+    cleaned = {}
+    for key, value in fields.items():
+        if key not in EDITABLE_FIELDS:
+            raise FloorMapError(f"Polje '{key}' se ne može mijenjati")
+        if key in ("x", "y"):
+            if not isinstance(value, (int, float)) or not 0 <= value <= 100:
+                raise FloorMapError(f"{key} mora biti broj između 0 i 100")
+        elif key in ("width", "height"):
+            if not isinstance(value, (int, float)) or not 0 < value <= 100:
+                raise FloorMapError(f"{key} mora biti pozitivan broj do 100")
+        elif key in ("capacity", "min_spend", "deposit"):
+            if value is not None and (not isinstance(value, (int, float)) or value < 0):
+                raise FloorMapError(f"{key} mora biti nenegativan broj")
+        elif key == "type" and value not in TABLE_TYPES:
+            raise FloorMapError(f"type mora biti jedan od: {', '.join(sorted(TABLE_TYPES))}")
+        elif key == "section_id" and value is not None and value not in section_ids:
+            raise FloorMapError(f"Sekcija {value} ne postoji")
+        elif key in ("label", "description") and value is not None and not isinstance(value, str):
+            raise FloorMapError(f"{key} mora biti tekst")
+        cleaned[key] = value
+    return cleaned
+
+
+def normalize_ops(ops, table_ids, section_ids):
+    """
+    Lista operacija editora → {"added": [...], "patched": {id: {...}},
+    "deleted": [...]}. Više operacija nad istim stolom se spaja (npr. add pa
+    move = jedan add). Podiže FloorMapError za neispravnu operaciju.
+
+    Operacije: {"op": "add", "table": {...}}, {"op": "move", "id", "x", "y"},
+    {"op": "update", "id", "fields": {...}}, {"op": "delete", "id"}.
+    """
+    if not isinstance(ops, list) or not ops:
+        raise FloorMapError("ops mora biti neprazna lista")
+    existing = set(table_ids)
+    added, patched, deleted = {}, {}, []
+
+    for op in ops:
+        kind = (op or {}).get("op")
+        if kind == "add":
+            table = dict(op.get("table") or {})
+            table_id = table.pop("id", None)
+            if not isinstance(table_id, str) or not table_id:
+                raise FloorMapError("Novi stol mora imati id")
+            if table_id in existing or table_id in added:
+                raise FloorMapError(f"Stol {table_id} već postoji")
+            missing = {"x", "y", "width", "height"} - set(table)
+            if missing:
+                raise FloorMapError(f"Novi stol nema polja: {', '.join(sorted(missing))}")
+            table.setdefault("type", "standard")
+            added[table_id] = {"id": table_id, **_clean_fields(table, section_ids)}
+            continue
+
+        table_id = op.get("id")
+        if table_id not in existing and table_id not in added:
+            raise FloorMapError(f"Stol {table_id} ne postoji")
+        if kind == "delete":
+            if added.pop(table_id, None) is None:
+                patched.pop(table_id, None)
+                existing.discard(table_id)
+                deleted.append(table_id)
+            continue
+        if kind == "move":
+            fields = _clean_fields({"x": op.get("x"), "y": op.get("y")}, section_ids)
+        elif kind == "update":
+            fields = _clean_fields(op.get("fields") or {}, section_ids)
+        else:
+            raise FloorMapError(f"Nepoznata operacija: {kind}")
+        if table_id in added:
+            added[table_id].update(fields)
+        else:
+            patched.setdefault(table_id, {}).update(fields)
+
+    return {"added": list(added.values()), "patched": patched, "deleted": deleted}
+
+
+def version_filter(version):
+    """Filter za optimistic concurrency; stare mape nemaju polje `version`."""
+    if version == 0:
+        return {"$or": [{"version": 0}, {"version": {"$exists": False}}]}
+    return {"version": version}
+
+
+def _pipeline_update(changes, now):
+    deleted = {"$literal": changes["deleted"]}
+    kept = {"$filter": {
+        "input": {"$ifNull": ["$tables", []]},
+        "cond": {"$not": [{"$in": ["$$this.id", deleted]}]},
+    }}
+    branches = [
+        {"case": {"$eq": ["$$this.id", {"$literal": table_id}]},
+         "then": {"$mergeObjects": ["$$this", {"$literal": patch}]}}
+        for table_id, patch in changes["patched"].items()
+    ]
+    tables = {"$map": {
+        "input": kept,
+        "in": {"$switch": {"branches": branches, "default": "$$this"}},
+    }} if branches else kept
+    sections = {"$map": {
+        "input": {"$ifNull": ["$sections", []]},
+        "in": {"$mergeObjects": ["$$this", {"table_ids": {"$filter": {
+            "input": {"$ifNull": ["$$this.table_ids", []]},
+            "cond": {"$not": [{"$in": ["$$this", deleted]}]},
+        }}}]},
+    }}
+    return [{"$set": {
+        "tables": {"$concatArrays": [tables, {"$literal": changes["added"]}]},
+        "sections": sections,
+        "version": {"$add": [{"$ifNull": ["$version", 0]}, 1]},
+        "patched_version": {"$add": [{"$ifNull": ["$version", 0]}, 1]},
+        "updated_at": now,
+    }}]
+
+
+def apply_changes(map_id, version, changes):
+    """
+    Upiše razliku ako je mapa još na `version`. Vraća novu verziju ili
+    None (netko je u međuvremenu spremio — klijent mora osvježiti mapu).
+    `patched_version` = nova verzija označava da je nastala PATCH-em (razliku
+    emitira ruta), pa je change stream ne javlja kao `floor_map_changed`.
+    """
+    now = datetime.utcnow()
+    query = {"_id": map_id, **version_filter(version)}
+    if changes["added"] or changes["deleted"]:
+        result = floor_maps_col.update_one(query, _pipeline_update(changes, now))
+    else:
+        # Samo pomaci/izmjene: pozicijski $set, bez prepisivanja liste
+        updates, array_filters = {"updated_at": now, "patched_version": version + 1}, []
+        for i, (table_id, patch) in enumerate(changes["patched"].items()):
+            array_filters.append({f"t{i}.id": table_id})
+            for key, value in patch.items():
+                updates[f"tables.$[t{i}].{key}"] = value
+        result = floor_maps_col.update_one(
+            query, {"$set": updates, "$inc": {"version": 1}}, array_filters=array_filters,
+        )
+    if not result.matched_count:
+        return None
+
+    new_version = version + 1
+    try:
+        key = _changes_key(map_id)
+        redis_client.hset(key, str(new_version), json.dumps(changes))
+        redis_client.expire(key, CHANGES_TTL_SECONDS)
+    except Exception as exc:
+        # Bez povijesti drugi procesi samo ponovno učitaju mapu
+        print(f"[floor_map] Razlika v{new_version} nije zapisana: {exc}")
+    hit = _cache.get(map_id)
+    if hit is not None and hit.version == version:
+        _remember(hit.with_changes(changes, new_version))
+    return new_version
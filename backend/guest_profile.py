@@ -0,0 +1,90 @@
+"""
+Snapshot identiteta gosta na kartama i rezervacijama.
+
+Ulaz i admin liste (lista gostiju, check-in, prodane karte, rezervacije
+eventa) prikazuju ime/email/telefon gosta. Umjesto joina natrag na `users`
+(često `$in` s tisućama id-eva) karta i rezervacija pri kreiranju dobiju
+polje `guest`:
+
+    {"name", "name_norm", "email", "phone"}
+
+`name_norm` je ime malim slovima bez dijakritika (č → c, đ → d), pa
+pretraga po imenu ide kroz indeks (event_id, guest.name_norm) bez
+`$options: "i"`. Promjenu profila prenosi Celery task
+`propagate_guest_profile` (pokreće ga change_stream_worker kad se na
+korisniku promijene ta polja), a postojeće dokumente puni
+migrate_guest_snapshot.py.
+"""
+
+import re
+import unicodedata
+
+from bson import ObjectId
+
+from db import table_reservations_col, tickets_col, users_col
+
+GUEST_FIELDS = ("name", "email", "phone")
+GUEST_PROJECTION = {field: 1 for field in GUEST_FIELDS}
+
+# Slova koja NFKD ne rastavlja na osnovno slovo + kvačicu
+_EXTRA_FOLDS = str.maketrans({"đ": "d", "Đ": "d", "ß": "ss", "ø": "o", "Ø": "o"})
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_name(name):
+    """"Đurđa  Čavić" → "durda cavic" (za pretragu i sortiranje)."""
+    folded = unicodedata.normalize("NFKD", (name or "").translate(_EXTRA_FOLDS))
+    ascii_only = "".join(c for c in folded if not unicodedata.combining(c))
+    return _WHITESPACE_RE.sub(" ", ascii_only).strip().lower()
+
+
+def guest_snapshot(user):
+    """Polje `guest` za kartu/rezervaciju iz dokumenta korisnika."""
+    user = user or {}
+    return {
+        "name": user.get("name"),
+        "name_norm": normalize_name(user.get("name")),
+        "email": user.get("email"),
+        "phone": user.get("phone"),
+    }
+
+
+def guest_of(doc):
+    """Gost iz snapshota u obliku koji rute vraćaju kao `user`."""
+    guest = doc.get("guest") or {}
+    return {
+        "_id": str(doc["user_id"]),
+        "name": guest.get("name"),
+        "email": guest.get("email"),
+        "phone": guest.get("phone"),
+    }
+
+
+def attach_missing(docs):
+    """
+    Dokumentima bez snapshota (prije backfilla) dopuni `guest` iz `users` —
+    jedan `$in` samo za njih; s gotovim backfillom nema upita.
+    """
+    missing = {d["user_id"] for d in docs if not d.get("guest")}
+    if not missing:
+        return docs
+    users = {u["_id"]: u for u in users_col.find({"_id": {"$in": list(missing)}},
+                                                 GUEST_PROJECTION)}
+    for doc in docs:
+        if not doc.get("guest"):
+            doc["guest"] = guest_snapshot(users.get(doc["user_id"]))
+    return docs
+
+
+def propagate(user_id):
+    """Novi snapshot korisnika na sve njegove karte i rezervacije."""
+    oid = ObjectId(user_id)
+    user = users_col.find_one({"_id": oid}, GUEST_PROJECTION)
+    if not user:
+        return 0
+    snapshot = guest_snapshot(user)
+    # Filter na razliku — ponovljeni task ne piše ništa
+    query = {"user_id": oid, "guest": {"$ne": snapshot}}
+    update = {"$set": {"guest": snapshot}}
+    return (tickets_col.update_many(query, update).modified_count
+            + table_reservations_col.update_many(query, update).modified_count)
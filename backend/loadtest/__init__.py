@@ -0,0 +1,15 @@
+"""
+Load test — simulacija vršne noći na Zrću (NightClub Manager v2).
+
+- seed.py    — bulk seed klubova, evenata, mapa, menija, osoblja i desetaka
+               tisuća gostiju izravno u Mongo (bez API-ja i rate limita)
+- fakes.py   — lokalni Stripe i SendGrid stand-in (HTTP) za offline rad
+- runner.py  — replay realističnog miksa prometa, p50/p95/p99 po ruti i
+               usporedba s pohranjenim baselineom
+- query_audit.py — explain() kataloga oblika upita nad seedanim podacima,
+               zastavice (COLLSCAN, SORT, selektivnost) i prijedlozi indeksa
+
+Pokretanje (uz podignut stack):
+    docker compose exec backend python -m loadtest.seed --users 20000
+    docker compose exec backend python -m loadtest.runner --duration 120
+"""
@@ -0,0 +1,259 @@
+"""
+Lokalni Stripe + SendGrid stand-in za offline load testove.
+
+Jednostavan HTTP server koji odgovara na podskup Stripe REST API-ja koji
+backend koristi (customers, payment_intents, refunds) i na SendGrid
+`/v3/mail/send`. Backend se na njega usmjerava env varijablama:
+
+    STRIPE_SECRET_KEY=sk_test_fake
+    STRIPE_API_BASE=http://<host>:12111
+    SENDGRID_API_KEY=SG.fake
+    SENDGRID_API_URL=http://<host>:12111/v3/mail/send
+
+PaymentIntenti se kreiraju odmah u statusu `succeeded` (Payment Sheet se u
+load testu preskače), pa fallback `/api/tickets/confirm` potvrđuje kupnju.
+Uz `--webhook-url` intent ostaje `requires_payment_method`, a nakon
+`--webhook-delay-ms` „kupac plati": intent prelazi u `succeeded` i backendu
+se šalje `payment_intent.succeeded` potpisan kao kod Stripea
+(`t=…,v1=HMAC-SHA256`, `--webhook-secret` = STRIPE_WEBHOOK_SECRET backenda).
+`--failure-rate` vraća 500 na dio Stripe poziva (nestabilan Stripe).
+
+Služi i kao lokalni mail sink za razvoj: svaki SendGrid zahtjev se broji
+po personalizaciji (`emails`, `email_requests`), zadnjih 200 primatelja je
+na `GET /__mail`, a `--print-mail` ih ispisuje s popunjenim predloškom.
+
+    python -m loadtest.fakes --port 12111 --latency-ms 80
+    python -m loadtest.fakes --webhook-url http://localhost:5000/api/webhooks/stripe
+"""
+
+import argparse
+import hashlib
+import hmac
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+
+import requests
+
+
+def sign_webhook_payload(payload, secret, timestamp=None):
+    """Stripe-Signature header za dani payload (bytes)."""
+    timestamp = int(timestamp or time.time())
+    signed = f"{timestamp}.".encode() + payload
+    signature = hmac.new(secret.encode(), signed, hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={signature}"
+
+
+class FakeState:
+    def __init__(self, latency_ms, print_mail=False, failure_rate=0.0,
+                 webhook_url=None, webhook_secret=None, webhook_delay_ms=500.0):
+        self.latency = latency_ms / 1000
+        self.print_mail = print_mail
+        self.failure_rate = failure_rate
+        self.webhook_url = webhook_url
+        self.webhook_secret = webhook_secret
+        self.webhook_delay = webhook_delay_ms / 1000
+        self.lock = threading.Lock()
+        self.intents = {}
+        self.idempotent = {}
+        self.mail = deque(maxlen=200)
+        self.counts = {"customers": 0, "payment_intents": 0, "refunds": 0,
+                       "emails": 0, "email_requests": 0, "webhooks": 0, "failures": 0}
+        self._http = requests.Session()
+
+    def bump(self, key, by=1):
+        with self.lock:
+            self.counts[key] += by
+
+    def record_mail(self, message):
+        """SendGrid mail/send: jedan zahtjev, N personalizacija sa substitutions."""
+        body = next((c.get("value", "") for c in message.get("content", [])
+                     if c.get("type") == "text/plain"), "")
+        personalizations = message.get("personalizations", [])
+        self.bump("email_requests")
+        self.bump("emails", len(personalizations))
+        for p in personalizations:
+            text = body
+            for tag, value in (p.get("substitutions") or {}).items():
+                text = text.replace(tag, str(value))
+            entry = {"to": [t.get("email") for t in p.get("to", [])],
+                     "subject": p.get("subject") or message.get("subject"),
+                     "body": text}
+            self.mail.append(entry)
+            if self.print_mail:
+                print(f"[mail] {entry['to']} | {entry['subject']}\n{text}\n")
+
+    def should_fail(self):
+        if self.failure_rate and random.random() < self.failure_rate:
+            self.bump("failures")
+            return True
+        return False
+
+    def pay_later(self, payment_intent_id):
+        threading.Timer(self.webhook_delay, self.fire_webhook,
+                        args=(payment_intent_id,)).start()
+
+    def fire_webhook(self, payment_intent_id, event_type="payment_intent.succeeded"):
+        """Označi intent plaćenim i pošalji potpisani webhook backendu."""
+        intent = self.intents[payment_intent_id]
+        intent["status"] = "succeeded"
+        payload = json.dumps({
+            "id": f"evt_{uuid.uuid4().hex[:24]}",
+            "object": "event",
+            "type": event_type,
+            "created": int(time.time()),
+            "data": {"object": intent},
+        }).encode()
+        try:
+            self._http.post(
+                self.webhook_url,
+                data=payload,
+                headers={
+                    "Content-Type": "application/json",
+                    "Stripe-Signature": sign_webhook_payload(payload, self.webhook_secret),
+                },
+                timeout=10,
+            )
+            self.bump("webhooks")
+        except requests.RequestException as exc:
+            print(f"[fakes] Webhook nije isporučen: {exc}")
+
+
+def _form_to_dict(body):
+    """Stripe SDK šalje form-encoded parametre (metadata[type]=...)."""
+    params = {}
+    for key, value in parse_qsl(body, keep_blank_values=True):
+        if "[" in key:
+            outer, inner = key.split("[", 1)
+            params.setdefault(outer, {})[inner.rstrip("]")] = value
+        else:
+            params[key] = value
+    return params
+
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *_args):
+            pass
+
+        def _json(self, status, payload=None):
+            body = json.dumps(payload).encode() if payload is not None else b""
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _body(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            return self.rfile.read(length).decode() if length else ""
+
+        def _created(self, key, obj):
+            if key:
+                state.idempotent[key] = obj
+            return self._json(200, obj)
+
+        def do_GET(self):
+            if self.path == "/__stats":
+                return self._json(200, state.counts)
+            if self.path == "/__mail":
+                return self._json(200, list(state.mail))
+            if self.path.startswith("/v1/payment_intents/"):
+                time.sleep(state.latency)
+                intent = state.intents.get(self.path.rsplit("/", 1)[1])
+                if not intent:
+                    return self._json(404, {"error": {"message": "No such payment_intent"}})
+                return self._json(200, intent)
+            return self._json(404, {"error": {"message": "Unknown route"}})
+
+        def do_POST(self):
+            raw = self._body()
+            if self.path == "/v3/mail/send":
+                state.record_mail(json.loads(raw or "{}"))
+                return self._json(202)
+
+            time.sleep(state.latency)
+            if state.should_fail():
+                return self._json(500, {"error": {"type": "api_error",
+                                                  "message": "Simulirana greška"}})
+            # SDK retry nosi isti Idempotency-Key — vrati isti objekt
+            key = self.headers.get("Idempotency-Key")
+            if key and key in state.idempotent:
+                return self._json(200, state.idempotent[key])
+            params = _form_to_dict(raw)
+            if self.path == "/v1/customers":
+                state.bump("customers")
+                return self._created(key, {
+                    "id": f"cus_{uuid.uuid4().hex[:14]}", "object": "customer",
+                    "email": params.get("email"), "metadata": params.get("metadata", {}),
+                })
+            if self.path == "/v1/payment_intents":
+                state.bump("payment_intents")
+                pi_id = f"pi_{uuid.uuid4().hex[:24]}"
+                intent = {
+                    "id": pi_id, "object": "payment_intent",
+                    "amount": int(params.get("amount", 0)),
+                    "currency": params.get("currency", "eur"),
+                    "customer": params.get("customer"),
+                    "metadata": params.get("metadata", {}),
+                    "status": "requires_payment_method" if state.webhook_url else "succeeded",
+                    "client_secret": f"{pi_id}_secret_{uuid.uuid4().hex[:16]}",
+                }
+                state.intents[pi_id] = intent
+                if state.webhook_url:
+                    state.pay_later(pi_id)
+                return self._created(key, intent)
+            if self.path == "/v1/refunds":
+                state.bump("refunds")
+                intent = state.intents.get(params.get("payment_intent"), {})
+                return self._created(key, {
+                    "id": f"re_{uuid.uuid4().hex[:24]}", "object": "refund",
+                    "payment_intent": params.get("payment_intent"), "status": "succeeded",
+                    "amount": int(params.get("amount") or intent.get("amount", 0)),
+                })
+            return self._json(404, {"error": {"message": "Unknown route"}})
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lokalni Stripe/SendGrid stand-in")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=12111)
+    parser.add_argument("--latency-ms", type=float, default=0,
+                        help="umjetna latencija Stripe poziva")
+    parser.add_argument("--failure-rate", type=float, default=0,
+                        help="udio Stripe poziva koji vraća 500 (0–1)")
+    parser.add_argument("--webhook-url",
+                        help="kamo slati potpisani payment_intent.succeeded "
+                             "(bez ovoga intenti su odmah succeeded)")
+    parser.add_argument("--webhook-secret",
+                        default=os.environ.get("STRIPE_WEBHOOK_SECRET", "whsec_fake"),
+                        help="mora odgovarati STRIPE_WEBHOOK_SECRET backenda")
+    parser.add_argument("--webhook-delay-ms", type=float, default=500,
+                        help="koliko nakon kreiranja intenta kupac „plati\"")
+    parser.add_argument("--print-mail", action="store_true",
+                        help="ispiši svaki primljeni mail (lokalni sink)")
+    args = parser.parse_args()
+
+    state = FakeState(args.latency_ms, print_mail=args.print_mail,
+                      failure_rate=args.failure_rate, webhook_url=args.webhook_url,
+                      webhook_secret=args.webhook_secret,
+                      webhook_delay_ms=args.webhook_delay_ms)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(state))
+    print(f"[fakes] Stripe/SendGrid stand-in na :{args.port} "
+          f"(latencija {args.latency_ms:.0f} ms, webhook {args.webhook_url or '—'})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"[fakes] Statistika: {state.counts}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,424 @@
+"""
+Audit planova Mongo upita — `explain()` za katalog oblika upita iz
+routes/*, tasks.py i servisnih modula nad seedanim podacima.
+
+Svaki oblik u QUERY_SHAPES opisuje filter (i sort) kao funkciju uzoraka
+iz baze (klub, event, korisnik, konobar…), pa upit ide s realnim
+vrijednostima. Za svaki se ispiše pobjednički plan i zastavice:
+
+- COLLSCAN      — upit ne koristi nijedan indeks
+- SORT          — sortiranje u memoriji (indeks ne daje redoslijed)
+- SELECTIVITY   — pregledano više od POOR_SELECTIVITY_RATIO dokumenata po
+                  vraćenom (indeks postoji, ali ne sužava dovoljno)
+
+Za označene oblike predlaže se indeks po ESR pravilu (Equality → Sort →
+Range) u obliku retka za `ensure_indexes()` u db.py; prijedlog koji je
+prefiks postojećeg indeksa se preskače. `_id` lookupi nisu u katalogu.
+
+Obrnuto, indeks koji je prefiks drugog (npr. `event_id_1` uz
+`event_id_1_created_at_-1`) samo usporava upise: javlja se kao REDUNDANT i
+ide u `db.DROPPED_INDEXES`, a ensure_indexes() ga briše s postojećih baza.
+Tako su uklonjeni jednostruki indeksi karata, rezervacija, narudžbi i
+evenata nakon dodavanja složenih (user_id/event_id/club_id + vrijeme).
+
+    python -m loadtest.seed --users 20000
+    python -m loadtest.query_audit            # exit code 1 ako ima zastavica
+    python -m loadtest.query_audit --only orders
+"""
+
+import argparse
+import sys
+from datetime import datetime, timedelta
+
+from pymongo import ASCENDING, DESCENDING
+
+from db import db
+
+POOR_SELECTIVITY_RATIO = 10
+# Ispod ovoliko pregledanih dokumenata selektivnost nije problem
+SELECTIVITY_MIN_DOCS = 100
+
+_RANGE_OPERATORS = {"$gt", "$gte", "$lt", "$lte", "$ne", "$nin", "$regex", "$exists", "$not"}
+_ACTIVE_ORDER = ["placed", "accepted", "preparing"]
+_ACTIVE_RESERVATION = ["pending", "confirmed", "checked_in"]
+_SOLD_TICKET = ["valid", "checked_in"]
+
+
+def _shape(name, source, collection, query=None, sort=None, limit=None, pipeline=None):
+    return {"name": name, "source": source, "collection": collection, "query": query,
+            "sort": sort, "limit": limit, "pipeline": pipeline}
+
+
+# (ime, izvor, kolekcija, filter(s) / pipeline(s), sort, limit)
+QUERY_SHAPES = [
+    # --- eventi i klubovi (javni feed) ---
+    _shape("events.list", "routes/events.py:list_events", "events",
+           lambda s: {"is_published": True, "is_cancelled": {"$ne": True},
+                      "date": {"$gte": s["now"], "$lte": s["now"] + timedelta(days=30)}},
+           [("date", ASCENDING)], 200),
+    _shape("events.list_by_club", "routes/events.py:list_events", "events",
+           lambda s: {"is_published": True, "is_cancelled": {"$ne": True},
+                      "club_id": s["club_id"]},
+           [("date", ASCENDING)], 200),
+    _shape("events.upcoming", "routes/events.py:upcoming_events", "events",
+           lambda s: {"is_published": True, "is_cancelled": {"$ne": True},
+                      "date": {"$gte": s["now"]}},
+           [("date", ASCENDING)], 20),
+    _shape("events.club_upcoming", "routes/floor_maps.py, change_stream_worker.py", "events",
+           lambda s: {"club_id": s["club_id"], "date": {"$gte": s["now"]}}),
+    _shape("events.dashboard_upcoming", "routes/admin.py:dashboard", "events",
+           lambda s: {"club_id": s["club_id"], "is_cancelled": {"$ne": True},
+                      "date": {"$gte": s["now"]}}),
+    _shape("events.archivable", "archive_service.py:archive_finished_events", "events",
+           lambda s: {"date": {"$lt": s["now"] - timedelta(days=120)},
+                      "archive_status": {"$ne": "done"}},
+           [("date", ASCENDING)], 20),
+    _shape("events.reminder_window", "tasks.py:send_reservation_reminders", "events",
+           lambda s: {"date": {"$gte": s["now"] + timedelta(hours=23),
+                               "$lte": s["now"] + timedelta(hours=25)}}),
+    _shape("clubs.by_city", "routes/events.py:list_events", "clubs",
+           lambda s: {"location.city": {"$regex": f"^{s['city']}$", "$options": "i"}}),
+    _shape("clubs.active_by_slug", "routes/clubs.py:get_club", "clubs",
+           lambda s: {"slug": s["club_slug"], "is_active": True}),
+    _shape("floor_maps.active", "floor_map_index.py:active_map", "floor_maps",
+           lambda s: {"club_id": s["club_id"], "is_active": True}),
+    _shape("menus.active", "routes/menu.py, order_service.py", "menus",
+           lambda s: {"club_id": s["club_id"], "is_active": True}),
+
+    # --- karte ---
+    _shape("tickets.my", "routes/tickets.py:my_tickets", "tickets",
+           lambda s: {"user_id": s["user_id"]}, [("purchased_at", DESCENDING)], 200),
+    _shape("tickets.by_payment_intent", "payments.py:confirm_ticket_purchase", "tickets",
+           lambda s: {"stripe_payment_intent_id": s["payment_intent_id"]}),
+    _shape("tickets.by_qr", "routes/hostess.py:checkin_ticket", "tickets",
+           lambda s: {"qr_code": s["qr_code"]}),
+    _shape("tickets.admin_page", "routes/tickets.py:event_tickets", "tickets",
+           lambda s: {"event_id": s["event_id"], "status": {"$in": _SOLD_TICKET}},
+           [("purchased_at", DESCENDING), ("_id", DESCENDING)], 200),
+    _shape("tickets.guests", "routes/hostess.py:event_guests", "tickets",
+           lambda s: {"event_id": s["event_id"], "status": {"$in": _SOLD_TICKET},
+                      "guest.name_norm": {"$regex": "an"}}),
+    _shape("tickets.checked_in_count", "routes/tickets.py:event_ticket_stats", "tickets",
+           lambda s: {"event_id": s["event_id"], "status": "checked_in"}),
+    _shape("tickets.expire_pending", "tasks.py:expire_stale_payments", "tickets",
+           lambda s: {"status": "pending", "purchased_at": {"$lt": s["now"]}}),
+    _shape("tickets.by_user_propagate", "guest_profile.py:propagate", "tickets",
+           lambda s: {"user_id": s["user_id"], "guest": {"$ne": {}}}),
+    _shape("tickets.stats_by_status", "event_stats.py:compute", "tickets", pipeline=lambda s: [
+        {"$match": {"event_id": s["event_id"]}},
+        {"$group": {"_id": "$status", "count": {"$sum": 1}}},
+    ]),
+    _shape("tickets.revenue", "routes/admin.py:dashboard, tasks.py:generate_daily_report",
+           "tickets", pipeline=lambda s: [
+               {"$match": {"club_id": s["club_id"], "status": {"$in": _SOLD_TICKET},
+                           "purchased_at": {"$gte": s["now"] - timedelta(days=30)}}},
+               {"$group": {"_id": None, "total": {"$sum": "$price_paid"}, "count": {"$sum": 1}}},
+           ]),
+
+    # --- rezervacije ---
+    _shape("reservations.availability", "routes/reservations.py, table_availability.py",
+           "table_reservations",
+           lambda s: {"event_id": s["event_id"], "status": {"$in": _ACTIVE_RESERVATION}}),
+    _shape("reservations.table_taken", "reservation_service.py:create_reservation",
+           "table_reservations",
+           lambda s: {"event_id": s["event_id"], "table_id": s["table_id"],
+                      "status": {"$in": _ACTIVE_RESERVATION}}),
+    _shape("reservations.my", "routes/reservations.py:my_reservations", "table_reservations",
+           lambda s: {"user_id": s["user_id"]}, [("created_at", DESCENDING)], 100),
+    _shape("reservations.admin_page", "routes/reservations.py:event_reservations",
+           "table_reservations", lambda s: {"event_id": s["event_id"]},
+           [("created_at", DESCENDING), ("_id", DESCENDING)], 200),
+    _shape("reservations.reminders", "tasks.py:send_reservation_reminders",
+           "table_reservations",
+           lambda s: {"event_id": {"$in": [s["event_id"]]}, "status": "confirmed",
+                      "reminder_sent": False}),
+    _shape("reservations.expire_pending", "tasks.py:expire_stale_payments",
+           "table_reservations",
+           lambda s: {"status": "pending", "deposit_paid": False,
+                      "created_at": {"$lt": s["now"]}}),
+    _shape("reservations.dashboard_count", "routes/admin.py:dashboard", "table_reservations",
+           lambda s: {"club_id": s["club_id"],
+                      "created_at": {"$gte": s["now"] - timedelta(days=30)}}),
+    _shape("reservations.deposits", "routes/admin.py:dashboard", "table_reservations",
+           pipeline=lambda s: [
+               {"$match": {"club_id": s["club_id"], "deposit_paid": True,
+                           "created_at": {"$gte": s["now"] - timedelta(days=30)}}},
+               {"$group": {"_id": None, "total": {"$sum": "$deposit_amount"},
+                           "count": {"$sum": 1}}},
+           ]),
+
+    # --- narudžbe pića ---
+    _shape("orders.waiter", "routes/orders.py:waiter_orders", "drink_orders",
+           lambda s: {
+               "club_id": s["club_id"],
+               "order_status": {"$in": _ACTIVE_ORDER + ["delivered"]},
+               "$and": [
+                   {"$or": [{"waiter_id": s["waiter_id"]},
+                            {"section_id": {"$in": s["waiter_sections"]}}]},
+                   {"$or": [{"order_status": {"$in": _ACTIVE_ORDER}},
+                            {"order_status": "delivered", "payment_status": "cash_pending"}]},
+               ],
+           },
+           [("created_at", ASCENDING)]),
+    _shape("orders.bar", "routes/orders.py:bar_screen", "drink_orders",
+           lambda s: {"event_id": s["event_id"], "order_status": {"$in": _ACTIVE_ORDER}},
+           [("created_at", ASCENDING)]),
+    _shape("orders.my", "routes/orders.py:my_orders", "drink_orders",
+           lambda s: {"user_id": s["user_id"]}, [("created_at", DESCENDING)], 50),
+    _shape("orders.revenue", "routes/admin.py:dashboard, tasks.py:generate_daily_report",
+           "drink_orders", pipeline=lambda s: [
+               {"$match": {"club_id": s["club_id"], "payment_status": "paid",
+                           "created_at": {"$gte": s["now"] - timedelta(days=30)}}},
+               {"$group": {"_id": None, "total": {"$sum": "$total"}, "count": {"$sum": 1}}},
+           ]),
+    _shape("orders.live_facet", "event_stats.py:compute", "drink_orders", pipeline=lambda s: [
+        {"$match": {"event_id": s["event_id"]}},
+        {"$facet": {
+            "active": [{"$match": {"order_status": {"$in": _ACTIVE_ORDER}}}, {"$count": "n"}],
+            "revenue": [{"$match": {"payment_status": "paid"}},
+                        {"$group": {"_id": None, "total": {"$sum": "$total"}}}],
+        }},
+    ]),
+
+    # --- osoblje i korisnici ---
+    _shape("waiters.for_section", "order_service.py:place_order", "waiters",
+           lambda s: {"club_id": s["club_id"], "assigned_sections": s["section_id"],
+                      "is_active": True}),
+    _shape("waiters.by_club", "routes/admin.py:list_staff", "waiters",
+           lambda s: {"club_id": s["club_id"]}),
+    _shape("users.login", "routes/auth.py:login", "users",
+           lambda s: {"email": s["user_email"], "is_active": True}),
+    _shape("users.admin_list", "routes/admin.py:list_guest_users", "users",
+           lambda s: {}, [("created_at", DESCENDING)], 100),
+    _shape("users.missing_customer", "tasks.py:sweep_missing_stripe_customers", "users",
+           lambda s: {"stripe_customer_id": None, "is_active": True,
+                      "created_at": {"$gte": s["now"] - timedelta(days=7)}}),
+    _shape("reports.by_club", "routes/admin.py:reports", "reports",
+           lambda s: {"club_id": s["club_id"]}, [("date", DESCENDING)], 30),
+    _shape("stripe_events.stuck", "webhook_inbox.py:stuck_event_ids", "stripe_events",
+           lambda s: {"attempts": {"$lt": 10}, "$or": [
+               {"status": "received", "received_at": {"$lt": s["now"]},
+                "deferred_until": {"$not": {"$gte": s["now"]}}},
+               {"status": "failed", "retry_at": {"$lt": s["now"]}},
+               {"status": "processing", "lease_until": {"$lt": s["now"]}},
+           ]},
+           [("received_at", ASCENDING)], 500),
+    _shape("stripe_events.backlog", "webhook_inbox.py:_oldest_pending_age", "stripe_events",
+           lambda s: {"status": {"$in": ["received", "processing", "failed"]}},
+           [("received_at", ASCENDING)], 1),
+]
+
+
+def _samples():
+    """Realne vrijednosti za filtere — event s najviše karata i povezani dokumenti."""
+    busiest = next(db.tickets.aggregate([
+        {"$group": {"_id": "$event_id", "n": {"$sum": 1}}},
+        {"$sort": {"n": -1}}, {"$limit": 1},
+    ]), None)
+    if busiest is None:
+        sys.exit("Baza nema karata — prvo pokreni `python -m loadtest.seed`.")
+    event = db.events.find_one({"_id": busiest["_id"]})
+    club = db.clubs.find_one({"_id": event["club_id"]})
+    ticket = db.tickets.find_one({"event_id": event["_id"]})
+    user = db.users.find_one({"_id": ticket["user_id"]}) or {}
+    reservation = db.table_reservations.find_one({"event_id": event["_id"]}) or {}
+    waiter = db.waiters.find_one({"club_id": club["_id"]}) or {}
+    sections = waiter.get("assigned_sections") or []
+    return {
+        "now": datetime.utcnow(),
+        "club_id": club["_id"],
+        "club_slug": club.get("slug"),
+        "city": (club.get("location") or {}).get("city", ""),
+        "event_id": event["_id"],
+        "user_id": ticket["user_id"],
+        "user_email": user.get("email"),
+        "qr_code": ticket.get("qr_code"),
+        "payment_intent_id": ticket.get("stripe_payment_intent_id"),
+        "table_id": reservation.get("table_id"),
+        "waiter_id": waiter.get("_id"),
+        "waiter_sections": sections,
+        "section_id": sections[0] if sections else None,
+    }
+
+
+def _find_key(node, key):
+    """Prvi `key` bilo gdje u (ugniježđenom) explain dokumentu."""
+    if isinstance(node, dict):
+        if key in node:
+            return node[key]
+        children = node.values()
+    elif isinstance(node, list):
+        children = node
+    else:
+        return None
+    for child in children:
+        found = _find_key(child, key)
+        if found is not None:
+            return found
+    return None
+
+
+def _stages(plan):
+    """Sve faze plana (klasični i SBE `queryPlan` oblik)."""
+    if not isinstance(plan, dict):
+        return []
+    plan = plan.get("queryPlan", plan)
+    found = [plan]
+    for key in ("inputStage", "outerStage", "innerStage"):
+        found += _stages(plan.get(key))
+    for child in plan.get("inputStages", []):
+        found += _stages(child)
+    return found
+
+
+def explain(shape, samples):
+    """Explain (executionStats) za jedan oblik upita."""
+    col = db[shape["collection"]]
+    if shape["pipeline"]:
+        return db.command("explain", {
+            "aggregate": col.name, "pipeline": shape["pipeline"](samples), "cursor": {},
+        }, verbosity="executionStats")
+    cursor = col.find(shape["query"](samples))
+    if shape["sort"]:
+        cursor = cursor.sort(shape["sort"])
+    if shape["limit"]:
+        cursor = cursor.limit(shape["limit"])
+    return cursor.explain()
+
+
+def analyze(result):
+    """(zastavice, korišteni indeksi, statistika) iz explain rezultata."""
+    planner = _find_key(result, "queryPlanner") or {}
+    stats = _find_key(result, "executionStats") or {}
+    stages = _stages(planner.get("winningPlan", {}))
+    names = {stage.get("stage") for stage in stages}
+    indexes = sorted({stage["indexName"] for stage in stages if stage.get("indexName")})
+
+    flags = []
+    if "COLLSCAN" in names:
+        flags.append("COLLSCAN")
+    if "SORT" in names:
+        flags.append("SORT")
+    examined = stats.get("totalDocsExamined", 0)
+    returned = stats.get("nReturned", 0)
+    if examined >= SELECTIVITY_MIN_DOCS and examined > POOR_SELECTIVITY_RATIO * max(returned, 1):
+        flags.append("SELECTIVITY")
+    return flags, indexes, {
+        "keys": stats.get("totalKeysExamined", 0), "docs": examined, "returned": returned,
+        "ms": stats.get("executionTimeMillis", 0),
+    }
+
+
+def _conditions(query):
+    """Uvjeti filtera; polja iz `$or` grana se ne indeksiraju zajedničkim indeksom."""
+    for field, value in query.items():
+        if field == "$and":
+            for clause in value:
+                yield from _conditions(clause)
+        elif not field.startswith("$"):
+            yield field, value
+
+
+def propose_index(query, sort):
+    """ESR prijedlog: polja jednakosti → polja sorta → polja raspona."""
+    equality, ranges = [], []
+    for field, value in _conditions(query or {}):
+        is_range = isinstance(value, dict) and bool(_RANGE_OPERATORS & set(value))
+        (ranges if is_range else equality).append(field)
+    keys = [(f, ASCENDING) for f in equality]
+    keys += [(f, d) for f, d in sort or [] if f not in equality]
+    keys += [(f, ASCENDING) for f in ranges if f not in dict(keys)]
+    return keys
+
+
+def _match_and_sort(pipeline):
+    query = pipeline[0].get("$match", {}) if pipeline else {}
+    sort = list(pipeline[1]["$sort"].items()) if len(pipeline) > 1 and "$sort" in pipeline[1] \
+        else None
+    return query, sort
+
+
+def _is_covered(col, keys):
+    """Prijedlog je već prefiks postojećeg indeksa (ili obrnuto)."""
+    for index in col.index_information().values():
+        if not all(isinstance(d, (int, float)) for _, d in index["key"]):
+            continue  # text/2dsphere/hashed indeksi ne služe ESR prijedlogu
+        existing = [(f, int(d)) for f, d in index["key"]]
+        n = min(len(existing), len(keys))
+        if n and existing[:n] == keys[:n] and len(existing) >= len(keys):
+            return True
+    return False
+
+
+def _index_line(collection, keys):
+    spec = ", ".join(f'("{f}", {"ASCENDING" if d == 1 else "DESCENDING"})' for f, d in keys)
+    return f"{collection}_col.create_index([{spec}])"
+
+
+def redundant_indexes(col):
+    """Imena indeksa koji su strogi prefiks drugog običnog indeksa iste kolekcije."""
+    plain = {}
+    for name, index in col.index_information().items():
+        # unique/partial/sparse/TTL indeksi imaju ulogu osim samog upita
+        if name == "_id_" or set(index) - {"key", "v", "ns"}:
+            continue
+        if all(isinstance(d, (int, float)) for _, d in index["key"]):
+            plain[name] = [(f, int(d)) for f, d in index["key"]]
+    return sorted(
+        name for name, keys in plain.items()
+        if any(len(other) > len(keys) and other[:len(keys)] == keys
+               for other_name, other in plain.items() if other_name != name)
+    )
+
+
+def run(only=None):
+    samples = _samples()
+    proposals = {}
+    flagged = 0
+    print(f"{'oblik':32} {'zastavice':24} {'ključevi/dok./vraćeno':>24}  indeks")
+    for shape in QUERY_SHAPES:
+        if only and not shape["name"].startswith(only):
+            continue
+        flags, indexes, stats = analyze(explain(shape, samples))
+        counts = f"{stats['keys']}/{stats['docs']}/{stats['returned']}"
+        print(f"{shape['name']:32} {','.join(flags) or 'OK':24} {counts:>24}  "
+              f"{', '.join(indexes) or '—'}")
+        if not flags:
+            continue
+        flagged += 1
+        if shape["pipeline"]:
+            query, sort = _match_and_sort(shape["pipeline"](samples))
+        else:
+            query, sort = shape["query"](samples), shape["sort"]
+        keys = propose_index(query, sort)
+        if keys and not _is_covered(db[shape["collection"]], keys):
+            proposals.setdefault(_index_line(shape["collection"], keys), []).append(
+                f"{shape['name']} ({shape['source']})"
+            )
+
+    if proposals:
+        print("\nPrijedlozi za ensure_indexes() (db.py):")
+        for line, shapes in proposals.items():
+            print(f"    # {'; '.join(shapes)}")
+            print(f"    {line}")
+    redundant = 0
+    for collection in sorted({shape["collection"] for shape in QUERY_SHAPES}):
+        for name in redundant_indexes(db[collection]):
+            if not redundant:
+                print("\nREDUNDANT (dodaj u db.DROPPED_INDEXES):")
+            print(f"    {collection}.{name}")
+            redundant += 1
+    print(f"\n{flagged} oblika sa zastavicama, {len(proposals)} prijedloga indeksa, "
+          f"{redundant} suvišnih indeksa.")
+    return flagged + redundant
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Explain audit Mongo upita")
+    parser.add_argument("--only", help="samo oblici čije ime počinje ovim (npr. orders)")
+    args = parser.parse_args()
+    sys.exit(1 if run(args.only) else 0)
+
+
+if __name__ == "__main__":
+    main()
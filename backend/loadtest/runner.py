@@ -0,0 +1,318 @@
+from gevent import monkey
+monkey.patch_all()
+
+"""
+Load test runner — replay realističnog miksa prometa vršne noći.
+
+Virtualni korisnici (gevent greenleti) nasumično biraju scenarije prema
+težinama: pregled feeda, polling dostupnosti stolova, flash-sale kupnja
+karata, rezervacije, narudžbe pića, konobarske tranzicije i skeniranje na
+ulazu. JWT tokeni se potpisuju lokalno istom tajnom (JWT_SECRET), pa
+rate limit na login rutama ne utječe na mjerenje.
+
+Na kraju se ispisuju p50/p95/p99 po ruti; `--save-baseline` sprema
+rezultat, a `--baseline` ga uspoređuje i vraća exit code 1 pri regresiji.
+
+    python -m loadtest.runner --users 200 --duration 120 --baseline loadtest/baseline.json
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import uuid
+from collections import defaultdict
+
+import requests
+from flask import Flask
+from flask_jwt_extended import JWTManager
+from gevent.pool import Pool
+
+from auth_utils import issue_tokens
+from loadtest.seed import DEFAULT_MANIFEST
+
+BASE = os.environ.get("LOADTEST_BASE_URL", "http://localhost:5000")
+JWT_SECRET = os.environ.get("JWT_SECRET", "dev-secret-change-me")
+
+# Težine scenarija ≈ omjer prometa na vrhuncu noći
+SCENARIO_WEIGHTS = {
+    "browse": 30,
+    "poll_availability": 25,
+    "purchase": 12,
+    "reservation": 5,
+    "drink_order": 10,
+    "waiter": 12,
+    "door_scan": 6,
+}
+
+# Statusi koji su očekivani ishod natjecanja za resurs, a ne greška
+EXPECTED_CONFLICTS = {409}
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.conflicts = defaultdict(int)
+
+    def add(self, label, millis, status):
+        self.samples[label].append(millis)
+        if status in EXPECTED_CONFLICTS:
+            self.conflicts[label] += 1
+        elif status is None or status >= 400:
+            self.errors[label] += 1
+
+    def summary(self, elapsed):
+        out = {}
+        for label, values in sorted(self.samples.items()):
+            values = sorted(values)
+            out[label] = {
+                "count": len(values),
+                "rps": round(len(values) / elapsed, 2) if elapsed else 0,
+                "p50": round(percentile(values, 50), 2),
+                "p95": round(percentile(values, 95), 2),
+                "p99": round(percentile(values, 99), 2),
+                "error_rate": round(self.errors[label] / len(values), 4),
+                "conflict_rate": round(self.conflicts[label] / len(values), 4),
+            }
+        return out
+
+
+class Context:
+    """Dijeljeno stanje između virtualnih korisnika."""
+
+    def __init__(self, manifest, recorder):
+        self.manifest = manifest
+        self.recorder = recorder
+        self.clubs = manifest["clubs"]
+        self.reservations = defaultdict(list)   # user_id → [reservation_id]
+        self.door_queue = {c["club_id"]: list(c["door_qr_codes"]) for c in self.clubs}
+        for queue in self.door_queue.values():
+            random.shuffle(queue)
+
+        jwt_app = Flask("loadtest")
+        jwt_app.config["JWT_SECRET_KEY"] = JWT_SECRET
+        jwt_app.config["JWT_ACCESS_TOKEN_EXPIRES"] = 60 * 60 * 12
+        JWTManager(jwt_app)
+        self._jwt_app = jwt_app
+
+    def token(self, subject_id, role, club_id=None):
+        with self._jwt_app.app_context():
+            return issue_tokens(subject_id, role, club_id)["access_token"]
+
+
+class VirtualUser:
+    def __init__(self, ctx, user_id, club, confirm_via_api=True):
+        self.ctx = ctx
+        self.confirm_via_api = confirm_via_api
+        self.user_id = user_id
+        self.club = club
+        self.session = requests.Session()
+        self.token = ctx.token(user_id, "user")
+        self.hostess_token = ctx.token(club["hostess_id"], "hostess", club["club_id"])
+        self.waiter = random.choice(club["waiter_ids"])
+        self.waiter_token = ctx.token(self.waiter, "waiter", club["club_id"])
+
+    def call(self, label, method, path, token=None, body=None):
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+        start = time.perf_counter()
+        try:
+            resp = self.session.request(method, BASE + path, json=body,
+                                        headers=headers, timeout=30)
+            status = resp.status_code
+        except requests.RequestException:
+            resp, status = None, None
+        self.ctx.recorder.add(label, (time.perf_counter() - start) * 1000, status)
+        return resp
+
+    # ---------- scenariji ----------
+
+    def browse(self):
+        self.call("GET /api/events/upcoming", "GET", "/api/events/upcoming")
+        self.call("GET /api/clubs", "GET", "/api/clubs?city=Novalja")
+        event_id = random.choice(self.club["events"])
+        self.call("GET /api/events/<id>", "GET", f"/api/events/{event_id}")
+        if random.random() < 0.3:
+            self.call("GET /api/events", "GET", f"/api/events?club_id={self.club['club_id']}")
+
+    def poll_availability(self):
+        event_id = self.club["main_event"]
+        self.call("GET /api/reservations/event/<id>", "GET", f"/api/reservations/event/{event_id}")
+        if random.random() < 0.2:
+            self.call("GET /api/floor-maps/event/<id>", "GET", f"/api/floor-maps/event/{event_id}")
+
+    def purchase(self):
+        resp = self.call("POST /api/tickets/purchase", "POST", "/api/tickets/purchase",
+                         self.token, {"event_id": self.club["flash_event"],
+                                      "ticket_type_id": "lt-early",
+                                      "purchase_key": uuid.uuid4().hex})
+        if resp is None or resp.status_code != 201 or not self.confirm_via_api:
+            return
+        # client_secret je oblika pi_xxx_secret_yyy
+        pi_id = resp.json()["client_secret"].split("_secret_")[0]
+        self.call("POST /api/tickets/confirm", "POST", "/api/tickets/confirm",
+                  body={"payment_intent_id": pi_id})
+
+    def reservation(self):
+        table_id = random.choice(self.club["standard_tables"])
+        resp = self.call("POST /api/reservations", "POST", "/api/reservations", self.token,
+                         {"event_id": self.club["main_event"], "table_id": table_id,
+                          "guests_count": 2})
+        if resp is not None and resp.status_code == 201:
+            self.ctx.reservations[self.user_id].append(resp.json()["reservation_id"])
+
+    def drink_order(self):
+        reservations = self.ctx.reservations.get(self.user_id)
+        if not reservations:
+            return self.reservation()
+        items = [{"menu_item_id": random.choice(self.club["menu_items"]),
+                  "quantity": random.randint(1, 3)} for _ in range(random.randint(1, 3))]
+        self.call("POST /api/orders", "POST", "/api/orders", self.token,
+                  {"reservation_id": random.choice(reservations), "items": items,
+                   "payment_method": "cash"})
+
+    def waiter(self):
+        resp = self.call("GET /api/orders/waiter", "GET", "/api/orders/waiter", self.waiter_token)
+        if resp is None or resp.status_code != 200:
+            return
+        orders = resp.json().get("orders", [])
+        placed = [o for o in orders if o["order_status"] == "placed"]
+        accepted = [o for o in orders if o["order_status"] == "accepted"]
+        delivered = [o for o in orders if o["order_status"] == "delivered"]
+        if placed:
+            oid = placed[0]["_id"]
+            self.call("PUT /api/orders/<id>/accept", "PUT", f"/api/orders/{oid}/accept",
+                      self.waiter_token)
+        elif accepted:
+            oid = accepted[0]["_id"]
+            self.call("PUT /api/orders/<id>/deliver", "PUT", f"/api/orders/{oid}/deliver",
+                      self.waiter_token)
+        elif delivered:
+            oid = delivered[0]["_id"]
+            self.call("PUT /api/orders/<id>/collect-cash", "PUT",
+                      f"/api/orders/{oid}/collect-cash", self.waiter_token)
+
+    def door_scan(self):
+        queue = self.ctx.door_queue[self.club["club_id"]]
+        if not queue:
+            return
+        qr = queue.pop()
+        self.call("POST /api/hostess/checkin/ticket/<qr>", "POST",
+                  f"/api/hostess/checkin/ticket/{qr}?by=qr", self.hostess_token)
+        if random.random() < 0.1:
+            self.call("GET /api/hostess/event/<id>/stats", "GET",
+                      f"/api/hostess/event/{self.club['main_event']}/stats",
+                      self.hostess_token)
+
+    def run(self, deadline, think_ms):
+        names = list(SCENARIO_WEIGHTS)
+        weights = [SCENARIO_WEIGHTS[n] for n in names]
+        while time.time() < deadline:
+            getattr(self, random.choices(names, weights)[0])()
+            if think_ms:
+                time.sleep(random.expovariate(1000 / think_ms))
+
+
+def compare(summary, baseline, tolerance, min_delta_ms):
+    """Vrati listu regresija: p95 veći za > tolerance (i > min_delta_ms) ili više grešaka."""
+    regressions = []
+    for label, base in baseline.get("endpoints", {}).items():
+        current = summary.get(label)
+        if not current:
+            continue
+        if (current["p95"] > base["p95"] * (1 + tolerance)
+                and current["p95"] - base["p95"] > min_delta_ms):
+            regressions.append(f"{label}: p95 {base['p95']} → {current['p95']} ms")
+        if current["error_rate"] > base["error_rate"] + 0.01:
+            regressions.append(
+                f"{label}: error rate {base['error_rate']:.2%} → {current['error_rate']:.2%}"
+            )
+    return regressions
+
+
+def print_report(summary, elapsed):
+    print(f"\n=== Rezultati ({elapsed:.0f} s) ===")
+    print(f"{'ruta':<42}{'n':>7}{'rps':>8}{'p50':>9}{'p95':>9}{'p99':>9}{'err':>7}{'409':>7}")
+    for label, s in summary.items():
+        print(f"{label:<42}{s['count']:>7}{s['rps']:>8}{s['p50']:>9}{s['p95']:>9}"
+              f"{s['p99']:>9}{s['error_rate']:>7.1%}{s['conflict_rate']:>7.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test — vršna noć na Zrću")
+    parser.add_argument("--manifest", default=DEFAULT_MANIFEST)
+    parser.add_argument("--users", type=int, default=200, help="virtualnih korisnika")
+    parser.add_argument("--duration", type=int, default=60, help="sekundi")
+    parser.add_argument("--think-ms", type=float, default=500,
+                        help="prosječna pauza između koraka (eksponencijalna)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--confirm", choices=("api", "webhook"), default="api",
+                        help="api = runner zove /tickets/confirm (loadtest.fakes); "
+                             "webhook = potvrdu šalje loadtest.fakes --webhook-url")
+    parser.add_argument("--save-baseline", metavar="PATH")
+    parser.add_argument("--baseline", metavar="PATH")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="dopušteni rast p95 (0.2 = 20 %%)")
+    parser.add_argument("--min-delta-ms", type=float, default=5.0,
+                        help="ignoriraj regresije manje od ovoliko ms (šum)")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    with open(args.manifest) as fh:
+        manifest = json.load(fh)
+
+    recorder = Recorder()
+    ctx = Context(manifest, recorder)
+    users = random.sample(manifest["users"], min(args.users, len(manifest["users"])))
+    # Promet je neravnomjeran — prvi klub (npr. Papaya) dobiva pola korisnika
+    clubs = manifest["clubs"]
+    vus = [VirtualUser(ctx, uid, clubs[0] if i % 2 == 0 else random.choice(clubs),
+                       confirm_via_api=args.confirm == "api")
+           for i, uid in enumerate(users)]
+
+    print(f"=== Load test: {len(vus)} VU, {args.duration} s → {BASE} ===")
+    started = time.time()
+    deadline = started + args.duration
+    pool = Pool(len(vus))
+    for vu in vus:
+        pool.spawn(vu.run, deadline, args.think_ms)
+    pool.join()
+    elapsed = time.time() - started
+
+    summary = recorder.summary(elapsed)
+    print_report(summary, elapsed)
+
+    result = {
+        "meta": {"users": len(vus), "duration": args.duration, "seed": args.seed,
+                 "think_ms": args.think_ms, "confirm": args.confirm, "base_url": BASE,
+                 "finished_at": time.strftime("%Y-%m-%dT%H:%M:%S")},
+        "endpoints": summary,
+    }
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as fh:
+            json.dump(result, fh, indent=2)
+        print(f"\nBaseline spremljen u {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline) as fh:
+            baseline = json.load(fh)
+        regressions = compare(summary, baseline, args.tolerance, args.min_delta_ms)
+        if regressions:
+            print("\n✘ Regresije u odnosu na baseline:")
+            for line in regressions:
+                print(f"  - {line}")
+            sys.exit(1)
+        print("\n✔ Nema regresija u odnosu na baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+"""
+Bulk seed za load test — izravno u Mongo, redovima veličine brže od
+seed_demo.py koji ide kroz API.
+
+Svi dokumenti nose `loadtest: True` pa ih `--reset` briše bez diranja
+stvarnih podataka. Na kraju se zapisuje manifest (JSON) s ID-evima koje
+runner koristi za generiranje prometa.
+
+    python -m loadtest.seed --clubs 10 --events 3 --tables 120 --users 20000
+"""
+
+import argparse
+import json
+import os
+import random
+import uuid
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from pymongo import MongoClient
+from werkzeug.security import generate_password_hash
+
+from guest_profile import guest_snapshot
+
+MONGO_URI = os.environ.get("MONGO_URI", "mongodb://mongo:27017")
+DEFAULT_MANIFEST = os.path.join(os.path.dirname(__file__), "manifest.json")
+
+USER_PASSWORD = "loadtest123"
+STAFF_PIN = "4321"
+
+SEEDED_COLLECTIONS = [
+    "clubs", "events", "floor_maps", "menus", "hostesses", "waiters",
+    "users", "tickets", "table_reservations", "drink_orders",
+]
+
+MENU = [
+    {"id": "lt-vodka", "name": "Vodka", "price": 6.0},
+    {"id": "lt-gin", "name": "Gin tonik", "price": 8.0},
+    {"id": "lt-mojito", "name": "Mojito", "price": 10.0},
+    {"id": "lt-beer", "name": "Pivo", "price": 5.0},
+    {"id": "lt-water", "name": "Voda", "price": 3.0},
+]
+
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _floor_map(club_id, n_tables):
+    sections = [
+        {"id": f"sec-{i}", "name": f"Sekcija {i + 1}", "color": "#CC00FF", "table_ids": []}
+        for i in range(4)
+    ]
+    tables = []
+    cols = max(1, int(n_tables ** 0.5) + 1)
+    for i in range(n_tables):
+        is_vip = i % 10 == 0
+        section = sections[i % len(sections)]
+        table = {
+            "id": f"t-{i + 1}",
+            "label": f"{'VIP' if is_vip else 'S'}{i + 1}",
+            "type": "vip_separe" if is_vip else "standard",
+            "x": round(3 + (i % cols) * (94 / cols), 1),
+            "y": round(3 + (i // cols) * (64 / cols), 1),
+            "width": 4, "height": 4,
+            "capacity": random.choice([4, 6, 8, 10]) if not is_vip else 12,
+            "min_spend": 300 if is_vip else 50,
+            "deposit": 150 if is_vip else 0,
+            "section_id": section["id"],
+        }
+        section["table_ids"].append(table["id"])
+        tables.append(table)
+    return {
+        "club_id": club_id,
+        "name": "Load test tlocrt",
+        "background_image_url": None,
+        "width": 1000, "height": 700,
+        "tables": tables,
+        "sections": sections,
+        "is_active": True,
+        "updated_at": datetime.utcnow(),
+        "loadtest": True,
+    }
+
+
+# Runner ih kreira kroz API (bez `loadtest` oznake) — brišu se po klubu
+RUNNER_COLLECTIONS = ["tickets", "table_reservations", "drink_orders"]
+
+
+def reset(db):
+    club_ids = [c["_id"] for c in db.clubs.find({"loadtest": True}, {"_id": 1})]
+    if club_ids:
+        for name in RUNNER_COLLECTIONS:
+            deleted = db[name].delete_many({"club_id": {"$in": club_ids}}).deleted_count
+            print(f"  - {name} (runner): obrisano {deleted}")
+    for name in SEEDED_COLLECTIONS:
+        deleted = db[name].delete_many({"loadtest": True}).deleted_count
+        print(f"  - {name}: obrisano {deleted}")
+
+
+def seed(db, n_clubs, n_events, n_tables, n_users, tickets_ratio):
+    now = datetime.utcnow()
+    # Hash se računa jednom — werkzeug hash po korisniku bi trajao minutama
+    password_hash = generate_password_hash(USER_PASSWORD)
+    pin_hash = generate_password_hash(STAFF_PIN)
+    manifest = {"clubs": [], "users": [], "created_at": now.isoformat()}
+
+    users = [{
+        "_id": ObjectId(),
+        "email": f"lt-{i}@loadtest.local",
+        "name": f"Gost{i} Loadtest",
+        "phone": None,
+        "profile_image": None,
+        "auth_provider": "email",
+        "auth_provider_id": None,
+        "password_hash": password_hash,
+        "stripe_customer_id": None,
+        "is_active": True,
+        "created_at": now,
+        "loadtest": True,
+    } for i in range(n_users)]
+    for chunk in _chunks(users, 5000):
+        db.users.insert_many(chunk, ordered=False)
+    manifest["users"] = [str(u["_id"]) for u in users]
+    print(f"  ✔ {n_users} korisnika")
+
+    for c in range(n_clubs):
+        suffix = uuid.uuid4().hex[:6]
+        club_id = ObjectId()
+        db.clubs.insert_one({
+            "_id": club_id,
+            "name": f"Load Club {c + 1}",
+            "slug": f"lt-club-{c + 1}-{suffix}",
+            "location": {"city": "Novalja", "address": "Zrće bb",
+                         "coordinates": {"lat": 44.54, "lng": 14.91}},
+            "description": "Load test klub",
+            "capacity": 4000,
+            "cover_image": None, "gallery": [], "social_links": {},
+            "amenities": [], "age_limit": 18,
+            "is_active": True,
+            "created_at": now,
+            "loadtest": True,
+        })
+        floor_map = _floor_map(club_id, n_tables)
+        db.floor_maps.insert_one(floor_map)
+        db.menus.insert_one({
+            "club_id": club_id,
+            "name": "Load test meni",
+            "categories": [{"id": "lt-cat", "name": "Pića", "items": [
+                {**item, "description": None, "image_url": None,
+                 "is_available": True, "allergens": [], "volume": None}
+                for item in MENU
+            ]}],
+            "is_active": True,
+            "updated_at": now,
+            "loadtest": True,
+        })
+
+        hostess_id = db.hostesses.insert_one({
+            "club_id": club_id, "name": "Hostesa Loadtest",
+            "email": f"lt-hostess-{suffix}@loadtest.local",
+            "pin_hash": pin_hash, "password_hash": None, "role": "hostess",
+            "is_active": True, "created_at": now, "loadtest": True,
+        }).inserted_id
+        waiter_ids = db.waiters.insert_many([{
+            "club_id": club_id, "name": f"Konobar {s['id']}",
+            "email": f"lt-waiter-{s['id']}-{suffix}@loadtest.local",
+            "pin_hash": pin_hash, "password_hash": None, "role": "waiter",
+            "assigned_sections": [s["id"]],
+            "is_active": True, "created_at": now, "loadtest": True,
+        } for s in floor_map["sections"]]).inserted_ids
+
+        events = []
+        for e in range(n_events):
+            is_flash = e == 0
+            event = {
+                "_id": ObjectId(),
+                "club_id": club_id,
+                "name": f"{'Flash Sale' if is_flash else 'Party'} {c + 1}-{e + 1}",
+                "description": None,
+                "date": (now + timedelta(days=1 + e)).replace(hour=23, minute=0, second=0),
+                "genre": "house", "lineup": ["DJ Load"],
+                "cover_image": None, "gallery": [],
+                "ticket_types": [
+                    {"id": "lt-early", "name": "Early Bird", "price": 15.0,
+                     "total_quantity": 500 if is_flash else 5000, "sold_quantity": 0,
+                     "sale_start": None, "sale_end": None,
+                     "description": None, "is_active": True},
+                    {"id": "lt-regular", "name": "Regular", "price": 25.0,
+                     "total_quantity": 20000, "sold_quantity": 0,
+                     "sale_start": None, "sale_end": None,
+                     "description": None, "is_active": True},
+                ],
+                "age_limit": 18,
+                "is_published": True,
+                "is_cancelled": False,
+                "created_at": now,
+                "loadtest": True,
+            }
+            events.append(event)
+        db.events.insert_many(events)
+
+        # Dio gostiju već ima važeće karte — za door scan scenarij
+        main_event = events[-1]
+        holders = random.sample(users, int(len(users) * tickets_ratio / max(n_clubs, 1)))
+        tickets = [{
+            "user_id": u["_id"],
+            "event_id": main_event["_id"],
+            "club_id": club_id,
+            "ticket_type_id": "lt-regular",
+            "ticket_type_name": "Regular",
+            "price_paid": 25.0,
+            "qr_code": str(uuid.uuid4()),
+            "status": "valid",
+            "checked_in_at": None,
+            "checked_in_by": None,
+            "stripe_payment_intent_id": None,
+            "purchased_at": now,
+            "guest": guest_snapshot(u),
+            "loadtest": True,
+        } for u in holders]
+        for chunk in _chunks(tickets, 5000):
+            db.tickets.insert_many(chunk, ordered=False)
+        if tickets:
+            db.events.update_one(
+                {"_id": main_event["_id"]},
+                {"$inc": {"ticket_types.$[t].sold_quantity": len(tickets)}},
+                array_filters=[{"t.id": "lt-regular"}],
+            )
+
+        manifest["clubs"].append({
+            "club_id": str(club_id),
+            "events": [str(e["_id"]) for e in events],
+            "flash_event": str(events[0]["_id"]),
+            "main_event": str(main_event["_id"]),
+            "standard_tables": [t["id"] for t in floor_map["tables"]
+                                if t["type"] == "standard"],
+            "menu_items": [i["id"] for i in MENU],
+            "hostess_id": str(hostess_id),
+            "waiter_ids": [str(w) for w in waiter_ids],
+            "door_qr_codes": [t["qr_code"] for t in tickets],
+        })
+        print(f"  ✔ klub {c + 1}/{n_clubs}: {n_events} evenata, {n_tables} stolova, "
+              f"{len(tickets)} karata")
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk seed za load test")
+    parser.add_argument("--clubs", type=int, default=10)
+    parser.add_argument("--events", type=int, default=3, help="eventa po klubu")
+    parser.add_argument("--tables", type=int, default=120, help="stolova po mapi")
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--tickets-ratio", type=float, default=0.3,
+                        help="udio gostiju s važećom kartom (door scan)")
+    parser.add_argument("--seed", type=int, default=42, help="random seed (reproducibilnost)")
+    parser.add_argument("--manifest", default=DEFAULT_MANIFEST)
+    parser.add_argument("--reset", action="store_true", help="samo obriši load test podatke")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    client = MongoClient(MONGO_URI)
+    db = client["mydb"]
+
+    print("=== Load test seed ===")
+    reset(db)
+    if args.reset:
+        client.close()
+        return
+
+    manifest = seed(db, args.clubs, args.events, args.tables, args.users, args.tickets_ratio)
+    with open(args.manifest, "w") as fh:
+        json.dump(manifest, fh)
+    print(f"Manifest zapisan u {args.manifest}")
+    client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Backfill: snapshot gosta (`guest`) na postojećim kartama i rezervacijama.
+
+Nove karte i rezervacije dobivaju `guest` pri kreiranju (guest_profile.py);
+ova skripta ga dopisuje starijim dokumentima. Korisnici se dohvaćaju u
+batchevima (`$in`), a upisi idu kao jedan bulk_write UpdateMany po
+korisniku i batchu. Idempotentna je — dira samo dokumente bez snapshota —
+pa se smije prekinuti i ponovno pokrenuti.
+
+Pokretanje:
+    docker compose exec backend python migrate_guest_snapshot.py
+"""
+
+from pymongo import UpdateMany
+
+from db import table_reservations_col, tickets_col, users_col
+from guest_profile import GUEST_PROJECTION, guest_snapshot
+
+BATCH_SIZE = 1000
+
+
+def _user_ids_without_snapshot(col):
+    return col.distinct("user_id", {"guest": {"$exists": False}})
+
+
+def backfill(col):
+    user_ids = _user_ids_without_snapshot(col)
+    updated = 0
+    for i in range(0, len(user_ids), BATCH_SIZE):
+        batch = user_ids[i:i + BATCH_SIZE]
+        users = {u["_id"]: u for u in users_col.find({"_id": {"$in": batch}}, GUEST_PROJECTION)}
+        ops = [
+            UpdateMany({"user_id": user_id, "guest": {"$exists": False}},
+                       {"$set": {"guest": guest_snapshot(users.get(user_id))}})
+            for user_id in batch
+        ]
+        updated += col.bulk_write(ops, ordered=False).modified_count
+        print(f"  … {col.name}: {min(i + BATCH_SIZE, len(user_ids))}/{len(user_ids)} korisnika")
+    return updated
+
+
+def run_migration():
+    print("=== Backfill snapshota gosta (tickets, table_reservations) ===")
+    for col in (tickets_col, table_reservations_col):
+        updated = backfill(col)
+        print(f"  ✔ {col.name}: {updated} dokumenata dobilo `guest`")
+    print("Backfill gotov. Indeksi (event_id, guest.name_norm) kreiraju se kroz ensure_indexes().")
+
+
+if __name__ == "__main__":
+    run_migration()
@@ -4,7 +4,8 @@ Logika narudžbi pića (FAZA 7).
 Naručivanje je dostupno samo gostima s aktivnom rezervacijom stola.
 Cijene stavki razrješavaju se server-side iz menija kluba, VIP kupon
 se automatski primjenjuje, a konobar pripadajuće sekcije dobiva
-narudžbu real-time putem Redis Pub/Sub → Socket.IO.
+narudžbu real-time — change_stream_worker za svaku promjenu statusa zove
+publish_order_update (Redis queue → Socket.IO).
 """
 
 from datetime import datetime
@@ -13,6 +14,7 @@ from bson import ObjectId
 
 import stripe_service
 from db import drink_orders_col, menus_col, table_reservations_col, waiters_col
+from floor_map_index import active_map
 from realtime import publish
 from reservation_service import apply_coupon
 
@@ -73,10 +75,14 @@ def place_order(user_id, reservation_id, raw_items, payment_method):
     subtotal = round(sum(i["subtotal"] for i in items), 2)
     final_total, coupon_applied = apply_coupon(reservation_id, subtotal)
 
-    # Pronađi konobara zaduženog za sekciju stola
+    # Sekcija iz trenutne verzije mape (admin je mogao premjestiti stol
+    # nakon rezervacije), pa konobar zadužen za nju
+    floor_map = active_map(reservation["club_id"])
+    section_id = (floor_map and floor_map.section_of(reservation["table_id"])) \
+        or reservation.get("section_id")
     waiter = waiters_col.find_one({
         "club_id": reservation["club_id"],
-        "assigned_sections": reservation.get("section_id"),
+        "assigned_sections": section_id,
         "is_active": True,
     })
 
@@ -87,7 +93,7 @@ def place_order(user_id, reservation_id, raw_items, payment_method):
         "table_reservation_id": ObjectId(reservation_id),
         "table_id": reservation["table_id"],
         "table_label": reservation["table_label"],
-        "section_id": reservation.get("section_id"),
+        "section_id": section_id,
         "waiter_id": waiter["_id"] if waiter else None,
         "items": items,
         "subtotal": subtotal,
@@ -105,13 +111,12 @@ def place_order(user_id, reservation_id, raw_items, payment_method):
     result = drink_orders_col.insert_one(order)
     order_id = str(result.inserted_id)
 
-    _publish_order_update(order, order_id)
     return order_id, order
 
 
-def _publish_order_update(order, order_id):
+def publish_order_update(order):
     publish('order_updates', {
-        "order_id": order_id,
+        "order_id": str(order["_id"]),
         "waiter_id": str(order["waiter_id"]) if order.get("waiter_id") else None,
         "event_id": str(order["event_id"]),
         "table_label": order.get("table_label"),
@@ -135,7 +140,6 @@ def _transition(order_id, updates, expected_query=None):
     )
     if not order:
         raise OrderError("Narudžba ne postoji ili prijelaz nije dozvoljen")
-    _publish_order_update(order, str(order["_id"]))
     return order
 
 
@@ -207,5 +211,4 @@ def cancel_order(order_id, user_id=None):
     )
     order["order_status"] = "cancelled"
     order["payment_status"] = payment_status
-    _publish_order_update(order, str(order["_id"]))
     return order
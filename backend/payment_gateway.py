@@ -0,0 +1,272 @@
+"""
+Payment gateway sučelje — jedina implementacija je Stripe.
+
+Ostatak backenda razgovara samo sa stripe_service.py, koji gradi metadata
+i zove `get_gateway()`. Za offline testove i benchmark Stripe SDK se
+usmjerava na HTTP stand-in (loadtest/fakes.py, STRIPE_API_BASE), pa se
+mjeri isti kod kao u produkciji — uključujući SDK, pool i breaker.
+
+Zaštita od degradiranog Stripea:
+- keep-alive HTTP pool (STRIPE_HTTP_POOL_SIZE) sa strogim timeoutom
+  (STRIPE_TIMEOUT_SECONDS); SDK retryji (STRIPE_MAX_RETRIES) su po defaultu
+  isključeni jer svaki množi najgore trajanje poziva — svaki POST ipak nosi
+  eksplicitni idempotency key pa je retry siguran kad se uključi
+- bulkhead: najviše STRIPE_MAX_CONCURRENCY poziva odjednom; tko ne dobije
+  mjesto u STRIPE_ACQUIRE_TIMEOUT_MS odmah dobiva GatewayUnavailable
+- circuit breaker: nakon STRIPE_BREAKER_FAILURES uzastopnih grešaka
+  poziva se ne radi STRIPE_BREAKER_RESET_SECONDS, zatim jedan probni poziv
+Rute GatewayUnavailable pretvaraju u 503 i odmah otpuštaju kvotu/stanje.
+"""
+
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+
+import requests
+import stripe
+from prometheus_client import Counter, Gauge, Histogram
+from requests.adapters import HTTPAdapter
+
+STRIPE_TIMEOUT_SECONDS = float(os.environ.get("STRIPE_TIMEOUT_SECONDS", "8"))
+STRIPE_MAX_RETRIES = int(os.environ.get("STRIPE_MAX_RETRIES", "0"))
+STRIPE_HTTP_POOL_SIZE = int(os.environ.get("STRIPE_HTTP_POOL_SIZE", "50"))
+STRIPE_MAX_CONCURRENCY = int(os.environ.get("STRIPE_MAX_CONCURRENCY", "40"))
+STRIPE_ACQUIRE_TIMEOUT_MS = float(os.environ.get("STRIPE_ACQUIRE_TIMEOUT_MS", "250"))
+STRIPE_BREAKER_FAILURES = int(os.environ.get("STRIPE_BREAKER_FAILURES", "5"))
+STRIPE_BREAKER_RESET_SECONDS = float(os.environ.get("STRIPE_BREAKER_RESET_SECONDS", "30"))
+
+stripe.api_key = os.environ.get("STRIPE_SECRET_KEY")
+# Lokalni HTTP stand-in Stripe API-ja (loadtest/fakes.py)
+if os.environ.get("STRIPE_API_BASE"):
+    stripe.api_base = os.environ["STRIPE_API_BASE"]
+
+
+def _stripe_http_client():
+    """Jedna keep-alive sesija po procesu umjesto SDK defaulta bez limita."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=STRIPE_HTTP_POOL_SIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return stripe.RequestsClient(timeout=STRIPE_TIMEOUT_SECONDS, session=session)
+
+
+stripe.default_http_client = _stripe_http_client()
+stripe.max_network_retries = STRIPE_MAX_RETRIES
+
+GATEWAY_CALLS = Counter(
+    "payment_gateway_calls_total",
+    "Payment gateway calls by outcome (ok, declined, error, rejected, unavailable)",
+    ["operation", "outcome"],
+)
+
+GATEWAY_LATENCY = Histogram(
+    "payment_gateway_call_seconds",
+    "Payment gateway call latency",
+    ["operation"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 16),
+)
+
+GATEWAY_CIRCUIT_OPEN = Gauge(
+    "payment_gateway_circuit_open",
+    "1 while the payment gateway circuit breaker is open",
+)
+
+
+class PaymentGatewayError(Exception):
+    pass
+
+
+class GatewayUnavailable(PaymentGatewayError):
+    """Gateway je preopterećen ili breaker otvoren — poziv nije ni poslan."""
+
+
+class PaymentGateway(ABC):
+    """Zajedničko sučelje; iznosi su u centima, valuta je uvijek EUR."""
+
+    def __init__(self, webhook_secret):
+        self.webhook_secret = webhook_secret
+
+    @abstractmethod
+    def create_payment_intent(self, amount_cents, customer, metadata, idempotency_key=None):
+        ...
+
+    @abstractmethod
+    def retrieve_payment_intent(self, payment_intent_id):
+        ...
+
+    @abstractmethod
+    def refund_payment_intent(self, payment_intent_id, amount_cents=None, idempotency_key=None):
+        """Puni refund; `amount_cents` za djelomični (dio grupne kupnje)."""
+
+    @abstractmethod
+    def create_customer(self, email, name, metadata, idempotency_key=None):
+        ...
+
+    def is_transient(self, exc):
+        """Greške koje znače degradaciju servisa (broje se u breaker)."""
+        return isinstance(exc, PaymentGatewayError)
+
+    def construct_webhook_event(self, payload, sig_header):
+        """Verifikacija potpisa je lokalni HMAC — ne ide na mrežu."""
+        return stripe.Webhook.construct_event(payload, sig_header, self.webhook_secret)
+
+
+class StripeGateway(PaymentGateway):
+    def create_payment_intent(self, amount_cents, customer, metadata, idempotency_key=None):
+        return stripe.PaymentIntent.create(
+            amount=amount_cents,
+            currency="eur",
+            customer=customer,
+            metadata=metadata,
+            automatic_payment_methods={"enabled": True},
+            idempotency_key=idempotency_key,
+        )
+
+    def retrieve_payment_intent(self, payment_intent_id):
+        return stripe.PaymentIntent.retrieve(payment_intent_id)
+
+    def refund_payment_intent(self, payment_intent_id, amount_cents=None, idempotency_key=None):
+        params = {"payment_intent": payment_intent_id}
+        if amount_cents is not None:
+            params["amount"] = amount_cents
+        return stripe.Refund.create(**params, idempotency_key=idempotency_key)
+
+    def create_customer(self, email, name, metadata, idempotency_key=None):
+        return stripe.Customer.create(email=email, name=name, metadata=metadata,
+                                      idempotency_key=idempotency_key)
+
+    def is_transient(self, exc):
+        # Kartične/validacijske greške su odgovor zdravog Stripea
+        return isinstance(exc, (stripe.APIConnectionError, stripe.RateLimitError,
+                                stripe.APIError))
+
+
+class CircuitBreaker:
+    """closed → (N uzastopnih grešaka) → open → (reset timeout) → half-open."""
+
+    def __init__(self, failure_threshold, reset_seconds):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if self.probing or time.monotonic() - self.opened_at < self.reset_seconds:
+                return False
+            # Half-open: propusti točno jedan probni poziv
+            self.probing = True
+            return True
+
+    def retry_after(self):
+        with self._lock:
+            opened_at = self.opened_at
+        if opened_at is None:
+            return 1
+        return max(1, int(self.reset_seconds - (time.monotonic() - opened_at)))
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+        GATEWAY_CIRCUIT_OPEN.set(0)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            opened = self.probing or self.failures >= self.failure_threshold
+            if opened:
+                self.opened_at = time.monotonic()
+                self.probing = False
+        if opened:
+            GATEWAY_CIRCUIT_OPEN.set(1)
+
+    def record_neutral(self):
+        """
+        Poziv ne govori ništa o zdravlju gatewaya (klijentska greška ili
+        odbijen u bulkheadu). Ako je to bio probni poziv, breaker ostaje
+        otvoren i idući poziv postaje nova proba.
+        """
+        with self._lock:
+            self.probing = False
+
+
+class ResilientGateway:
+    """Bulkhead + circuit breaker + metrike oko bilo kojeg PaymentGatewaya."""
+
+    def __init__(self, inner, max_concurrency, acquire_timeout_ms, breaker):
+        self.inner = inner
+        self.breaker = breaker
+        self.acquire_timeout = acquire_timeout_ms / 1000
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+
+    def _call(self, operation, fn, *args, **kwargs):
+        if not self.breaker.allow():
+            GATEWAY_CALLS.labels(operation, "unavailable").inc()
+            raise GatewayUnavailable("Plaćanja su privremeno nedostupna")
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            # Breaker je možda pustio probni poziv — oslobodi probu, ne zatvaraj
+            self.breaker.record_neutral()
+            GATEWAY_CALLS.labels(operation, "rejected").inc()
+            raise GatewayUnavailable("Previše istovremenih plaćanja")
+        start = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as exc:
+            if self.inner.is_transient(exc):
+                self.breaker.record_failure()
+                GATEWAY_CALLS.labels(operation, "error").inc()
+            else:
+                self.breaker.record_neutral()
+                GATEWAY_CALLS.labels(operation, "declined").inc()
+            raise
+        else:
+            self.breaker.record_success()
+            GATEWAY_CALLS.labels(operation, "ok").inc()
+            return result
+        finally:
+            self._slots.release()
+            GATEWAY_LATENCY.labels(operation).observe(time.perf_counter() - start)
+
+    def create_payment_intent(self, amount_cents, customer, metadata, idempotency_key=None):
+        return self._call("create_payment_intent", self.inner.create_payment_intent,
+                          amount_cents, customer, metadata, idempotency_key=idempotency_key)
+
+    def retrieve_payment_intent(self, payment_intent_id):
+        return self._call("retrieve_payment_intent", self.inner.retrieve_payment_intent,
+                          payment_intent_id)
+
+    def refund_payment_intent(self, payment_intent_id, amount_cents=None, idempotency_key=None):
+        return self._call("refund_payment_intent", self.inner.refund_payment_intent,
+                          payment_intent_id, amount_cents=amount_cents,
+                          idempotency_key=idempotency_key)
+
+    def create_customer(self, email, name, metadata, idempotency_key=None):
+        return self._call("create_customer", self.inner.create_customer,
+                          email, name, metadata, idempotency_key=idempotency_key)
+
+    def construct_webhook_event(self, payload, sig_header):
+        # Lokalna HMAC provjera — ne ide kroz bulkhead ni breaker
+        return self.inner.construct_webhook_event(payload, sig_header)
+
+
+_gateway = None
+
+
+def get_gateway():
+    """Singleton gatewaya po procesu."""
+    global _gateway
+    if _gateway is None:
+        _gateway = ResilientGateway(
+            StripeGateway(webhook_secret=os.environ.get("STRIPE_WEBHOOK_SECRET")),
+            max_concurrency=STRIPE_MAX_CONCURRENCY,
+            acquire_timeout_ms=STRIPE_ACQUIRE_TIMEOUT_MS,
+            breaker=CircuitBreaker(STRIPE_BREAKER_FAILURES, STRIPE_BREAKER_RESET_SECONDS),
+        )
+    return _gateway
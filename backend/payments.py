@@ -8,78 +8,131 @@ Svaka funkcija prima Stripe PaymentIntent (dict ili objekt) čiji metadata
 from datetime import datetime
 
 from bson import ObjectId
+from pymongo import UpdateOne
 
 import stripe_service
-from db import drink_orders_col, events_col, table_reservations_col, tickets_col
-from email_service import send_ticket_confirmation
-from realtime import publish
+import ticket_signing
+from db import drink_orders_col, events_col, tickets_col
+from email_service import queue_ticket_confirmation
 from reservation_service import confirm_vip_deposit
 
 
+def claim_ticket_quota(event, counts):
+    """
+    Atomarno zauzme kvotu za {ticket_type_id: količina} — sve ili ništa.
+
+    Guard za svaki tip je $elemMatch u filteru dokumenta, pa se update ili
+    primijeni na sve tipove ili ni na jedan (grupa ne može ostati napola
+    prodana). Vraća True ako je kvota zauzeta.
+    """
+    totals = {t["id"]: t["total_quantity"] for t in event.get("ticket_types", [])}
+    type_ids = list(counts)
+    result = events_col.update_one(
+        {"_id": event["_id"], "$and": [
+            {"ticket_types": {"$elemMatch": {
+                "id": type_id,
+                "sold_quantity": {"$lte": totals[type_id] - counts[type_id]},
+            }}}
+            for type_id in type_ids
+        ]},
+        {"$inc": {f"ticket_types.$[t{i}].sold_quantity": counts[type_id]
+                  for i, type_id in enumerate(type_ids)}},
+        array_filters=[{f"t{i}.id": type_id} for i, type_id in enumerate(type_ids)],
+    )
+    return bool(result.modified_count)
+
+
+def release_ticket_quota(event_id, counts):
+    """Vraća kvotu zauzetu s claim_ticket_quota (neuspjelo plaćanje)."""
+    type_ids = list(counts)
+    events_col.update_one(
+        {"_id": event_id},
+        {"$inc": {f"ticket_types.$[t{i}].sold_quantity": -counts[type_id]
+                  for i, type_id in enumerate(type_ids)}},
+        array_filters=[{f"t{i}.id": type_id} for i, type_id in enumerate(type_ids)],
+    )
+
+
+def _make_valid(event, tickets, from_status):
+    """
+    Karte iz `from_status` → valid. Potpisani QR (ticket_signing) nastaje
+    tek ovdje: neplaćena karta ima samo UUID koji offline provjera ne
+    prihvaća. Vraća broj potvrđenih karata.
+    """
+    codes = ticket_signing.qr_codes_for(
+        event, [(t["_id"], t["ticket_type_id"]) for t in tickets]
+    )
+    if not any(codes):
+        return tickets_col.update_many(
+            {"_id": {"$in": [t["_id"] for t in tickets]}, "status": from_status},
+            {"$set": {"status": "valid"}},
+        ).modified_count
+    return tickets_col.bulk_write([
+        UpdateOne(
+            {"_id": ticket["_id"], "status": from_status},
+            {"$set": {"status": "valid", **({"qr_code": code} if code else {})}},
+        )
+        for ticket, code in zip(tickets, codes)
+    ], ordered=False).modified_count
+
+
 def confirm_ticket_purchase(pi):
     """
-    payment_intent.succeeded za kupnju karte → karta postaje važeća.
+    payment_intent.succeeded za kupnju karata → karte postaju važeće.
 
-    Kvota (sold_quantity) je rezervirana već pri kupnji, pa se ovdje samo
-    mijenja status. Ako je karta u međuvremenu istekla (expired), pokušava
-    se ponovno zauzeti kvota; ako je rasprodano, plaćanje se refundira.
+    Jedan PI pokriva sve karte grupne kupnje, pa se pending karte potvrđuju
+    jednim update_many (bulk_write kad event potpisuje QR kodove). Kvota
+    (sold_quantity) je rezervirana već pri kupnji; ako su karte u
+    međuvremenu istekle (expired), pokušava se ponovno zauzeti kvota, a ako
+    je rasprodano, njihov iznos se refundira.
     """
     pi_id = pi["id"] if isinstance(pi, dict) else pi.id
-    ticket = tickets_col.find_one({"stripe_payment_intent_id": pi_id})
-    if not ticket:
+    tickets = list(tickets_col.find({"stripe_payment_intent_id": pi_id}))
+    if not tickets:
         return False
 
-    status = ticket.get("status")
-    if status in ("valid", "checked_in"):
-        return True  # webhook retry / fallback confirm — već obrađeno
+    pending = [t for t in tickets if t.get("status") == "pending"]
+    expired = [t for t in tickets if t.get("status") == "expired"]
+    if not pending and not expired:
+        # webhook retry / fallback confirm — već obrađeno (ili otkazano)
+        return any(t.get("status") in ("valid", "checked_in") for t in tickets)
+
+    event = events_col.find_one({"_id": tickets[0]["event_id"]}) or {
+        "_id": tickets[0]["event_id"]
+    }
+    if pending:
+        if _make_valid(event, pending, "pending"):
+            queue_ticket_confirmation(pending)
+    if not expired:
+        return True
 
-    if status == "pending":
-        result = tickets_col.update_one(
-            {"_id": ticket["_id"], "status": "pending"},
-            {"$set": {"status": "valid"}},
-        )
-        if result.modified_count:
-            send_ticket_confirmation(ticket)
+    # Plaćanje je stiglo nakon isteka — pokušaj ponovno zauzeti kvotu
+    expired_ids = [t["_id"] for t in expired]
+    counts = {}
+    for ticket in expired:
+        counts[ticket["ticket_type_id"]] = counts.get(ticket["ticket_type_id"], 0) + 1
+    known_types = {t["id"] for t in event.get("ticket_types", [])}
+    if set(counts) <= known_types and claim_ticket_quota(event, counts):
+        _make_valid(event, expired, "expired")
+        queue_ticket_confirmation(expired)
         return True
 
-    if status == "expired":
-        # Plaćanje je stiglo nakon isteka — pokušaj ponovno zauzeti kvotu
-        event = events_col.find_one({"_id": ticket["event_id"]})
-        ticket_type = next(
-            (t for t in (event or {}).get("ticket_types", [])
-             if t["id"] == ticket["ticket_type_id"]),
-            None,
+    # Rasprodano → automatski refund isteklih karata (cijeli PI ako su sve)
+    partial = len(expired) < len(tickets)
+    try:
+        stripe_service.refund_payment_intent(
+            pi_id,
+            amount_eur=sum(t["price_paid"] for t in expired) if partial else None,
         )
-        if ticket_type:
-            claimed = events_col.update_one(
-                {"_id": ticket["event_id"]},
-                {"$inc": {"ticket_types.$[t].sold_quantity": 1}},
-                array_filters=[{
-                    "t.id": ticket["ticket_type_id"],
-                    "t.sold_quantity": {"$lt": ticket_type["total_quantity"]},
-                }],
-            )
-            if claimed.modified_count:
-                tickets_col.update_one(
-                    {"_id": ticket["_id"]}, {"$set": {"status": "valid"}}
-                )
-                send_ticket_confirmation(ticket)
-                return True
-
-        # Rasprodano → automatski refund
-        try:
-            stripe_service.refund_payment_intent(pi_id)
-            tickets_col.update_one(
-                {"_id": ticket["_id"]}, {"$set": {"status": "refunded"}}
-            )
-        except Exception as exc:
-            tickets_col.update_one(
-                {"_id": ticket["_id"]},
-                {"$set": {"refund_status": "failed", "refund_error": str(exc)}},
-            )
-        return False
-
-    return False
+        tickets_col.update_many(
+            {"_id": {"$in": expired_ids}}, {"$set": {"status": "refunded"}}
+        )
+    except Exception as exc:
+        tickets_col.update_many(
+            {"_id": {"$in": expired_ids}},
+            {"$set": {"refund_status": "failed", "refund_error": str(exc)}},
+        )
+    return bool(pending)
 
 
 def confirm_deposit_payment(pi):
@@ -92,14 +145,6 @@ def confirm_deposit_payment(pi):
     pi_id = pi["id"] if isinstance(pi, dict) else pi.id
 
     confirmed = confirm_vip_deposit(reservation_id, amount, pi_id)
-
-    reservation = table_reservations_col.find_one({"_id": ObjectId(reservation_id)})
-    if reservation:
-        publish('table_updates', {
-            "event_id": str(reservation["event_id"]),
-            "table_id": reservation["table_id"],
-            "status": "reserved" if confirmed else "free",
-        })
     return confirmed
 
 
@@ -110,19 +155,10 @@ def confirm_drink_payment(pi):
     if not order_id:
         return False
 
-    result = drink_orders_col.find_one_and_update(
+    drink_orders_col.update_one(
         {"_id": ObjectId(order_id)},
         {"$set": {"payment_status": "paid", "paid_at": datetime.utcnow()}},
     )
-    if result:
-        publish('order_updates', {
-            "order_id": order_id,
-            "waiter_id": str(result["waiter_id"]) if result.get("waiter_id") else None,
-            "event_id": str(result["event_id"]),
-            "table_label": result.get("table_label"),
-            "order_status": result.get("order_status"),
-            "payment_status": "paid",
-        })
     return True
 
 
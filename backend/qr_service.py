@@ -0,0 +1,45 @@
+"""
+QR slike karata — generiraju se lijeno i keširaju na disku.
+
+PNG se radi tek kad je prvi put potreban (email potvrde) i sprema u
+UPLOAD_DIR/qr/<qr_code>.png; svaki sljedeći poziv samo vraća URL. Ime
+datoteke je sam qr_code (UUID4 ili potpisani kod, ticket_signing.py), pa URL
+nije pogodiv ništa više nego kod.
+Volume `uploads` dijele backend (servira /api/uploads/qr/…) i worker
+(generira slike).
+"""
+
+import os
+import re
+import uuid
+
+import qrcode
+
+from upload_service import UPLOAD_DIR, UPLOAD_FILE_MODE
+
+QR_DIR = os.path.join(UPLOAD_DIR, "qr")
+# Apsolutna baza za linkove u emailovima (klijent maila nema relativni origin)
+PUBLIC_BASE_URL = os.environ.get("PUBLIC_BASE_URL", "http://localhost").rstrip("/")
+
+_QR_CODE_RE = re.compile(r"[A-Za-z0-9_-][A-Za-z0-9._-]{7,127}")
+
+
+def qr_image_path(qr_code):
+    """Putanja PNG-a; generira ga ako još ne postoji."""
+    if not _QR_CODE_RE.fullmatch(qr_code or ""):
+        raise ValueError("Neispravan QR kod")
+    path = os.path.join(QR_DIR, f"{qr_code}.png")
+    if not os.path.exists(path):
+        os.makedirs(QR_DIR, exist_ok=True)
+        image = qrcode.make(qr_code, box_size=8, border=2)
+        # Atomarni rename — paralelni worker nikad ne vidi napola zapisan PNG
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        image.save(tmp_path, format="PNG")
+        os.chmod(tmp_path, UPLOAD_FILE_MODE)
+        os.replace(tmp_path, path)
+    return path
+
+
+def qr_image_url(qr_code):
+    qr_image_path(qr_code)
+    return f"{PUBLIC_BASE_URL}/api/uploads/qr/{qr_code}.png"
@@ -8,12 +8,25 @@ horizontalno skalirati na više workera/replika.
 Kanali:
 - table_updates  → soba `event_{id}` (dostupnost stolova)
 - order_updates  → sobe `waiter_{id}` i `bar_{event_id}` (narudžbe pića)
+- floor_map_updates → soba `floor_map_{id}` (drugi editori) i sobe
+  nadolazećih evenata kluba (razlika stolova za otvorene mape)
+- ticket_updates → soba `bar_{event_id}` (osoblje eventa: check-in, storno)
+- event_updates  → soba `event_{id}` (kvote karata, otkazivanje, izmjene)
+- menu_updates   → sobe `event_{id}` nadolazećih evenata kluba
+- floor_map_changes → soba `floor_map_{id}` (nova verzija izvan PATCH-a)
+- live_stats     → soba `live_{event_id}` (admin live prikaz, event_stats.py)
+- hostess_stats  → soba `hostess_{event_id}` (statistike ulaska)
+
+Promjene dokumenata objavljuje change_stream_worker.py; ručno se objavljuje
+samo ono što se iz streama ne da rekonstruirati (razlika stolova iz PATCH-a).
 """
 
 import os
 
 from flask_socketio import SocketIO
 
+from request_profiling import track
+
 REDIS_HOST = os.environ.get("REDIS_HOST", "redis")
 SOCKETIO_MESSAGE_QUEUE = f"redis://{REDIS_HOST}:6379/0"
 
@@ -23,9 +36,29 @@ _emitter = SocketIO(message_queue=SOCKETIO_MESSAGE_QUEUE)
 
 def publish(channel, data):
     """Objavi real-time događaj; kanal određuje Socket.IO event i sobe."""
-    if channel == "table_updates":
-        _emitter.emit("table_updated", data, room=f"event_{data['event_id']}")
-    elif channel == "order_updates":
-        if data.get("waiter_id"):
-            _emitter.emit("order_updated", data, room=f"waiter_{data['waiter_id']}")
-        _emitter.emit("order_updated", data, room=f"bar_{data['event_id']}")
+    with track("redis"):
+        if channel == "table_updates":
+            _emitter.emit("table_updated", data, room=f"event_{data['event_id']}")
+        elif channel == "order_updates":
+            if data.get("waiter_id"):
+                _emitter.emit("order_updated", data, room=f"waiter_{data['waiter_id']}")
+            _emitter.emit("order_updated", data, room=f"bar_{data['event_id']}")
+        elif channel == "floor_map_updates":
+            payload = {k: v for k, v in data.items() if k != "event_ids"}
+            _emitter.emit("floor_map_updated", payload, room=f"floor_map_{data['map_id']}")
+            for event_id in data.get("event_ids", []):
+                _emitter.emit("floor_map_updated", payload, room=f"event_{event_id}")
+        elif channel == "ticket_updates":
+            _emitter.emit("ticket_updated", data, room=f"bar_{data['event_id']}")
+        elif channel == "event_updates":
+            _emitter.emit("event_updated", data, room=f"event_{data['event_id']}")
+        elif channel == "menu_updates":
+            payload = {k: v for k, v in data.items() if k != "event_ids"}
+            for event_id in data.get("event_ids", []):
+                _emitter.emit("menu_updated", payload, room=f"event_{event_id}")
+        elif channel == "floor_map_changes":
+            _emitter.emit("floor_map_changed", data, room=f"floor_map_{data['map_id']}")
+        elif channel == "live_stats":
+            _emitter.emit("live_stats", data, room=f"live_{data['event_id']}")
+        elif channel == "hostess_stats":
+            _emitter.emit("hostess_stats", data, room=f"hostess_{data['event_id']}")
@@ -0,0 +1,84 @@
+"""
+Profiliranje po zahtjevu — koliko Mongo/Redis/Stripe poziva i vremena troši
+svaka ruta.
+
+Brojači žive u Flask `g` (svaki greenlet ima vlastiti request kontekst), a
+pune ih pymongo CommandListener (db_monitoring.py), ProfiledRedis
+(extensions.py) i Stripe omotač (stripe_service.py). Na kraju zahtjeva
+vrijednosti idu u Prometheus histograme po `url_rule`, pa N+1 uzorci
+(npr. `_with_club` po eventu) izlaze kao visok broj Mongo round-tripova.
+
+Uz REQUEST_PROFILE_HEADER=1 klijent može poslati `X-Debug-Profile: 1` i
+dobiti raščlambu u `Server-Timing` headeru odgovora.
+"""
+
+import os
+import time
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+from prometheus_client import Histogram
+
+DEPENDENCIES = ("mongo", "redis", "stripe")
+
+REQUEST_PROFILE_HEADER = os.environ.get("REQUEST_PROFILE_HEADER", "0") == "1"
+
+REQUEST_DEPENDENCY_CALLS = Histogram(
+    "http_request_dependency_calls",
+    "Round-trips to a dependency per HTTP request",
+    ["endpoint", "dependency"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144),
+)
+
+REQUEST_DEPENDENCY_SECONDS = Histogram(
+    "http_request_dependency_seconds",
+    "Time spent in a dependency per HTTP request",
+    ["endpoint", "dependency"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+
+
+def start_request():
+    g.profile = {dep: [0, 0.0] for dep in DEPENDENCIES}
+
+
+def record(dependency, seconds):
+    """Pribroji jedan poziv ovisnosti tekućem zahtjevu (izvan zahtjeva no-op)."""
+    if not has_request_context():
+        return
+    profile = g.get("profile")
+    if profile is None:
+        return
+    entry = profile[dependency]
+    entry[0] += 1
+    entry[1] += seconds
+
+
+@contextmanager
+def track(dependency):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(dependency, time.perf_counter() - start)
+
+
+def finish_request(endpoint, response, total_seconds):
+    """Upiši histograme; po potrebi dodaj Server-Timing raščlambu."""
+    profile = g.get("profile")
+    if profile is None:
+        return response
+
+    for dep, (calls, seconds) in profile.items():
+        REQUEST_DEPENDENCY_CALLS.labels(endpoint=endpoint, dependency=dep).observe(calls)
+        if calls:
+            REQUEST_DEPENDENCY_SECONDS.labels(endpoint=endpoint, dependency=dep).observe(seconds)
+
+    if REQUEST_PROFILE_HEADER and request.headers.get("X-Debug-Profile") == "1":
+        parts = [
+            f'{dep};dur={seconds * 1000:.1f};desc="{calls} calls"'
+            for dep, (calls, seconds) in profile.items()
+        ]
+        parts.append(f"total;dur={total_seconds * 1000:.1f}")
+        response.headers["Server-Timing"] = ", ".join(parts)
+    return response
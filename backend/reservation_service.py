@@ -12,7 +12,9 @@ from bson import ObjectId
 from pymongo.errors import DuplicateKeyError
 
 import stripe_service
-from db import events_col, floor_maps_col, table_reservations_col
+from db import events_col, table_reservations_col, users_col
+from floor_map_index import active_map
+from guest_profile import GUEST_PROJECTION, guest_snapshot
 
 ACTIVE_STATUSES = ["pending", "confirmed", "checked_in"]
 
@@ -30,17 +32,10 @@ def create_reservation(user_id, event_id, table_id, guests_count):
     if not event or event.get("is_cancelled"):
         raise ReservationError("Event ne postoji ili je otkazan")
 
-    floor_map = floor_maps_col.find_one({
-        "club_id": event["club_id"],
-        "is_active": True,
-        "tables.id": table_id,
-    })
-    if not floor_map:
-        raise ReservationError("Stol ne postoji na mapi kluba")
-
-    table = next((t for t in floor_map["tables"] if t["id"] == table_id), None)
+    floor_map = active_map(event["club_id"])
+    table = floor_map.table(table_id) if floor_map else None
     if not table:
-        raise ReservationError("Stol ne postoji")
+        raise ReservationError("Stol ne postoji na mapi kluba")
 
     if guests_count and table.get("capacity") and guests_count > table["capacity"]:
         raise ReservationError(f"Stol prima najviše {table['capacity']} gostiju")
@@ -55,18 +50,19 @@ def create_reservation(user_id, event_id, table_id, guests_count):
         raise ReservationError("Stol je već rezerviran")
 
     is_vip = table.get("type") == "vip_separe"
-    deposit = float(table.get("deposit") or 0) if is_vip else 0.0
+    deposit = table["deposit"] if is_vip else 0.0
     cancellation_deadline = event["date"] - timedelta(hours=24)
+    user = users_col.find_one({"_id": ObjectId(user_id)}, GUEST_PROJECTION)
 
     reservation = {
         "user_id": ObjectId(user_id),
         "event_id": ObjectId(event_id),
         "club_id": event["club_id"],
-        "floor_map_id": floor_map["_id"],
+        "floor_map_id": floor_map.map_id,
         "table_id": table_id,
-        "table_type": table.get("type", "standard"),
-        "table_label": table.get("label", table_id),
-        "section_id": table.get("section_id"),
+        "table_type": table["type"],
+        "table_label": table["label"],
+        "section_id": table["section_id"],
         "guests_count": guests_count,
         "deposit_amount": deposit,
         "deposit_paid": False,
@@ -81,6 +77,8 @@ def create_reservation(user_id, event_id, table_id, guests_count):
         "checked_in_by": None,
         "notes": None,
         "created_at": datetime.utcnow(),
+        # Ime/email gosta za ulaz i admin liste (bez joina na users)
+        "guest": guest_snapshot(user),
     }
 
     try:
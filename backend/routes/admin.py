@@ -7,13 +7,14 @@ from bson import ObjectId
 from flask import Blueprint, jsonify, request
 from pymongo.errors import DuplicateKeyError
 
+import event_stats
 from auth_utils import (
     current_club_id, current_role, hash_password, resolve_club_id,
     role_required, serialize,
 )
 from db import (
-    club_admins_col, drink_orders_col, events_col, hostesses_col, reports_col,
-    superadmins_col, table_reservations_col, tickets_col, users_col, waiters_col,
+    ANALYTICS_MAX_TIME_MS, analytics_db, club_admins_col, events_col,
+    hostesses_col, superadmins_col, users_col, waiters_col,
 )
 
 admin_bp = Blueprint("admin", __name__, url_prefix="/api/admin")
@@ -31,7 +32,7 @@ def _sum_and_count(col, match, field):
     res = list(col.aggregate([
         {"$match": match},
         {"$group": {"_id": None, "total": {"$sum": f"${field}"}, "count": {"$sum": 1}}},
-    ]))
+    ], maxTimeMS=ANALYTICS_MAX_TIME_MS))
     if not res:
         return 0.0, 0
     return round(res[0]["total"] or 0, 2), res[0]["count"]
@@ -48,37 +49,37 @@ def dashboard():
     now = datetime.utcnow()
     month_ago = now - timedelta(days=30)
 
-    revenue_tickets, tickets_sold = _sum_and_count(tickets_col, {
+    revenue_tickets, tickets_sold = _sum_and_count(analytics_db.tickets, {
         "club_id": club_id,
         "purchased_at": {"$gte": month_ago},
         "status": {"$in": ["valid", "checked_in"]},
     }, "price_paid")
 
-    revenue_drinks, drink_orders = _sum_and_count(drink_orders_col, {
+    revenue_drinks, drink_orders = _sum_and_count(analytics_db.drink_orders, {
         "club_id": club_id,
         "created_at": {"$gte": month_ago},
         "payment_status": "paid",
     }, "total")
 
-    revenue_deposits, _ = _sum_and_count(table_reservations_col, {
+    revenue_deposits, _ = _sum_and_count(analytics_db.table_reservations, {
         "club_id": club_id,
         "created_at": {"$gte": month_ago},
         "deposit_paid": True,
     }, "deposit_amount")
 
-    upcoming_events = events_col.count_documents({
+    upcoming_events = analytics_db.events.count_documents({
         "club_id": club_id,
         "is_cancelled": {"$ne": True},
         "date": {"$gte": now},
-    })
+    }, maxTimeMS=ANALYTICS_MAX_TIME_MS)
 
     return jsonify({
         "period_days": 30,
         "upcoming_events": upcoming_events,
         "tickets_sold": tickets_sold,
-        "reservations": table_reservations_col.count_documents({
+        "reservations": analytics_db.table_reservations.count_documents({
             "club_id": club_id, "created_at": {"$gte": month_ago},
-        }),
+        }, maxTimeMS=ANALYTICS_MAX_TIME_MS),
         "drink_orders": drink_orders,
         "revenue_tickets": revenue_tickets,
         "revenue_drinks": revenue_drinks,
@@ -90,41 +91,21 @@ def dashboard():
 @admin_bp.route("/events/<event_id>/live", methods=["GET"])
 @role_required("admin", "superadmin")
 def live_dashboard(event_id):
-    """Live prikaz eventa — ulasci, rezervacije, narudžbe u tijeku."""
+    """
+    Live prikaz eventa — ulasci, rezervacije, narudžbe u tijeku. Prvi prikaz;
+    dalje snapshotove gura soba `live_{event_id}` (event_stats.py).
+    """
     event = events_col.find_one({"_id": ObjectId(event_id)})
     if not event:
         return jsonify({"error": "Event ne postoji"}), 404
     if current_role() != "superadmin" and current_club_id() != event["club_id"]:
         return jsonify({"error": "Nemate ovlasti nad ovim eventom"}), 403
 
-    oid = event["_id"]
-    tickets_sold = tickets_col.count_documents(
-        {"event_id": oid, "status": {"$in": ["valid", "checked_in"]}}
-    )
-    checked_in = tickets_col.count_documents({"event_id": oid, "status": "checked_in"})
-    reservations_active = table_reservations_col.count_documents(
-        {"event_id": oid, "status": {"$in": ["confirmed", "checked_in"]}}
-    )
-    reservations_in = table_reservations_col.count_documents(
-        {"event_id": oid, "status": "checked_in"}
-    )
-    active_orders = drink_orders_col.count_documents(
-        {"event_id": oid, "order_status": {"$in": ["placed", "accepted", "preparing"]}}
-    )
-    drink_revenue = list(drink_orders_col.aggregate([
-        {"$match": {"event_id": oid, "payment_status": "paid"}},
-        {"$group": {"_id": None, "total": {"$sum": "$total"}}},
-    ]))
-
+    event_stats.watch(event_id)
+    stats = event_stats.snapshot(event_id)
     return jsonify({
-        "event": {"id": str(oid), "name": event["name"], "date": serialize(event["date"])},
-        "tickets_sold": tickets_sold,
-        "tickets_checked_in": checked_in,
-        "reservations_active": reservations_active,
-        "reservations_checked_in": reservations_in,
-        "guests_inside": checked_in + reservations_in,
-        "active_drink_orders": active_orders,
-        "drink_revenue": round((drink_revenue[0]["total"] if drink_revenue else 0), 2),
+        "event": {"id": str(event["_id"]), "name": event["name"], "date": serialize(event["date"])},
+        **{k: v for k, v in stats.items() if k != "event_id"},
     })
 
 
@@ -136,8 +117,8 @@ def reports():
         return err
     limit = min(int(request.args.get("limit", 30)), 100)
     docs = [
-        serialize(r) for r in reports_col.find({"club_id": club_id})
-        .sort("date", -1).limit(limit)
+        serialize(r) for r in analytics_db.reports.find({"club_id": club_id})
+        .sort("date", -1).limit(limit).max_time_ms(ANALYTICS_MAX_TIME_MS)
     ]
     return jsonify({"reports": docs})
 
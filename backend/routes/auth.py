@@ -7,6 +7,7 @@ from flask import Blueprint, jsonify, request
 from flask_jwt_extended import get_jwt, get_jwt_identity, jwt_required
 
 from auth_utils import hash_password, issue_tokens, serialize, verify_password
+from customer_provisioning import queue_customer
 from db import club_admins_col, hostesses_col, superadmins_col, users_col, waiters_col
 from extensions import limiter, redis_client
 
@@ -63,6 +64,8 @@ def register():
     }
     result = users_col.insert_one(user)
     user["_id"] = result.inserted_id
+    # Stripe customer se kreira u pozadini, prije prve kupnje
+    queue_customer(user)
 
     tokens = issue_tokens(result.inserted_id, "user")
     return jsonify({**tokens, "user": _public_user(user)}), 201
@@ -105,6 +108,7 @@ def _oauth_upsert(email, name, provider, provider_id, picture=None):
             {"_id": user["_id"]},
             {"$set": {"auth_provider": provider, "auth_provider_id": provider_id}},
         )
+    queue_customer(user)
     tokens = issue_tokens(user["_id"], "user")
     return jsonify({**tokens, "user": _public_user(user)})
 
@@ -9,7 +9,7 @@ from flask import Blueprint, jsonify, request
 
 from auth_utils import current_club_id, current_role, role_required, serialize
 from db import clubs_col
-from upload_service import save_image
+from upload_service import save_image, streamed_upload
 
 clubs_bp = Blueprint("clubs", __name__, url_prefix="/api/clubs")
 
@@ -128,6 +128,7 @@ def update_club(club_id):
 
 @clubs_bp.route("/<club_id>/upload-image", methods=["POST"])
 @role_required("admin", "superadmin")
+@streamed_upload
 def upload_club_image(club_id):
     """Upload slike kluba. ?field=cover (default) ili ?field=gallery."""
     oid = ObjectId(club_id)
@@ -136,14 +137,18 @@ def upload_club_image(club_id):
     if "image" not in request.files:
         return jsonify({"error": "Datoteka 'image' je obavezna"}), 400
 
+    field = "gallery" if request.args.get("field") == "gallery" else "cover"
     try:
-        url = save_image(request.files["image"], folder="clubs")
+        saved = save_image(request.files["image"], folder="clubs",
+                           target=("clubs", oid, field))
     except ValueError as exc:
         return jsonify({"error": str(exc)}), 400
 
-    field = request.args.get("field", "cover")
     if field == "gallery":
-        clubs_col.update_one({"_id": oid}, {"$push": {"gallery": url}})
+        clubs_col.update_one({"_id": oid}, {"$push": {"gallery": saved}})
     else:
-        clubs_col.update_one({"_id": oid}, {"$set": {"cover_image": url}})
-    return jsonify({"url": url}), 201
+        clubs_col.update_one({"_id": oid}, {"$set": {
+            "cover_image": saved["url"],
+            "cover_image_variants": saved["variants"],
+        }})
+    return jsonify(saved), 201
@@ -5,8 +5,11 @@ from datetime import datetime
 
 from bson import ObjectId
 from flask import Blueprint, jsonify, request
+from flask_jwt_extended import get_jwt, get_jwt_identity, verify_jwt_in_request
 
+import ticket_signing
 from auth_utils import current_club_id, current_role, resolve_club_id, role_required, serialize
+from customer_provisioning import queue_customers
 from db import clubs_col, events_col
 
 events_bp = Blueprint("events", __name__, url_prefix="/api/events")
@@ -82,9 +85,20 @@ def get_event(event_id):
     event = events_col.find_one({"_id": ObjectId(event_id)})
     if not event:
         return jsonify({"error": "Event ne postoji"}), 404
+    _queue_viewer_customer()
     return jsonify(_with_club(event))
 
 
+def _queue_viewer_customer():
+    """Prijavljeni gost gleda event → Stripe customer u pozadini (javna ruta)."""
+    try:
+        if verify_jwt_in_request(optional=True) and get_jwt().get("role") == "user":
+            queue_customers([get_jwt_identity()])
+    except Exception:
+        # Istekao/neispravan token ne smije srušiti javnu stranicu eventa
+        pass
+
+
 def _normalize_ticket_types(raw_types):
     """Osigurava id/sold_quantity/is_active na svakom ticket typeu."""
     import uuid
@@ -133,11 +147,15 @@ def create_event():
         "dress_code": data.get("dress_code"),
         "additional_info": data.get("additional_info"),
         "is_published": data.get("is_published", False),
+        # Potpisani QR kodovi za offline check-in (ticket_signing.py)
+        "signed_tickets": bool(data.get("signed_tickets", False)),
         "is_cancelled": False,
         "created_at": datetime.utcnow(),
     }
     result = events_col.insert_one(event)
     event["_id"] = result.inserted_id
+    if event["signed_tickets"]:
+        ticket_signing.event_key(event["_id"], create=True)
     return jsonify(serialize(event)), 201
 
 
@@ -169,8 +187,15 @@ def update_event(event_id):
             updates["date"] = parsed
     if "ticket_types" in data:
         updates["ticket_types"] = _normalize_ticket_types(data["ticket_types"])
+    if "signed_tickets" in data:
+        # Vrijedi za karte prodane od sada; starije zadržavaju UUID kod
+        updates["signed_tickets"] = bool(data["signed_tickets"])
+        if updates["signed_tickets"]:
+            ticket_signing.event_key(event["_id"], create=True)
     if not updates:
         return jsonify({"error": "Nema podataka za ažuriranje"}), 400
+    # Verzija za cache pred-renderiranih email predložaka (email_templates.py)
+    updates["updated_at"] = datetime.utcnow()
 
     result = events_col.find_one_and_update(
         {"_id": event["_id"]}, {"$set": updates}, return_document=True
@@ -1,4 +1,9 @@
-"""Mape stolova — javni prikaz s dostupnošću + admin editor (drag & drop)."""
+"""
+Mape stolova — javni prikaz s dostupnošću + admin editor (drag & drop).
+
+Svaka izmjena povećava `version`. Editor sprema razlike (PATCH tables) uz
+verziju koju je učitao; ako je netko u međuvremenu spremio, dobiva 409.
+"""
 
 from datetime import datetime
 
@@ -7,8 +12,10 @@ from flask import Blueprint, jsonify, request
 
 from auth_utils import current_club_id, current_role, resolve_club_id, role_required, serialize
 from db import events_col, floor_maps_col, table_reservations_col
+from floor_map_index import FloorMapError, active_map, apply_changes, normalize_ops, version_filter
+from realtime import publish
 from reservation_service import ACTIVE_STATUSES
-from upload_service import save_image
+from upload_service import save_image, streamed_upload
 
 floor_maps_bp = Blueprint("floor_maps", __name__, url_prefix="/api/floor-maps")
 
@@ -25,14 +32,15 @@ def club_floor_map(club_id):
 
 @floor_maps_bp.route("/event/<event_id>", methods=["GET"])
 def event_floor_map(event_id):
-    """Mapa kluba + statusi stolova za konkretni event (za SVG prikaz)."""
-    event = events_col.find_one({"_id": ObjectId(event_id)})
+    """
+    Mapa kluba + statusi stolova za konkretni event (za SVG prikaz).
+    ?format=compact vraća stolove kao retke uz `table_columns`.
+    """
+    event = events_col.find_one({"_id": ObjectId(event_id)}, {"club_id": 1})
     if not event:
         return jsonify({"error": "Event ne postoji"}), 404
 
-    floor_map = floor_maps_col.find_one(
-        {"club_id": event["club_id"], "is_active": True}
-    )
+    floor_map = active_map(event["club_id"])
     if not floor_map:
         return jsonify({"error": "Klub nema aktivnu mapu stolova"}), 404
 
@@ -42,11 +50,24 @@ def event_floor_map(event_id):
     )
     status_by_table = {r["table_id"]: r["status"] for r in reservations}
 
-    doc = serialize(floor_map)
-    for table in doc.get("tables", []):
-        table["reservation_status"] = status_by_table.get(table["id"])
-        table["is_available"] = table["id"] not in status_by_table
-    return jsonify(doc)
+    if request.args.get("format") == "compact":
+        return jsonify(floor_map.compact_payload(status_by_table))
+
+    return jsonify(floor_map.full_payload(status_by_table))
+
+
+@floor_maps_bp.route("/club/<club_id>/hit", methods=["GET"])
+def hit_test(club_id):
+    """Stol na točki ?x=&y= (% koordinate) aktivne mape kluba."""
+    try:
+        x, y = float(request.args["x"]), float(request.args["y"])
+    except (KeyError, ValueError):
+        return jsonify({"error": "x i y su obavezni brojevi"}), 400
+    floor_map = active_map(ObjectId(club_id))
+    if not floor_map:
+        return jsonify({"error": "Klub nema aktivnu mapu stolova"}), 404
+    table_id = floor_map.hit_test(x, y)
+    return jsonify({"table": floor_map.table(table_id) if table_id else None})
 
 
 def _can_manage(club_id):
@@ -70,6 +91,7 @@ def create_floor_map():
         "tables": data.get("tables") or [],
         "sections": data.get("sections") or [],
         "is_active": data.get("is_active", True),
+        "version": 1,
         "updated_at": datetime.utcnow(),
     }
     # Jedan klub, jedna aktivna mapa — deaktiviraj prethodne
@@ -82,8 +104,8 @@ def create_floor_map():
     return jsonify(serialize(floor_map)), 201
 
 
-def _get_managed_map(map_id):
-    floor_map = floor_maps_col.find_one({"_id": ObjectId(map_id)})
+def _get_managed_map(map_id, projection=None):
+    floor_map = floor_maps_col.find_one({"_id": ObjectId(map_id)}, projection)
     if not floor_map:
         return None, (jsonify({"error": "Mapa ne postoji"}), 404)
     if not _can_manage(floor_map["club_id"]):
@@ -102,16 +124,38 @@ def update_floor_map(map_id):
     allowed = ["name", "background_image_url", "width", "height",
                "tables", "sections", "is_active"]
     updates = {k: data[k] for k in allowed if k in data}
+    return _replace(floor_map, updates, data)
+
+
+def _expected_version(data):
+    version = data.get("version")
+    if version is not None and (not isinstance(version, int) or isinstance(version, bool)):
+        raise FloorMapError("version mora biti cijeli broj")
+    return version
+
+
+def _replace(floor_map, updates, data):
+    """Cijeli $set uz povećanje verzije; s `version` u tijelu i provjera konflikta."""
+    try:
+        version = _expected_version(data)
+    except FloorMapError as exc:
+        return jsonify({"error": str(exc)}), 400
+    query = {"_id": floor_map["_id"]}
+    if version is not None:
+        query.update(version_filter(version))
     updates["updated_at"] = datetime.utcnow()
 
     result = floor_maps_col.find_one_and_update(
-        {"_id": floor_map["_id"]}, {"$set": updates}, return_document=True
+        query, {"$set": updates, "$inc": {"version": 1}}, return_document=True
     )
+    if not result:
+        return jsonify({"error": "Mapa je u međuvremenu promijenjena — osvježi editor"}), 409
     return jsonify(serialize(result))
 
 
 @floor_maps_bp.route("/<map_id>/upload-bg", methods=["POST"])
 @role_required("admin", "superadmin")
+@streamed_upload
 def upload_background(map_id):
     floor_map, err = _get_managed_map(map_id)
     if err:
@@ -120,33 +164,79 @@ def upload_background(map_id):
         return jsonify({"error": "Datoteka 'image' je obavezna"}), 400
 
     try:
-        url = save_image(request.files["image"], folder="floor-maps")
+        saved = save_image(request.files["image"], folder="floor-maps",
+                           target=("floor_maps", floor_map["_id"], "background"))
     except ValueError as exc:
         return jsonify({"error": str(exc)}), 400
 
-    floor_maps_col.update_one(
+    updated = floor_maps_col.find_one_and_update(
         {"_id": floor_map["_id"]},
-        {"$set": {"background_image_url": url, "updated_at": datetime.utcnow()}},
+        {"$set": {
+            "background_image_url": saved["url"],
+            "background_image_variants": saved["variants"],
+            "updated_at": datetime.utcnow(),
+        }, "$inc": {"version": 1}},
+        projection={"version": 1},
+        return_document=True,
     )
-    return jsonify({"url": url}), 201
+    # Nova verzija — editor s njom nastavlja spremati razlike bez 409
+    return jsonify({**saved, "version": updated["version"]}), 201
 
 
 @floor_maps_bp.route("/<map_id>/tables", methods=["PUT"])
 @role_required("admin", "superadmin")
 def update_tables(map_id):
-    """Sprema raspored stolova i sekcija iz admin editora (drag & drop)."""
-    floor_map, err = _get_managed_map(map_id)
+    """Zamjena cijelih lista stolova/sekcija (sekcije iz editora, import)."""
+    floor_map, err = _get_managed_map(map_id, {"club_id": 1})
     if err:
         return err
 
     data = request.get_json(silent=True) or {}
-    updates = {"updated_at": datetime.utcnow()}
-    if "tables" in data:
-        updates["tables"] = data["tables"]
-    if "sections" in data:
-        updates["sections"] = data["sections"]
+    updates = {k: data[k] for k in ("tables", "sections") if k in data}
+    return _replace(floor_map, updates, data)
 
-    result = floor_maps_col.find_one_and_update(
-        {"_id": floor_map["_id"]}, {"$set": updates}, return_document=True
+
+@floor_maps_bp.route("/<map_id>/tables", methods=["PATCH"])
+@role_required("admin", "superadmin")
+def patch_tables(map_id):
+    """
+    Razlika iz editora: {"version": n, "ops": [add/move/update/delete]}.
+    Vraća novu verziju; 409 ako mapa više nije na verziji n.
+    """
+    floor_map, err = _get_managed_map(
+        map_id, {"club_id": 1, "version": 1, "tables.id": 1, "sections.id": 1}
     )
-    return jsonify(serialize(result))
+    if err:
+        return err
+
+    data = request.get_json(silent=True) or {}
+    try:
+        version = _expected_version(data)
+        if version is None:
+            raise FloorMapError("version je obavezan")
+        changes = normalize_ops(
+            data.get("ops"),
+            [t["id"] for t in floor_map.get("tables") or []],
+            {s["id"] for s in floor_map.get("sections") or []},
+        )
+    except FloorMapError as exc:
+        return jsonify({"error": str(exc)}), 400
+
+    new_version = apply_changes(floor_map["_id"], version, changes)
+    if new_version is None:
+        return jsonify({
+            "error": "Mapa je u međuvremenu promijenjena — osvježi editor",
+            "version": floor_map.get("version", 0),
+        }), 409
+
+    # Otvorene mape nadolazećih evenata kluba dobivaju samo razliku
+    upcoming = events_col.find(
+        {"club_id": floor_map["club_id"], "date": {"$gte": datetime.utcnow()}}, {"_id": 1}
+    )
+    publish("floor_map_updates", {
+        "map_id": str(floor_map["_id"]),
+        "version": new_version,
+        "changes": changes,
+        "event_ids": [str(e["_id"]) for e in upcoming],
+    })
+    return jsonify({"version": new_version, "changes": changes})
@@ -1,58 +1,54 @@
 """Hostesa — lista gostiju, check-in karata i rezervacija, live statistike."""
 
 import re
-from datetime import datetime
+from datetime import datetime, timezone
 
 from bson import ObjectId
 from flask import Blueprint, jsonify, request
+from pymongo import UpdateOne
 
-from auth_utils import current_user_id, role_required, serialize
-from db import events_col, table_reservations_col, tickets_col, users_col
-from realtime import publish
+import event_stats
+import ticket_signing
+from auth_utils import current_club_id, current_role, current_user_id, role_required, serialize
+from db import events_col, table_reservations_col, tickets_col
+from guest_profile import attach_missing, normalize_name
 from reservation_service import ReservationError, checkin_reservation
 
 hostess_bp = Blueprint("hostess", __name__, url_prefix="/api/hostess")
 
 STAFF_ROLES = ("hostess", "admin", "superadmin")
+# Najviše skenova po jednom offline syncu (uređaj šalje u više navrata)
+OFFLINE_SYNC_MAX_SCANS = 5000
 
 
 @hostess_bp.route("/event/<event_id>/guests", methods=["GET"])
 @role_required(*STAFF_ROLES)
 def event_guests(event_id):
-    """Lista gostiju (karte + rezervacije) uz pretragu po imenu/prezimenu."""
+    """
+    Lista gostiju (karte + rezervacije) uz pretragu po imenu/prezimenu.
+    Ime je snapshot na dokumentu (guest_profile) — bez joina na `users`.
+    """
     oid = ObjectId(event_id)
-    search = (request.args.get("search") or "").strip()
-
-    user_filter = {}
-    if search:
-        user_filter = {"name": {"$regex": re.escape(search), "$options": "i"}}
-        matching_ids = [u["_id"] for u in users_col.find(user_filter, {"_id": 1})]
-    else:
-        matching_ids = None
+    search = normalize_name(request.args.get("search"))
 
     ticket_query = {"event_id": oid, "status": {"$in": ["valid", "checked_in"]}}
     reservation_query = {"event_id": oid, "status": {"$in": ["confirmed", "checked_in"]}}
-    if matching_ids is not None:
-        ticket_query["user_id"] = {"$in": matching_ids}
-        reservation_query["user_id"] = {"$in": matching_ids}
-
-    tickets = list(tickets_col.find(ticket_query))
-    reservations = list(table_reservations_col.find(reservation_query))
+    if search:
+        # Regex se evaluira nad ključevima indeksa (event_id, guest.name_norm)
+        name_filter = {"$regex": re.escape(search)}
+        ticket_query["guest.name_norm"] = name_filter
+        reservation_query["guest.name_norm"] = name_filter
 
-    all_user_ids = list({d["user_id"] for d in tickets + reservations})
-    users = {
-        u["_id"]: u for u in users_col.find(
-            {"_id": {"$in": all_user_ids}}, {"name": 1, "email": 1, "phone": 1}
-        )
-    }
+    tickets = attach_missing(list(tickets_col.find(ticket_query)))
+    reservations = attach_missing(list(table_reservations_col.find(reservation_query)))
 
     def _guest(doc, kind):
-        user = users.get(doc["user_id"], {})
+        guest = doc["guest"]
         return {
             "type": kind,
             "id": str(doc["_id"]),
-            "name": user.get("name", "Nepoznat"),
-            "email": user.get("email"),
+            "name": guest.get("name") or "Nepoznat",
+            "email": guest.get("email"),
             "status": doc["status"],
             "checked_in_at": serialize(doc.get("checked_in_at")),
             "detail": doc.get("ticket_type_name") if kind == "ticket"
@@ -92,10 +88,10 @@ def checkin_ticket(ticket_id):
             "checked_in_by": current_user_id(),
         }},
     )
-    user = users_col.find_one({"_id": ticket["user_id"]}, {"name": 1})
+    attach_missing([ticket])
     return jsonify({
         "success": True,
-        "guest_name": (user or {}).get("name"),
+        "guest_name": ticket["guest"].get("name"),
         "ticket_type": ticket.get("ticket_type_name"),
     })
 
@@ -108,39 +104,131 @@ def checkin_reservation_route(reservation_id):
     except ReservationError as exc:
         return jsonify({"error": str(exc)}), 409
 
-    publish('table_updates', {
-        "event_id": str(reservation["event_id"]),
-        "table_id": reservation["table_id"],
-        "status": "checked_in",
-    })
-    user = users_col.find_one({"_id": reservation["user_id"]}, {"name": 1})
+    attach_missing([reservation])
     return jsonify({
         "success": True,
-        "guest_name": (user or {}).get("name"),
+        "guest_name": reservation["guest"].get("name"),
         "table_label": reservation.get("table_label"),
     })
 
 
 @hostess_bp.route("/event/<event_id>/stats", methods=["GET"])
 @role_required(*STAFF_ROLES)
-def event_stats(event_id):
-    """Live statistike ulaska za event."""
-    oid = ObjectId(event_id)
-    tickets_sold = tickets_col.count_documents(
-        {"event_id": oid, "status": {"$in": ["valid", "checked_in"]}}
-    )
-    tickets_in = tickets_col.count_documents({"event_id": oid, "status": "checked_in"})
-    reservations_confirmed = table_reservations_col.count_documents(
-        {"event_id": oid, "status": {"$in": ["confirmed", "checked_in"]}}
-    )
-    reservations_in = table_reservations_col.count_documents(
-        {"event_id": oid, "status": "checked_in"}
-    )
+def hostess_event_stats(event_id):
+    """Statistike ulaska za event; dalje ih gura soba `hostess_{event_id}`."""
+    event_stats.watch(event_id)
+    return jsonify(event_stats.hostess_view(event_stats.snapshot(event_id)))
+
+
+def _club_event(event_id):
+    event = events_col.find_one({"_id": ObjectId(event_id)})
+    if not event:
+        return None, (jsonify({"error": "Event ne postoji"}), 404)
+    if current_role() != "superadmin" and current_club_id() != event["club_id"]:
+        return None, (jsonify({"error": "Nemate ovlasti nad ovim eventom"}), 403)
+    return event, None
+
+
+@hostess_bp.route("/event/<event_id>/offline-kit", methods=["GET"])
+@role_required(*STAFF_ROLES)
+def offline_kit(event_id):
+    """
+    Ključ i liste (poništene / već ušle karte) za provjeru potpisanih QR
+    kodova na uređaju bez mreže. Uređaj ga osvježava dok je online.
+    """
+    event, err = _club_event(event_id)
+    if err:
+        return err
+    kit = ticket_signing.offline_kit(event)
+    if kit is None:
+        return jsonify({"error": "Event nema uključene potpisane karte"}), 409
+    return jsonify(kit), 200, {"Cache-Control": "no-store"}
+
+
+def _scan_time(value, now):
+    """ISO vrijeme skena s uređaja → naivni UTC; nikad u budućnosti."""
+    try:
+        parsed = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return now
+    if parsed.tzinfo:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return min(parsed, now)
+
+
+@hostess_bp.route("/event/<event_id>/offline-sync", methods=["POST"])
+@role_required(*STAFF_ROLES)
+def offline_sync(event_id):
+    """
+    Bulk sync offline check-inova: `{"device_id", "scans": [{"qr", "scanned_at"}]}`.
+
+    Za svaku kartu vrijedi najraniji sken (i između uređaja); karta koja je
+    već bila unutra ili je skenirana više puta vraća se u `duplicates` da
+    ulaz vidi moguće dijeljenje QR koda. Upis je jedan bulk_write.
+    """
+    event, err = _club_event(event_id)
+    if err:
+        return err
+    key = ticket_signing.event_key(event["_id"])
+    if key is None:
+        return jsonify({"error": "Event nema uključene potpisane karte"}), 409
+
+    data = request.get_json(silent=True) or {}
+    scans = data.get("scans") or []
+    if not isinstance(scans, list) or len(scans) > OFFLINE_SYNC_MAX_SCANS:
+        return jsonify({"error": f"scans mora biti lista od najviše {OFFLINE_SYNC_MAX_SCANS}"}), 400
+    device_id = str(data.get("device_id") or "")[:64] or None
+
+    now = datetime.utcnow()
+    earliest, duplicates, rejected = {}, [], []
+    for scan in scans:
+        qr = (scan or {}).get("qr") or ""
+        try:
+            ticket_id, scan_event_id, _ = ticket_signing.verify(key, qr)
+        except ticket_signing.SignatureError as exc:
+            rejected.append({"qr": qr[:128], "reason": str(exc)})
+            continue
+        if scan_event_id != event["_id"]:
+            rejected.append({"qr": qr[:128], "reason": "Karta je za drugi event"})
+            continue
+        scanned_at = _scan_time(scan.get("scanned_at"), now)
+        previous = earliest.get(ticket_id)
+        if previous is not None:
+            duplicates.append({"ticket_id": str(ticket_id),
+                               "scanned_at": max(previous, scanned_at).isoformat()})
+        if previous is None or scanned_at < previous:
+            earliest[ticket_id] = scanned_at
+
+    tickets = {t["_id"]: t for t in tickets_col.find(
+        {"_id": {"$in": list(earliest)}}, {"status": 1, "checked_in_at": 1},
+    )}
+    ops = []
+    for ticket_id, scanned_at in earliest.items():
+        ticket = tickets.get(ticket_id)
+        if ticket is None:
+            rejected.append({"ticket_id": str(ticket_id), "reason": "Karta ne postoji"})
+        elif ticket["status"] == "checked_in":
+            duplicates.append({
+                "ticket_id": str(ticket_id),
+                "scanned_at": scanned_at.isoformat(),
+                "checked_in_at": serialize(ticket.get("checked_in_at")),
+            })
+        elif ticket["status"] != "valid":
+            rejected.append({"ticket_id": str(ticket_id),
+                             "reason": f"Karta nije važeća (status: {ticket['status']})"})
+        else:
+            # Filter na status: paralelni online check-in pobjeđuje, sync ga ne gazi
+            ops.append(UpdateOne({"_id": ticket_id, "status": "valid"}, {"$set": {
+                "status": "checked_in",
+                "checked_in_at": scanned_at,
+                "checked_in_by": current_user_id(),
+                "checked_in_offline": True,
+                "checked_in_device": device_id,
+            }}))
+
+    accepted = tickets_col.bulk_write(ops, ordered=False).modified_count if ops else 0
     return jsonify({
-        "event_id": event_id,
-        "tickets_sold": tickets_sold,
-        "tickets_checked_in": tickets_in,
-        "reservations_confirmed": reservations_confirmed,
-        "reservations_checked_in": reservations_in,
-        "total_inside": tickets_in + reservations_in,
+        "accepted": accepted,
+        "duplicates": duplicates,
+        "rejected": rejected,
     })
@@ -3,6 +3,7 @@
 from bson import ObjectId
 from flask import Blueprint, jsonify, request
 
+import archive_service
 import stripe_service
 from auth_utils import (
     current_club_id, current_role, current_user_id, role_required, serialize,
@@ -16,6 +17,7 @@ from order_service import (
     waiter_collect_cash,
     waiter_deliver_order,
 )
+from payment_gateway import GatewayUnavailable
 
 orders_bp = Blueprint("orders", __name__, url_prefix="/api/orders")
 
@@ -61,8 +63,13 @@ def create_order():
             )
             response["client_secret"] = intent.client_secret
             response["publishable_key"] = stripe_service.STRIPE_PUBLISHABLE_KEY
+        except GatewayUnavailable as exc:
+            # Narudžba ostaje; plaćanje se ponavlja preko /<order_id>/payment
+            return jsonify({"error": str(exc), "order_id": order_id}), 503, {
+                "Retry-After": str(stripe_service.retry_after_seconds())
+            }
         except Exception as exc:
-            return jsonify({"error": f"Stripe greška: {exc}"}), 502
+            return jsonify({"error": f"Stripe greška: {exc}", "order_id": order_id}), 502
     elif order["total"] == 0:
         # Kupon pokrio cijelu narudžbu
         drink_orders_col.update_one(
@@ -86,6 +93,8 @@ def waiter_orders():
 
     query = {
         "club_id": waiter["club_id"],
+        # Zbroj obje grane ispod — daje granice indeksa (club_id, order_status, created_at)
+        "order_status": {"$in": ["placed", "accepted", "preparing", "delivered"]},
         "$and": [
             {"$or": [
                 {"waiter_id": waiter["_id"]},
@@ -171,6 +180,10 @@ def pay_order(order_id):
         intent = stripe_service.create_drink_payment_intent(
             order["total"], user, order_id
         )
+    except GatewayUnavailable as exc:
+        return jsonify({"error": str(exc)}), 503, {
+            "Retry-After": str(stripe_service.retry_after_seconds())
+        }
     except Exception as exc:
         return jsonify({"error": f"Stripe greška: {exc}"}), 502
 
@@ -203,9 +216,8 @@ def bar_screen(event_id):
 @orders_bp.route("/my", methods=["GET"])
 @role_required("user")
 def my_orders():
-    orders = list(
-        drink_orders_col.find({"user_id": current_user_id()})
-        .sort("created_at", -1).limit(50)
+    orders = archive_service.recent(
+        drink_orders_col, {"user_id": current_user_id()}, "created_at", 50
     )
     event_ids = list({o["event_id"] for o in orders})
     events = {
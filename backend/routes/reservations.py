@@ -1,14 +1,20 @@
 """Rezervacije stolova — dostupnost, kreiranje, depozit, otkazivanje, check-in."""
 
 from bson import ObjectId
+from bson.errors import InvalidId
 from flask import Blueprint, jsonify, request
 
+import archive_service
 import stripe_service
 from auth_utils import (
     current_club_id, current_role, current_user_id, role_required, serialize,
 )
+from customer_provisioning import ensure_customer
 from db import events_col, table_reservations_col, users_col
-from realtime import publish
+from exports import EXPORT_FORMATS, CursorError, keyset_page, stream_export
+from floor_map_index import active_map
+from guest_profile import guest_of
+from payment_gateway import GatewayUnavailable
 from reservation_service import (
     ACTIVE_STATUSES,
     ReservationError,
@@ -16,6 +22,7 @@ from reservation_service import (
     checkin_reservation,
     create_reservation,
 )
+from table_availability import recommend_tables, taken_tables
 
 reservations_bp = Blueprint("reservations", __name__, url_prefix="/api/reservations")
 
@@ -31,6 +38,42 @@ def event_availability(event_id):
     return jsonify({"event_id": event_id, "reserved_tables": reserved})
 
 
+@reservations_bp.route("/event/<event_id>/recommend", methods=["GET"])
+def recommend(event_id):
+    """
+    Najbolji slobodni stolovi za ?party=N (opcionalno ?section_id=,
+    ?near_x=&near_y= u % koordinatama, ?limit=). Rangira višak mjesta,
+    depozit, sekciju i udaljenost.
+    """
+    try:
+        party = int(request.args.get("party", ""))
+        limit = min(20, max(1, int(request.args.get("limit", 5))))
+        near = None
+        if "near_x" in request.args and "near_y" in request.args:
+            near = (float(request.args["near_x"]), float(request.args["near_y"]))
+    except ValueError:
+        return jsonify({"error": "party, limit i near_x/near_y moraju biti brojevi"}), 400
+    if party < 1:
+        return jsonify({"error": "party mora biti barem 1"}), 400
+
+    try:
+        event_oid = ObjectId(event_id)
+    except InvalidId:
+        return jsonify({"error": "Neispravan event_id"}), 400
+    event = events_col.find_one({"_id": event_oid}, {"club_id": 1, "is_cancelled": 1})
+    if not event or event.get("is_cancelled"):
+        return jsonify({"error": "Event ne postoji ili je otkazan"}), 404
+    floor_map = active_map(event["club_id"])
+    if not floor_map:
+        return jsonify({"error": "Klub nema aktivnu mapu stolova"}), 404
+
+    tables = recommend_tables(
+        floor_map, taken_tables(event_id), party,
+        section_id=request.args.get("section_id"), near=near, limit=limit,
+    )
+    return jsonify({"event_id": event_id, "party": party, "tables": tables})
+
+
 @reservations_bp.route("", methods=["POST"])
 @role_required("user")
 def create_reservation_route():
@@ -48,12 +91,6 @@ def create_reservation_route():
     except ReservationError as exc:
         return jsonify({"error": str(exc)}), 409
 
-    publish('table_updates', {
-        "event_id": str(event_id),
-        "table_id": table_id,
-        "status": "reserved",
-    })
-
     return jsonify({
         "reservation_id": reservation_id,
         "deposit_required": deposit > 0,
@@ -80,17 +117,15 @@ def pay_deposit(reservation_id):
         return jsonify({"error": "Rezervacija ne zahtijeva depozit"}), 409
 
     user = users_col.find_one({"_id": current_user_id()})
-    if not user.get("stripe_customer_id"):
-        customer_id = stripe_service.get_or_create_stripe_customer(user)
-        users_col.update_one(
-            {"_id": user["_id"]}, {"$set": {"stripe_customer_id": customer_id}}
-        )
-        user["stripe_customer_id"] = customer_id
-
     try:
+        ensure_customer(user)
         intent = stripe_service.create_deposit_payment_intent(
             reservation["deposit_amount"], user, reservation_id
         )
+    except GatewayUnavailable as exc:
+        return jsonify({"error": str(exc)}), 503, {
+            "Retry-After": str(stripe_service.retry_after_seconds())
+        }
     except Exception as exc:
         return jsonify({"error": f"Stripe greška: {exc}"}), 502
 
@@ -114,24 +149,17 @@ def pay_deposit(reservation_id):
 @role_required("user")
 def cancel_reservation_route(reservation_id):
     try:
-        reservation, refunded = cancel_reservation(reservation_id, current_user_id())
+        _, refunded = cancel_reservation(reservation_id, current_user_id())
     except ReservationError as exc:
         return jsonify({"error": str(exc)}), 409
-
-    publish('table_updates', {
-        "event_id": str(reservation["event_id"]),
-        "table_id": reservation["table_id"],
-        "status": "free",
-    })
     return jsonify({"success": True, "deposit_refunded": refunded})
 
 
 @reservations_bp.route("/my", methods=["GET"])
 @role_required("user")
 def my_reservations():
-    reservations = list(
-        table_reservations_col.find({"user_id": current_user_id()})
-        .sort("created_at", -1).limit(100)
+    reservations = archive_service.recent(
+        table_reservations_col, {"user_id": current_user_id()}, "created_at", 100
     )
     event_ids = list({r["event_id"] for r in reservations})
     events = {
@@ -149,44 +177,96 @@ def my_reservations():
     return jsonify({"reservations": enriched})
 
 
-@reservations_bp.route("/event/<event_id>/all", methods=["GET"])
-@role_required("admin", "superadmin")
-def event_reservations(event_id):
-    """Sve rezervacije eventa (admin pregled)."""
+def _assert_admin_event(event_id):
     event = events_col.find_one({"_id": ObjectId(event_id)})
     if not event:
-        return jsonify({"error": "Event ne postoji"}), 404
+        return None, (jsonify({"error": "Event ne postoji"}), 404)
     if current_role() != "superadmin" and current_club_id() != event["club_id"]:
-        return jsonify({"error": "Nemate ovlasti nad ovim eventom"}), 403
+        return None, (jsonify({"error": "Nemate ovlasti nad ovim eventom"}), 403)
+    return event, None
 
-    reservations = list(
-        table_reservations_col.find({"event_id": event["_id"]}).sort("created_at", -1)
-    )
-    user_ids = list({r["user_id"] for r in reservations})
-    users = {
-        u["_id"]: u for u in users_col.find(
-            {"_id": {"$in": user_ids}}, {"name": 1, "email": 1, "phone": 1}
+
+@reservations_bp.route("/event/<event_id>/all", methods=["GET"])
+@role_required("admin", "superadmin")
+def event_reservations(event_id):
+    """
+    Rezervacije eventa (admin pregled), najnovije prvo. Keyset paginacija:
+    `?cursor=` iz `next_cursor` prethodne stranice.
+    """
+    event, err = _assert_admin_event(event_id)
+    if err:
+        return err
+
+    try:
+        limit = max(1, min(int(request.args.get("limit", 200)), 1000))
+    except ValueError:
+        return jsonify({"error": "limit mora biti broj"}), 400
+    try:
+        reservations, next_cursor = keyset_page(
+            archive_service.for_event(table_reservations_col, event), {"event_id": event["_id"]},
+            "created_at", limit, request.args.get("cursor"),
         )
-    }
+    except CursorError as exc:
+        return jsonify({"error": str(exc)}), 400
+
     enriched = []
     for r in reservations:
         doc = serialize(r)
-        doc["user"] = serialize(users.get(r["user_id"], {}))
+        doc["user"] = guest_of(r)
         enriched.append(doc)
-    return jsonify({"reservations": enriched, "count": len(enriched)})
+    return jsonify({
+        "reservations": enriched, "count": len(enriched), "next_cursor": next_cursor,
+    })
+
+
+RESERVATION_EXPORT_COLUMNS = [
+    "reservation_id", "created_at", "status", "table_label", "table_type",
+    "section_id", "guests_count", "deposit_amount", "deposit_paid",
+    "guest_name", "guest_email", "guest_phone", "checked_in_at",
+]
+
+
+def _reservation_export_row(reservation):
+    guest = reservation["guest"]
+    return {
+        "reservation_id": reservation["_id"],
+        "created_at": reservation.get("created_at"),
+        "status": reservation["status"],
+        "table_label": reservation.get("table_label"),
+        "table_type": reservation.get("table_type"),
+        "section_id": reservation.get("section_id"),
+        "guests_count": reservation.get("guests_count"),
+        "deposit_amount": reservation.get("deposit_amount"),
+        "deposit_paid": reservation.get("deposit_paid"),
+        "guest_name": guest.get("name"),
+        "guest_email": guest.get("email"),
+        "guest_phone": guest.get("phone"),
+        "checked_in_at": reservation.get("checked_in_at"),
+    }
+
+
+@reservations_bp.route("/event/<event_id>/export", methods=["GET"])
+@role_required("admin", "superadmin")
+def export_event_reservations(event_id):
+    """Sve rezervacije eventa kao CSV ili NDJSON stream."""
+    event, err = _assert_admin_event(event_id)
+    if err:
+        return err
+    fmt = request.args.get("format", "csv")
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"error": "format mora biti csv ili ndjson"}), 400
+    return stream_export(
+        archive_service.for_event(table_reservations_col, event), {"event_id": event["_id"]},
+        "created_at", RESERVATION_EXPORT_COLUMNS, _reservation_export_row, fmt,
+        f"rezervacije-{event_id}",
+    )
 
 
 @reservations_bp.route("/<reservation_id>/checkin", methods=["PUT"])
 @role_required("hostess", "admin", "superadmin")
 def checkin_route(reservation_id):
     try:
-        reservation = checkin_reservation(reservation_id, current_user_id())
+        checkin_reservation(reservation_id, current_user_id())
     except ReservationError as exc:
         return jsonify({"error": str(exc)}), 409
-
-    publish('table_updates', {
-        "event_id": str(reservation["event_id"]),
-        "table_id": reservation["table_id"],
-        "status": "checked_in",
-    })
     return jsonify({"success": True})
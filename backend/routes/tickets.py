@@ -1,30 +1,83 @@
 """Karte — kupnja preko Stripea, potvrda, pregled, otkazivanje, admin statistike."""
 
+import os
 import uuid
 from datetime import datetime
 
-import stripe
 from bson import ObjectId
 from flask import Blueprint, jsonify, request
 
+import archive_service
 import stripe_service
+import ticket_signing
 from auth_utils import (
     current_club_id, current_role, current_user_id, role_required, serialize,
 )
+from customer_provisioning import ensure_customer
 from db import events_col, tickets_col, users_col
-from payments import confirm_ticket_purchase
+from exports import EXPORT_FORMATS, CursorError, keyset_page, stream_export
+from extensions import redis_client
+from guest_profile import guest_of, guest_snapshot
+from payment_gateway import GatewayUnavailable
+from payments import claim_ticket_quota, confirm_ticket_purchase, release_ticket_quota
 
 tickets_bp = Blueprint("tickets", __name__, url_prefix="/api")
 
+# Gornja granica grupne kupnje (karte svih tipova u jednom zahtjevu)
+MAX_TICKETS_PER_PURCHASE = int(os.environ.get("MAX_TICKETS_PER_PURCHASE", "10"))
+# Koliko dugo ključ kupnje drži zahtjev u tijeku (ponovljeni dobiva 409)
+PURCHASE_LOCK_SECONDS = 60
+
+
+def _purchase_counts(data):
+    """
+    {ticket_type_id: količina} iz zahtjeva: `items` ([{ticket_type_id,
+    quantity}], mješoviti tipovi) ili `ticket_type_id` + `quantity` (default 1).
+    """
+    raw_items = data.get("items")
+    if raw_items is None:
+        raw_items = [{"ticket_type_id": data.get("ticket_type_id"),
+                      "quantity": data.get("quantity", 1)}]
+    if not isinstance(raw_items, list) or not raw_items:
+        raise ValueError("items mora biti neprazna lista")
+
+    counts = {}
+    for item in raw_items:
+        type_id = item.get("ticket_type_id") if isinstance(item, dict) else None
+        quantity = item.get("quantity", 1) if isinstance(item, dict) else None
+        if not type_id:
+            raise ValueError("event_id i ticket_type_id su obavezni")
+        if not isinstance(quantity, int) or isinstance(quantity, bool) or quantity < 1:
+            raise ValueError("Količina mora biti cijeli broj, barem 1")
+        counts[type_id] = counts.get(type_id, 0) + quantity
+
+    if sum(counts.values()) > MAX_TICKETS_PER_PURCHASE:
+        raise ValueError(f"Najviše {MAX_TICKETS_PER_PURCHASE} karata po kupnji")
+    return counts
+
 
 @tickets_bp.route("/tickets/purchase", methods=["POST"])
 @role_required("user")
 def purchase_ticket():
-    """Kreira pending kartu + Stripe PaymentIntent; vraća client_secret."""
+    """
+    Kreira pending karte + jedan Stripe PaymentIntent; vraća client_secret.
+
+    Grupa (`quantity` ili `items` s više tipova) zauzme kvotu jednim
+    atomarnim updateom, plaća se jednim PI-jem, a karte (svaka s vlastitim
+    QR kodom) upisuju se jednim insert_many.
+
+    `purchase_key` (klijent ga generira po kupnji i ponavlja ga u retryju)
+    čini kupnju idempotentnom: ponovljeni zahtjev vraća iste karte i isti
+    PaymentIntent (200) umjesto druge kupnje i dodatne kvote.
+    """
     data = request.get_json(silent=True) or {}
     event_id = data.get("event_id")
-    ticket_type_id = data.get("ticket_type_id")
-    if not event_id or not ticket_type_id:
+    purchase_key = str(data.get("purchase_key") or "")[:64] or None
+    try:
+        counts = _purchase_counts(data)
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+    if not event_id:
         return jsonify({"error": "event_id i ticket_type_id su obavezni"}), 400
 
     event = events_col.find_one({
@@ -35,80 +88,125 @@ def purchase_ticket():
     if not event:
         return jsonify({"error": "Event ne postoji ili nije dostupan"}), 404
 
-    ticket_type = next(
-        (t for t in event.get("ticket_types", []) if t["id"] == ticket_type_id), None
-    )
-    if not ticket_type or not ticket_type.get("is_active", True):
-        return jsonify({"error": "Tip karte ne postoji ili nije aktivan"}), 404
-
+    types_by_id = {t["id"]: t for t in event.get("ticket_types", [])}
     now = datetime.utcnow()
-    if ticket_type.get("sale_start") and now < ticket_type["sale_start"]:
-        return jsonify({"error": "Prodaja još nije počela"}), 409
-    if ticket_type.get("sale_end") and now > ticket_type["sale_end"]:
-        return jsonify({"error": "Prodaja je završila"}), 409
+    for type_id in counts:
+        ticket_type = types_by_id.get(type_id)
+        if not ticket_type or not ticket_type.get("is_active", True):
+            return jsonify({"error": "Tip karte ne postoji ili nije aktivan"}), 404
+        if ticket_type.get("sale_start") and now < ticket_type["sale_start"]:
+            return jsonify({"error": "Prodaja još nije počela"}), 409
+        if ticket_type.get("sale_end") and now > ticket_type["sale_end"]:
+            return jsonify({"error": "Prodaja je završila"}), 409
 
     user = users_col.find_one({"_id": current_user_id()})
     if not user:
         return jsonify({"error": "Korisnik ne postoji"}), 404
 
-    # Atomarno rezerviraj kvotu — guard u array_filteru sprječava overselling
+    if purchase_key:
+        existing = list(tickets_col.find({"user_id": user["_id"], "purchase_key": purchase_key}))
+        if existing:
+            return _purchase_replay(existing)
+        if not _lock_purchase(user["_id"], purchase_key):
+            return jsonify({"error": "Ova kupnja je već u tijeku"}), 409
+
+    # Atomarno rezerviraj kvotu za cijelu grupu — guard sprječava overselling
     # pri istovremenim kupnjama (kvota se vraća ako plaćanje ne uspije/istekne)
-    claimed = events_col.update_one(
-        {"_id": event["_id"]},
-        {"$inc": {"ticket_types.$[t].sold_quantity": 1}},
-        array_filters=[{
-            "t.id": ticket_type_id,
-            "t.sold_quantity": {"$lt": ticket_type["total_quantity"]},
-        }],
-    )
-    if not claimed.modified_count:
-        return jsonify({"error": "Karte ovog tipa su rasprodane"}), 409
-
-    def _release_quota():
-        events_col.update_one(
-            {"_id": event["_id"]},
-            {"$inc": {"ticket_types.$[t].sold_quantity": -1}},
-            array_filters=[{"t.id": ticket_type_id}],
-        )
+    if not claim_ticket_quota(event, counts):
+        _unlock_purchase(user["_id"], purchase_key)
+        return jsonify({"error": "Nema dovoljno slobodnih karata traženog tipa"}), 409
 
-    # Osiguraj Stripe customera (Apple Pay / Google Pay / kartice)
-    try:
-        if not user.get("stripe_customer_id"):
-            customer_id = stripe_service.get_or_create_stripe_customer(user)
-            users_col.update_one(
-                {"_id": user["_id"]}, {"$set": {"stripe_customer_id": customer_id}}
-            )
-            user["stripe_customer_id"] = customer_id
+    # ID-evi karata unaprijed; bez purchase_key prva karta je ključ PaymentIntenta
+    lines = [(ObjectId(), type_id) for type_id, n in counts.items() for _ in range(n)]
+    amount = round(sum(float(types_by_id[type_id]["price"]) for _, type_id in lines), 2)
 
+    # Stripe customer je u pravilu već kreiran unaprijed (customer_provisioning);
+    # inline kreiranje je samo fallback
+    try:
+        ensure_customer(user)
         intent = stripe_service.create_ticket_payment_intent(
-            ticket_type["price"], user, event_id, ticket_type_id
+            amount, user, event_id, counts, purchase_key or str(lines[0][0])
         )
+    except GatewayUnavailable as exc:
+        release_ticket_quota(event["_id"], counts)
+        _unlock_purchase(user["_id"], purchase_key)
+        return jsonify({"error": str(exc)}), 503, {
+            "Retry-After": str(stripe_service.retry_after_seconds())
+        }
     except Exception as exc:
-        _release_quota()
+        release_ticket_quota(event["_id"], counts)
+        _unlock_purchase(user["_id"], purchase_key)
         return jsonify({"error": f"Stripe greška: {exc}"}), 502
 
-    ticket = {
+    guest = guest_snapshot(user)
+    purchased_at = datetime.utcnow()
+    # Potpisani QR se izdaje tek pri potvrdi plaćanja (payments._make_valid)
+    tickets = [{
+        "_id": ticket_id,
         "user_id": user["_id"],
         "event_id": event["_id"],
         "club_id": event["club_id"],
-        "ticket_type_id": ticket_type_id,
-        "ticket_type_name": ticket_type["name"],
-        "price_paid": float(ticket_type["price"]),
+        "ticket_type_id": type_id,
+        "ticket_type_name": types_by_id[type_id]["name"],
+        "price_paid": float(types_by_id[type_id]["price"]),
         "qr_code": str(uuid.uuid4()),
         "status": "pending",
         "checked_in_at": None,
         "checked_in_by": None,
         "stripe_payment_intent_id": intent.id,
-        "purchased_at": datetime.utcnow(),
-    }
-    result = tickets_col.insert_one(ticket)
+        "purchased_at": purchased_at,
+        "guest": guest,
+        **({"purchase_key": purchase_key} if purchase_key else {}),
+    } for ticket_id, type_id in lines]
+    tickets_col.insert_many(tickets)
+    return _purchase_response(tickets, intent, amount), 201
 
+
+def _lock_purchase(user_id, purchase_key):
+    """Samo jedan zahtjev po ključu kupnje dok prvi ne upiše karte."""
+    try:
+        return bool(redis_client.set(
+            f"ticket_purchase:{user_id}:{purchase_key}", "1",
+            nx=True, ex=PURCHASE_LOCK_SECONDS,
+        ))
+    except Exception:
+        # Redis nedostupan — Stripe idempotency key i dalje vraća isti PI
+        return True
+
+
+def _unlock_purchase(user_id, purchase_key):
+    """Neuspjela kupnja (kvota, Stripe) — klijent smije odmah ponoviti isti ključ."""
+    if not purchase_key:
+        return
+    try:
+        redis_client.delete(f"ticket_purchase:{user_id}:{purchase_key}")
+    except Exception:
+        pass  # lock ionako istječe
+
+
+def _purchase_response(tickets, intent, amount):
     return jsonify({
-        "ticket_id": str(result.inserted_id),
+        "ticket_id": str(tickets[0]["_id"]),
+        "ticket_ids": [str(t["_id"]) for t in tickets],
+        "quantity": len(tickets),
         "client_secret": intent.client_secret,
         "publishable_key": stripe_service.STRIPE_PUBLISHABLE_KEY,
-        "amount": ticket["price_paid"],
-    }), 201
+        "amount": amount,
+    })
+
+
+def _purchase_replay(tickets):
+    """Ponovljeni zahtjev s istim purchase_key → odgovor izvorne kupnje."""
+    try:
+        intent = stripe_service.retrieve_payment_intent(tickets[0]["stripe_payment_intent_id"])
+    except GatewayUnavailable as exc:
+        return jsonify({"error": str(exc)}), 503, {
+            "Retry-After": str(stripe_service.retry_after_seconds())
+        }
+    except Exception as exc:
+        return jsonify({"error": f"Stripe greška: {exc}"}), 502
+    amount = round(sum(t["price_paid"] for t in tickets), 2)
+    return _purchase_response(tickets, intent, amount), 200
 
 
 @tickets_bp.route("/tickets/confirm", methods=["POST"])
@@ -122,7 +220,11 @@ def confirm_ticket():
     if not pi_id:
         return jsonify({"error": "payment_intent_id je obavezan"}), 400
     try:
-        intent = stripe.PaymentIntent.retrieve(pi_id)
+        intent = stripe_service.retrieve_payment_intent(pi_id)
+    except GatewayUnavailable as exc:
+        return jsonify({"error": str(exc)}), 503, {
+            "Retry-After": str(stripe_service.retry_after_seconds())
+        }
     except Exception as exc:
         return jsonify({"error": f"Stripe greška: {exc}"}), 502
 
@@ -136,9 +238,8 @@ def confirm_ticket():
 @tickets_bp.route("/tickets/my", methods=["GET"])
 @role_required("user")
 def my_tickets():
-    tickets = list(
-        tickets_col.find({"user_id": current_user_id()})
-        .sort("purchased_at", -1).limit(200)
+    tickets = archive_service.recent(
+        tickets_col, {"user_id": current_user_id()}, "purchased_at", 200
     )
     event_ids = list({t["event_id"] for t in tickets})
     events = {
@@ -150,6 +251,9 @@ def my_tickets():
     enriched = []
     for t in tickets:
         doc = serialize(t)
+        # QR samo za plaćene karte — neplaćena/poništena se ne smije pokazati na ulazu
+        if t.get("status") not in ticket_signing.USABLE_STATUSES:
+            doc["qr_code"] = None
         event = events.get(t["event_id"])
         if event:
             doc["event"] = event
@@ -190,7 +294,12 @@ def cancel_ticket(ticket_id):
     refunded = False
     if claimed["status"] == "valid" and claimed.get("stripe_payment_intent_id"):
         try:
-            stripe_service.refund_payment_intent(claimed["stripe_payment_intent_id"])
+            # PI može pokrivati cijelu grupnu kupnju — vraća se samo ova karta
+            stripe_service.refund_payment_intent(
+                claimed["stripe_payment_intent_id"],
+                amount_eur=claimed["price_paid"],
+                refund_key=f"ticket:{claimed['_id']}",
+            )
             refunded = True
             tickets_col.update_one(
                 {"_id": ticket["_id"]}, {"$set": {"refund_status": "refunded"}}
@@ -216,32 +325,77 @@ def _assert_admin_event(event_id):
     return event, None
 
 
+def _sold_tickets_query(event):
+    return {"event_id": event["_id"], "status": {"$in": ["valid", "checked_in"]}}
+
+
 @tickets_bp.route("/events/<event_id>/tickets", methods=["GET"])
 @role_required("admin", "superadmin")
 def event_tickets(event_id):
-    """Prodane karte eventa s podacima o kupcu."""
+    """
+    Prodane karte eventa s podacima o kupcu, najnovije prvo. Keyset
+    paginacija: `?cursor=` iz `next_cursor` prethodne stranice.
+    """
     event, err = _assert_admin_event(event_id)
     if err:
         return err
 
-    limit = min(int(request.args.get("limit", 200)), 1000)
-    tickets = list(tickets_col.find({
-        "event_id": event["_id"],
-        "status": {"$in": ["valid", "checked_in"]},
-    }).sort("purchased_at", -1).limit(limit))
-
-    user_ids = list({t["user_id"] for t in tickets})
-    users = {
-        u["_id"]: u for u in users_col.find(
-            {"_id": {"$in": user_ids}}, {"name": 1, "email": 1, "phone": 1}
+    try:
+        limit = max(1, min(int(request.args.get("limit", 200)), 1000))
+    except ValueError:
+        return jsonify({"error": "limit mora biti broj"}), 400
+    try:
+        tickets, next_cursor = keyset_page(
+            archive_service.for_event(tickets_col, event), _sold_tickets_query(event),
+            "purchased_at", limit,
+            request.args.get("cursor"),
         )
-    }
+    except CursorError as exc:
+        return jsonify({"error": str(exc)}), 400
+
     enriched = []
     for t in tickets:
         doc = serialize(t)
-        doc["user"] = serialize(users.get(t["user_id"], {}))
+        doc["user"] = guest_of(t)
         enriched.append(doc)
-    return jsonify({"tickets": enriched, "count": len(enriched)})
+    return jsonify({"tickets": enriched, "count": len(enriched), "next_cursor": next_cursor})
+
+
+TICKET_EXPORT_COLUMNS = [
+    "ticket_id", "purchased_at", "status", "ticket_type", "price_paid",
+    "guest_name", "guest_email", "guest_phone", "checked_in_at",
+]
+
+
+def _ticket_export_row(ticket):
+    guest = ticket["guest"]
+    return {
+        "ticket_id": ticket["_id"],
+        "purchased_at": ticket.get("purchased_at"),
+        "status": ticket["status"],
+        "ticket_type": ticket.get("ticket_type_name"),
+        "price_paid": ticket.get("price_paid"),
+        "guest_name": guest.get("name"),
+        "guest_email": guest.get("email"),
+        "guest_phone": guest.get("phone"),
+        "checked_in_at": ticket.get("checked_in_at"),
+    }
+
+
+@tickets_bp.route("/events/<event_id>/tickets/export", methods=["GET"])
+@role_required("admin", "superadmin")
+def export_event_tickets(event_id):
+    """Svi kupci karata eventa kao CSV ili NDJSON stream (bez QR kodova)."""
+    event, err = _assert_admin_event(event_id)
+    if err:
+        return err
+    fmt = request.args.get("format", "csv")
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"error": "format mora biti csv ili ndjson"}), 400
+    return stream_export(
+        archive_service.for_event(tickets_col, event), _sold_tickets_query(event), "purchased_at",
+        TICKET_EXPORT_COLUMNS, _ticket_export_row, fmt, f"karte-{event_id}",
+    )
 
 
 @tickets_bp.route("/events/<event_id>/ticket-stats", methods=["GET"])
@@ -264,7 +418,7 @@ def event_ticket_stats(event_id):
             "revenue": round(tt["price"] * tt["sold_quantity"], 2),
         })
 
-    checked_in = tickets_col.count_documents(
+    checked_in = archive_service.for_event(tickets_col, event).count_documents(
         {"event_id": event["_id"], "status": "checked_in"}
     )
     return jsonify({
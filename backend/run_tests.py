@@ -286,13 +286,19 @@ def main():
 
     print("\n== Stripe (bez pravog ključa očekujemo kontroliranu grešku) ==")
     ticket_type_id = event["ticket_types"][0]["id"]
-    r = requests.post(f"{BASE}/api/tickets/purchase", headers=auth_headers(user_token), json={
-        "event_id": event_id, "ticket_type_id": ticket_type_id,
-    })
+    purchase = {"event_id": event_id, "ticket_type_id": ticket_type_id,
+                "purchase_key": uuid.uuid4().hex}
+    r = requests.post(f"{BASE}/api/tickets/purchase", headers=auth_headers(user_token), json=purchase)
     has_stripe = bool(os.environ.get("STRIPE_SECRET_KEY"))
     if has_stripe:
         check("POST /api/tickets/purchase (Stripe)", r.status_code == 201 and
               "client_secret" in r.json(), f"({r.status_code}: {r.text[:100]})")
+        # Retry s istim ključem vraća istu kupnju, bez novog PI-ja i kvote
+        retry = requests.post(f"{BASE}/api/tickets/purchase", headers=auth_headers(user_token),
+                              json=purchase)
+        check("POST /api/tickets/purchase retry → ista kupnja", retry.status_code == 200 and
+              retry.json().get("ticket_id") == r.json().get("ticket_id"),
+              f"({retry.status_code}: {retry.text[:100]})")
     else:
         check("POST /api/tickets/purchase bez ključa → 502", r.status_code == 502)
         # Kvota se atomarno rezervira pri kupnji — Stripe greška je mora vratiti
@@ -3,73 +3,125 @@ Stripe integracija — PaymentIntenti za karte, VIP depozite i narudžbe pića.
 
 Sve funkcije vraćaju cijeli PaymentIntent objekt; pozivatelj koristi
 `intent.client_secret` (za mobilni Payment Sheet) i `intent.id` (za praćenje).
+Sam poziv ide kroz payment_gateway.get_gateway() — Stripe SDK s breakerom i
+bulkheadom (offline testovi ga usmjeravaju na HTTP stand-in).
+
+Svaki POST nosi idempotency key izveden iz našeg ID-a (rezervacija,
+narudžba, korisnik) ili, za karte, iz korisnika i `purchase_key` koji
+klijent ponavlja u retryju — pa su retry SDK-a i ponovljeni zahtjevi
+klijenta sigurni: isti ključ uvijek vraća isti PaymentIntent (ruta kupnje
+uz to vraća već upisane karte umjesto novih). payment_gateway.GatewayUnavailable
+znači da poziv nije ni poslan (breaker/bulkhead); rute vraćaju 503.
 """
 
 import os
+from functools import wraps
 
-import stripe
-
-stripe.api_key = os.environ.get('STRIPE_SECRET_KEY')
+from payment_gateway import get_gateway
+from request_profiling import track
 
 STRIPE_PUBLISHABLE_KEY = os.environ.get('STRIPE_PUBLISHABLE_KEY', '')
 
 
-def create_ticket_payment_intent(amount_eur, user, event_id, ticket_type_id):
-    intent = stripe.PaymentIntent.create(
-        amount=int(round(amount_eur * 100)),
-        currency="eur",
-        customer=user.get("stripe_customer_id"),
-        metadata={
+def _profiled(fn):
+    """Vrijeme Stripe poziva ulazi u profil zahtjeva (request_profiling)."""
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        with track("stripe"):
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+def _cents(amount_eur):
+    return int(round(amount_eur * 100))
+
+
+@_profiled
+def create_ticket_payment_intent(amount_eur, user, event_id, ticket_counts, purchase_key):
+    """Jedan PI za sve karte kupnje; `purchase_key` je ključ kupnje klijenta."""
+    return get_gateway().create_payment_intent(
+        _cents(amount_eur),
+        user.get("stripe_customer_id"),
+        {
             "type": "ticket_purchase",
             "event_id": str(event_id),
-            "ticket_type_id": str(ticket_type_id),
+            "ticket_type_id": ",".join(ticket_counts),
+            "quantity": str(sum(ticket_counts.values())),
             "user_id": str(user["_id"])
         },
-        automatic_payment_methods={"enabled": True},
+        idempotency_key=f"ticket:{user['_id']}:{purchase_key}",
     )
-    return intent
 
 
+@_profiled
 def create_deposit_payment_intent(amount_eur, user, reservation_id):
-    intent = stripe.PaymentIntent.create(
-        amount=int(round(amount_eur * 100)),
-        currency="eur",
-        customer=user.get("stripe_customer_id"),
-        metadata={
+    return get_gateway().create_payment_intent(
+        _cents(amount_eur),
+        user.get("stripe_customer_id"),
+        {
             "type": "vip_deposit",
             "reservation_id": str(reservation_id),
             "user_id": str(user["_id"])
         },
-        automatic_payment_methods={"enabled": True},
+        idempotency_key=f"deposit:{reservation_id}",
     )
-    return intent
 
 
+@_profiled
 def create_drink_payment_intent(amount_eur, user, order_id):
-    intent = stripe.PaymentIntent.create(
-        amount=int(round(amount_eur * 100)),
-        currency="eur",
-        customer=user.get("stripe_customer_id"),
-        metadata={
+    return get_gateway().create_payment_intent(
+        _cents(amount_eur),
+        user.get("stripe_customer_id"),
+        {
             "type": "drink_order",
             "order_id": str(order_id),
             "user_id": str(user["_id"])
         },
-        automatic_payment_methods={"enabled": True},
+        idempotency_key=f"drink:{order_id}",
     )
-    return intent
+
+
+@_profiled
+def retrieve_payment_intent(payment_intent_id):
+    return get_gateway().retrieve_payment_intent(payment_intent_id)
 
 
 def get_or_create_stripe_customer(user):
+    # Već poznat customer nije Stripe poziv — profilira se samo kreiranje
     if user.get("stripe_customer_id"):
         return user["stripe_customer_id"]
-    customer = stripe.Customer.create(
+    return _create_customer(user).id
+
+
+@_profiled
+def _create_customer(user):
+    return get_gateway().create_customer(
         email=user.get("email"),
         name=user.get("name"),
-        metadata={"user_id": str(user["_id"])}
+        metadata={"user_id": str(user["_id"])},
+        idempotency_key=f"customer:{user['_id']}",
     )
-    return customer.id
 
 
-def refund_payment_intent(payment_intent_id):
-    return stripe.Refund.create(payment_intent=payment_intent_id)
+@_profiled
+def refund_payment_intent(payment_intent_id, amount_eur=None, refund_key=None):
+    """
+    Puni refund PI-ja, ili djelomični (`amount_eur`) kad se vraća samo dio
+    grupne kupnje — tada `refund_key` (npr. id karte) razlikuje refunde
+    istog PI-ja za idempotency.
+    """
+    return get_gateway().refund_payment_intent(
+        payment_intent_id,
+        amount_cents=_cents(amount_eur) if amount_eur is not None else None,
+        idempotency_key=f"refund:{refund_key or payment_intent_id}",
+    )
+
+
+def retry_after_seconds():
+    """Za Retry-After header kad je gateway nedostupan."""
+    return get_gateway().breaker.retry_after()
+
+
+def construct_webhook_event(payload, sig_header):
+    """Verificira potpis webhooka; podiže iznimku za neispravan potpis."""
+    return get_gateway().construct_webhook_event(payload, sig_header)
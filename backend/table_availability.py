@@ -0,0 +1,131 @@
+"""
+Dostupnost stolova po eventu + preporuka stola za veličinu društva.
+
+Zauzeti stolovi eventa drže se u Redis setu `event_taken_tables:<event_id>`
+(TTL AVAILABILITY_TTL_SECONDS). Na promašaj se set napuni jednim upitom na
+`table_reservations` (aktivni statusi). Promjene statusa stola javlja
+change_stream_worker (`table_changed`, koji emitira i `table_updated`) i
+set ažurira samo ako već postoji, pa se nikad ne stvori djelomičan set.
+
+Preporuka radi nad kompiliranom mapom (floor_map_index): jedan prolaz
+preko redaka mape preskače zauzete (set id-eva), a kandidati se rangiraju po:
+višku mjesta, depozitu, željenoj sekciji i udaljenosti od željene točke.
+Rezervacija i dalje ide kroz create_reservation — unique indeks ostaje
+jedini jamac atomnosti, preporuka samo smanjuje promašene pokušaje.
+"""
+
+import heapq
+import math
+import os
+
+from bson import ObjectId
+
+from db import table_reservations_col
+from extensions import redis_client
+from floor_map_index import COMPACT_COLUMNS
+from realtime import publish
+from reservation_service import ACTIVE_STATUSES
+
+AVAILABILITY_TTL_SECONDS = int(os.environ.get("AVAILABILITY_TTL_SECONDS", "60"))
+
+# Težine rangiranja (manji score = bolji stol)
+WEIGHT_SPARE_SEAT = 10.0      # svako prazno mjesto za stolom
+WEIGHT_DEPOSIT_EUR = 0.1      # svaki euro depozita
+PENALTY_OTHER_SECTION = 25.0  # stol izvan željene sekcije
+WEIGHT_DISTANCE = 1.0         # po % jedinici udaljenosti od željene točke
+
+# Prazan set se u Redisu ne može spremiti — oznaka "učitano, ništa zauzeto"
+_LOADED_MARKER = ""
+
+# Mijenja set samo ako postoji (inače bi nastao set bez ostalih zauzetih stolova)
+_UPDATE_IF_LOADED = redis_client.register_script("""
+if redis.call('exists', KEYS[1]) == 1 then
+    return redis.call(ARGV[1], KEYS[1], ARGV[2])
+end
+return -1
+""")
+
+
+AVAILABILITY_KEY_PATTERN = "event_taken_tables:*"
+
+
+def _key(event_id):
+    return f"event_taken_tables:{event_id}"
+
+
+def taken_tables(event_id):
+    """Set id-eva zauzetih stolova eventa (Redis, fallback Mongo)."""
+    key = _key(event_id)
+    try:
+        members = redis_client.smembers(key)
+    except Exception:
+        members = None
+    if members:
+        return {m.decode() if isinstance(m, bytes) else m for m in members} - {_LOADED_MARKER}
+
+    taken = set(table_reservations_col.distinct(
+        "table_id", {"event_id": ObjectId(event_id), "status": {"$in": ACTIVE_STATUSES}},
+    ))
+    try:
+        pipe = redis_client.pipeline()
+        pipe.delete(key)
+        pipe.sadd(key, _LOADED_MARKER, *taken)
+        pipe.expire(key, AVAILABILITY_TTL_SECONDS)
+        pipe.execute()
+    except Exception as exc:
+        print(f"[availability] Cache nije zapisan ({event_id}): {exc}")
+    return taken
+
+
+def invalidate_taken(event_id):
+    """Odbaci cache zauzetih stolova eventa; sljedeće čitanje ga puni iz Monga."""
+    try:
+        redis_client.delete(_key(event_id))
+    except Exception as exc:
+        print(f"[availability] Cache nije obrisan ({event_id}): {exc}")
+
+
+def table_changed(event_id, table_id, status):
+    """
+    Promjena statusa stola (iz change streama): ažurira cache dostupnosti
+    i emitira `table_updated` (status `free` oslobađa stol).
+    """
+    try:
+        _UPDATE_IF_LOADED(
+            keys=[_key(event_id)],
+            args=["srem" if status == "free" else "sadd", table_id],
+        )
+    except Exception as exc:
+        print(f"[availability] Cache nije ažuriran ({event_id}/{table_id}): {exc}")
+    publish('table_updates', {
+        "event_id": str(event_id),
+        "table_id": table_id,
+        "status": status,
+    })
+
+
+def recommend_tables(floor_map, taken, party_size, section_id=None, near=None, limit=5):
+    """
+    Najbolji slobodni stolovi za društvo od `party_size` osoba.
+    `near` = (x, y) u % koordinatama (npr. blizu šanka/stagea).
+    """
+    candidates = []
+    for index, row in enumerate(floor_map.rows):
+        # None = obrisan stol (rupa u kompiliranoj mapi)
+        if row is None or row[0] in taken:
+            continue
+        capacity = row[7]
+        if capacity and capacity >= party_size:
+            score = (capacity - party_size) * WEIGHT_SPARE_SEAT
+            score += row[9] * WEIGHT_DEPOSIT_EUR
+            if section_id and row[10] != section_id:
+                score += PENALTY_OTHER_SECTION
+            if near:
+                score += math.hypot(row[3] - near[0], row[4] - near[1]) * WEIGHT_DISTANCE
+            candidates.append((score, index))
+
+    best = heapq.nsmallest(limit, candidates)
+    return [
+        {**dict(zip(COMPACT_COLUMNS, floor_map.rows[i])), "score": round(score, 2)}
+        for score, i in best
+    ]
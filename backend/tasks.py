@@ -3,20 +3,38 @@ Celery zadatci — NightClub Manager v2.
 
 - generate_daily_report: dnevni agregat po klubu (Mongo aggregation pipeline)
 - send_reservation_reminders: podsjetnici dan prije eventa
+- flush_email_outbox / send_email_batch: batch slanje mailova (SendGrid)
 - expire_stale_payments: oslobađa neplaćene pending rezervacije i karte
+- provision_stripe_customers: Stripe customeri unaprijed, u batchevima
+- sweep_missing_stripe_customers: vraća u red korisnike kojima je to promaklo
+- process_stripe_event / retry_stuck_stripe_events: obrada webhook inboxa
+- generate_image_variants: WebP varijante lokalno uploadanih slika
+- forward_image_to_cloudinary: prebacuje upload na CDN i mijenja URL u dokumentu
+- propagate_guest_profile: novo ime/email/telefon korisnika na njegove karte
+  i rezervacije (snapshot `guest`, guest_profile.py)
+- archive_finished_events: karte/rezervacije/narudžbe starih evenata u
+  `*_archive` kolekcije (archive_service.py)
 
-Konekcija na Mongo ide kroz db.py (MONGO_URI iz okoline), a real-time
-obavijesti kroz realtime.publish (Redis message queue) — worker tako može
-emitirati Socket.IO evente iako ne poslužuje klijente.
+Konekcija na Mongo ide kroz db.py (MONGO_URI iz okoline). Real-time
+obavijesti o promjenama dokumenata (stolovi, narudžbe) ne šalju taskovi
+nego change_stream_worker.py.
 """
 
+import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 
+import requests
+from bson import ObjectId
 from celery import Celery
+from celery.signals import worker_init
+from celery.utils.time import get_exponential_backoff_interval
+from prometheus_client import start_http_server
 
 from db import (
+    ANALYTICS_MAX_TIME_MS,
+    analytics_db,
     clubs_col,
-    drink_orders_col,
     events_col,
     reports_col,
     table_reservations_col,
@@ -26,19 +44,56 @@ from db import (
 # Svi importi moraju biti na razini modula: Celery nakon starta makne radni
 # direktorij sa sys.path (security kad worker vrti root), pa import unutar
 # taska podigne ModuleNotFoundError
-from email_service import send_reservation_reminder
-from realtime import publish
+import archive_service
+import guest_profile
+import webhook_inbox
+from customer_provisioning import ensure_customer, pop_batch, queue_customers
+from email_service import (
+    EmailDeliveryError,
+    EmailRejectedError,
+    ack_outbox,
+    chunked,
+    claim_outbox,
+    dead_letter,
+    queue_reservation_reminder,
+    render_batches,
+    requeue_messages,
+    requeue_outbox,
+    send_batch,
+)
+from extensions import redis_client
 from reservation_service import PENDING_DEPOSIT_TTL_MINUTES
+from upload_service import build_variants, replace_image_url, upload_to_cloudinary
 
 app = Celery('tasks')
 app.config_from_object('celery_config')
 
+# Worker vrti gevent pool (jedan proces) pa Prometheus metrike Mongo poola
+# i taskova izlažemo na zasebnom portu koji Prometheus scrapea
+CELERY_METRICS_PORT = int(os.environ.get("CELERY_METRICS_PORT", "0"))
+
+EMAIL_FLUSH_SIZE = int(os.environ.get("EMAIL_FLUSH_SIZE", "5000"))
+# Celery rate limit po workeru za SendGrid zahtjeve (svaki do 1000 primatelja)
+EMAIL_RATE_LIMIT = os.environ.get("EMAIL_RATE_LIMIT", "5/s")
+EMAIL_MAX_RETRIES = int(os.environ.get("EMAIL_MAX_RETRIES", "8"))
+
+CUSTOMER_PROVISION_BATCH = int(os.environ.get("CUSTOMER_PROVISION_BATCH", "100"))
+CUSTOMER_PROVISION_CONCURRENCY = int(os.environ.get("CUSTOMER_PROVISION_CONCURRENCY", "8"))
+
+
+@worker_init.connect
+def start_metrics_server(**_kwargs):
+    if CELERY_METRICS_PORT:
+        webhook_inbox.register_backlog_metrics()
+        start_http_server(CELERY_METRICS_PORT)
+        print(f"[metrics] Celery metrike na :{CELERY_METRICS_PORT}/metrics")
+
 
 def _sum_and_count(col, match, field):
     res = list(col.aggregate([
         {"$match": match},
         {"$group": {"_id": None, "total": {"$sum": f"${field}"}, "count": {"$sum": 1}}},
-    ]))
+    ], maxTimeMS=ANALYTICS_MAX_TIME_MS))
     if not res:
         return 0.0, 0
     return round(res[0]["total"] or 0, 2), res[0]["count"]
@@ -52,19 +107,19 @@ def generate_daily_report():
     for club in clubs_col.find({"is_active": True}):
         cid = club["_id"]
 
-        revenue_tickets, tickets_sold = _sum_and_count(tickets_col, {
+        revenue_tickets, tickets_sold = _sum_and_count(analytics_db.tickets, {
             "club_id": cid,
             "purchased_at": {"$gte": yesterday},
             "status": {"$in": ["valid", "checked_in"]},
         }, "price_paid")
 
-        revenue_drinks, drink_orders = _sum_and_count(drink_orders_col, {
+        revenue_drinks, drink_orders = _sum_and_count(analytics_db.drink_orders, {
             "club_id": cid,
             "created_at": {"$gte": yesterday},
             "payment_status": "paid",
         }, "total")
 
-        revenue_deposits, _ = _sum_and_count(table_reservations_col, {
+        revenue_deposits, _ = _sum_and_count(analytics_db.table_reservations, {
             "club_id": cid,
             "created_at": {"$gte": yesterday},
             "deposit_paid": True,
@@ -76,10 +131,10 @@ def generate_daily_report():
             "type": "DAILY_STATS",
             "metrics": {
                 "total_tickets_sold": tickets_sold,
-                "total_reservations": table_reservations_col.count_documents({
+                "total_reservations": analytics_db.table_reservations.count_documents({
                     "club_id": cid,
                     "created_at": {"$gte": yesterday},
-                }),
+                }, maxTimeMS=ANALYTICS_MAX_TIME_MS),
                 "total_drink_orders": drink_orders,
                 "revenue_tickets": revenue_tickets,
                 "revenue_drinks": revenue_drinks,
@@ -94,29 +149,31 @@ def generate_daily_report():
 
 @app.task
 def send_reservation_reminders():
-    """Pošalji podsjetnike za rezervacije čiji event počinje za ~24h."""
+    """Podsjetnici za rezervacije čiji event počinje za ~24h (kroz email outbox)."""
     now = datetime.utcnow()
-    window_start = now + timedelta(hours=23)
-    window_end = now + timedelta(hours=25)
+    event_ids = [e["_id"] for e in events_col.find(
+        {"date": {"$gte": now + timedelta(hours=23), "$lte": now + timedelta(hours=25)}},
+        {"_id": 1},
+    )]
+    if not event_ids:
+        return
 
-    reservations = table_reservations_col.find({
-        "status": "confirmed",
-        "reminder_sent": False
-    })
     sent = 0
-    for r in reservations:
-        event = events_col.find_one({"_id": r["event_id"]})
-        if event and window_start <= event["date"] <= window_end:
-            user = users_col.find_one({"_id": r["user_id"]})
-            if user:
-                send_reservation_reminder(r, event, user)
-            table_reservations_col.update_one(
-                {"_id": r["_id"]},
-                {"$set": {"reminder_sent": True}}
-            )
+    for r in table_reservations_col.find({
+        "event_id": {"$in": event_ids},
+        "status": "confirmed",
+        "reminder_sent": False,
+    }, {"_id": 1}):
+        # Guard: dva preklopljena beat ciklusa ne šalju isti podsjetnik dvaput
+        claimed = table_reservations_col.update_one(
+            {"_id": r["_id"], "reminder_sent": False},
+            {"$set": {"reminder_sent": True}},
+        )
+        if claimed.modified_count:
+            queue_reservation_reminder(r)
             sent += 1
     if sent:
-        print(f"[reminders] Poslano {sent} podsjetnika.")
+        print(f"[reminders] U red stavljeno {sent} podsjetnika.")
 
 
 @app.task
@@ -149,11 +206,6 @@ def expire_stale_payments():
         )
         if result.modified_count:
             freed_tables += 1
-            publish('table_updates', {
-                "event_id": str(r["event_id"]),
-                "table_id": r["table_id"],
-                "status": "free",
-            })
 
     for t in tickets_col.find({
         "status": "pending",
@@ -173,3 +225,183 @@ def expire_stale_payments():
 
     if freed_tables or freed_tickets:
         print(f"[expiry] Oslobođeno {freed_tables} stolova i {freed_tickets} karata.")
+
+
+@app.task
+def provision_stripe_customers(max_batches=20):
+    """
+    Prazni red customer_provisioning u batchevima. Pozivi idu paralelno
+    (gevent pool monkey-patcha threadove), a neuspjeli korisnici se vraćaju
+    u red za sljedeći krug.
+    """
+    created = 0
+    for _ in range(max_batches):
+        ids = pop_batch(CUSTOMER_PROVISION_BATCH)
+        if not ids:
+            break
+        object_ids = [ObjectId(i) for i in ids if ObjectId.is_valid(i)]
+        if len(object_ids) < len(ids):
+            print(f"[customers] Preskočeno {len(ids) - len(object_ids)} neispravnih id-jeva.")
+        try:
+            users = list(users_col.find({
+                "_id": {"$in": object_ids},
+                "stripe_customer_id": None,
+                "is_active": True,
+            }))
+        except Exception:
+            # Batch je već skinut iz reda — vrati ga prije nego task padne
+            queue_customers(object_ids)
+            raise
+        failed = []
+
+        def _provision(user):
+            try:
+                ensure_customer(user)
+                return True
+            except Exception as exc:
+                failed.append(user["_id"])
+                print(f"[customers] {user['_id']}: {exc}")
+                return False
+
+        with ThreadPoolExecutor(max_workers=CUSTOMER_PROVISION_CONCURRENCY) as pool:
+            created += sum(pool.map(_provision, users))
+        if failed:
+            queue_customers(failed)
+            # Gateway je vjerojatno degradiran — ne vrti ostatak reda u prazno
+            break
+    if created:
+        print(f"[customers] Kreirano {created} Stripe customera.")
+
+
+@app.task
+def sweep_missing_stripe_customers(days=7):
+    """Aktivni korisnici iz zadnjih N dana bez customera (npr. Redis restart)."""
+    since = datetime.utcnow() - timedelta(days=days)
+    ids = [u["_id"] for u in users_col.find(
+        {"stripe_customer_id": None, "is_active": True, "created_at": {"$gte": since}},
+        {"_id": 1},
+    )]
+    queue_customers(ids)
+    if ids:
+        print(f"[customers] U red vraćeno {len(ids)} korisnika bez customera.")
+
+
+@app.task(bind=True, max_retries=None, acks_late=True)
+def process_stripe_event(self, event_id):
+    """Obrada jednog eventa iz webhook inboxa (idempotentno, redom po intentu)."""
+    try:
+        webhook_inbox.process(event_id)
+    except webhook_inbox.EventDeferred as exc:
+        raise self.retry(countdown=exc.countdown)
+    except webhook_inbox.EventFailed as exc:
+        # Pokušaji se broje na dokumentu — odgode ne troše WEBHOOK_MAX_ATTEMPTS
+        print(f"[webhook] {event_id} (pokušaj {exc.attempts}): {exc}")
+        if exc.dead:
+            return
+        raise self.retry(countdown=webhook_inbox.backoff_seconds(exc.attempts))
+    except Exception as exc:
+        # Infrastruktura (Mongo/Redis) — event nije ni preuzet, samo ponovi
+        print(f"[webhook] {event_id}: {exc}")
+        raise self.retry(countdown=webhook_inbox.backoff_seconds(self.request.retries + 1))
+
+
+@app.task
+def retry_stuck_stripe_events():
+    """Vraća u red evente koje nitko ne obrađuje (npr. broker bio nedostupan)."""
+    ids = webhook_inbox.stuck_event_ids()
+    for event_id in ids:
+        process_stripe_event.delay(event_id)
+    if ids:
+        print(f"[webhook] Ponovno u redu {len(ids)} eventa.")
+
+
+@app.task
+def flush_email_outbox():
+    """Outbox → batch lookupi → jedan multi-personalization zahtjev po eventu."""
+    # Jedan flush odjednom — processing lista je zajednička
+    lock = redis_client.lock("email_outbox_flush", timeout=120, blocking_timeout=0)
+    if not lock.acquire():
+        return
+    try:
+        messages = claim_outbox(EMAIL_FLUSH_SIZE)
+        if not messages:
+            return
+        try:
+            batches = render_batches(messages)
+        except Exception:
+            # Lookup nije prošao (Mongo) — cijeli claim natrag, ništa nije poslano
+            requeue_outbox()
+            raise
+        requests_sent = 0
+        for batch in batches:
+            for personalizations, chunk_messages in chunked(batch):
+                try:
+                    send_email_batch.delay(batch["content"], personalizations, chunk_messages)
+                    requests_sent += 1
+                except Exception as exc:
+                    # Broker nedostupan — samo ovaj komad natrag u outbox
+                    print(f"[email] Batch nije predan Celeryju: {exc}")
+                    requeue_messages(chunk_messages)
+        ack_outbox()
+        print(f"[email] {len(messages)} poruka → {requests_sent} SendGrid zahtjeva.")
+    finally:
+        try:
+            lock.release()
+        except Exception:
+            pass  # lock je istekao
+
+
+@app.task(bind=True, rate_limit=EMAIL_RATE_LIMIT, max_retries=EMAIL_MAX_RETRIES)
+def send_email_batch(self, content, personalizations, messages=()):
+    """
+    Jedan SendGrid zahtjev. Prolazne greške (429 / 5xx / mreža) se ponavljaju
+    s backoffom; kad retryji isteknu, poruke ovog zahtjeva vraćaju se u
+    outbox. 4xx se ne ponavlja — poruke idu u dead-letter.
+    """
+    try:
+        send_batch(content, personalizations)
+    except (EmailDeliveryError, requests.RequestException) as exc:
+        if self.request.retries >= self.max_retries:
+            print(f"[email] Slanje nije uspjelo nakon {self.max_retries} pokušaja, "
+                  f"{len(messages)} poruka natrag u outbox: {exc}")
+            requeue_messages(list(messages))
+            return
+        raise self.retry(exc=exc, countdown=get_exponential_backoff_interval(
+            factor=2, retries=self.request.retries, maximum=600, full_jitter=True,
+        ))
+    except EmailRejectedError as exc:
+        dead_letter(list(messages), str(exc))
+
+
+@app.task(autoretry_for=(OSError,), retry_backoff=5, max_retries=3)
+def generate_image_variants(folder, name):
+    """thumb/mobile/full WebP uz original (upload_service.build_variants)."""
+    build_variants(folder, name)
+
+
+# cloudinary.exceptions.Error pokriva i mrežne greške SDK-a
+@app.task(bind=True, autoretry_for=(Exception,), retry_backoff=10, max_retries=5)
+def forward_image_to_cloudinary(self, folder, name, collection, doc_id, field):
+    """Lokalni original → Cloudinary; dokument dobiva CDN URL kad upload uspije."""
+    secure_url = upload_to_cloudinary(folder, name)
+    local_url = f"/api/uploads/{folder}/{name}"
+    if not replace_image_url(collection, doc_id, field, local_url, secure_url):
+        # Ruta možda još nije upisala lokalni URL (task je bio brži)
+        if self.request.retries < 3:
+            raise self.retry(countdown=5)
+
+
+@app.task(autoretry_for=(Exception,), retry_backoff=5, max_retries=5)
+def propagate_guest_profile(user_id):
+    """Pokreće change_stream_worker kad se promijeni ime/email/telefon korisnika."""
+    updated = guest_profile.propagate(user_id)
+    if updated:
+        print(f"[guest] Snapshot korisnika {user_id} osvježen na {updated} dokumenata")
+
+
+@app.task
+def archive_finished_events():
+    """Dnevno: dokumente evenata starijih od ARCHIVE_AFTER_DAYS seli u arhivu."""
+    archived = archive_service.archive_finished_events()
+    if archived:
+        print(f"[archive] Obrađeno {archived} evenata.")
@@ -0,0 +1,145 @@
+"""
+Potpisani QR kodovi karata — provjera na ulazu bez mreže.
+
+Običan `qr_code` je nasumični UUID koji se može provjeriti samo upitom u
+bazu, pa check-in staje kad klubu padne mreža. Event s uključenim
+`signed_tickets` umjesto UUID-a dobiva samoprovjerljiv kod:
+
+    NC1.<ticket_id|event_id, base64url>.<ticket_type_id>.<HMAC, base64url>
+
+Potpis je HMAC-SHA256 (skraćen na 128 bita) s ključem eventa iz kolekcije
+`ticket_keys` — ključ nikad nije na dokumentu eventa jer se on javno
+serializira. Hostesin uređaj skine "offline kit" (ključ + kompaktne liste
+poništenih i već ušlih karata), provjerava kod lokalno (WebCrypto), a
+skenove kasnije pošalje bulk syncom koji razriješi duplikate.
+
+Kod se potpisuje tek kad je karta plaćena (payments.confirm_ticket_purchase);
+do tada karta ima UUID, pa snimka zaslona neplaćene karte ne prolazi
+offline provjeru. Karte prodane prije uključivanja zadržavaju UUID i
+provjeravaju se online.
+"""
+
+import base64
+import hashlib
+import hmac
+import re
+import secrets
+from datetime import datetime
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+from db import ticket_keys_col, tickets_col
+
+SIGNED_QR_PREFIX = "NC1"
+SIGNATURE_BYTES = 16
+KIT_ALGORITHM = "HMAC-SHA256-128"
+
+_TICKET_TYPE_RE = re.compile(r"[A-Za-z0-9_-]{1,32}")
+USABLE_STATUSES = ("valid", "checked_in")
+
+
+class SignatureError(ValueError):
+    """QR kod nije potpisan ključem eventa ili je oštećen."""
+
+
+def _b64(raw):
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _unb64(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _mac(key, message):
+    return hmac.new(key, message.encode(), hashlib.sha256).digest()[:SIGNATURE_BYTES]
+
+
+def is_signed(qr_code):
+    return (qr_code or "").startswith(SIGNED_QR_PREFIX + ".")
+
+
+def event_key(event_id, create=False):
+    """Ključ eventa (bytes) ili None; `create=True` ga generira pri prvom pozivu."""
+    oid = ObjectId(event_id)
+    if create:
+        ticket_keys_col.update_one(
+            {"event_id": oid},
+            {"$setOnInsert": {
+                "event_id": oid,
+                "key": secrets.token_bytes(32),
+                "created_at": datetime.utcnow(),
+            }},
+            upsert=True,
+        )
+    doc = ticket_keys_col.find_one({"event_id": oid})
+    return bytes(doc["key"]) if doc else None
+
+
+def sign(key, ticket_id, event_id, ticket_type_id):
+    """Potpisani QR kod; None ako ticket_type_id ne stane u format."""
+    if not _TICKET_TYPE_RE.fullmatch(ticket_type_id or ""):
+        return None
+    body = _b64(ObjectId(ticket_id).binary + ObjectId(event_id).binary)
+    message = f"{SIGNED_QR_PREFIX}.{body}.{ticket_type_id}"
+    return f"{message}.{_b64(_mac(key, message))}"
+
+
+def qr_codes_for(event, tickets):
+    """
+    QR kodovi plaćenih karata, lista (ticket_id, ticket_type_id) → kodovi:
+    potpisani ako ih event traži (ključ se čita jednom), inače None (UUID).
+    """
+    key = event_key(event["_id"]) if event.get("signed_tickets") else None
+    if key is None:
+        return [None] * len(tickets)
+    return [sign(key, ticket_id, event["_id"], ticket_type_id)
+            for ticket_id, ticket_type_id in tickets]
+
+
+def parse(qr_code):
+    """(ticket_id, event_id, ticket_type_id, message, signature) bez provjere potpisa."""
+    try:
+        prefix, body, ticket_type_id, signature = qr_code.split(".")
+        raw = _unb64(body)
+        if prefix != SIGNED_QR_PREFIX or len(raw) != 24:
+            raise ValueError
+        return (ObjectId(raw[:12]), ObjectId(raw[12:]), ticket_type_id,
+                f"{prefix}.{body}.{ticket_type_id}", _unb64(signature))
+    except (ValueError, TypeError, InvalidId) as exc:
+        raise SignatureError("Neispravan QR kod") from exc
+
+
+def verify(key, qr_code):
+    """(ticket_id, event_id, ticket_type_id) ako je potpis ispravan."""
+    ticket_id, event_id, ticket_type_id, message, signature = parse(qr_code)
+    if not hmac.compare_digest(_mac(key, message), signature):
+        raise SignatureError("QR kod nije potpisan ključem eventa")
+    return ticket_id, event_id, ticket_type_id
+
+
+def _packed_ids(query):
+    """Id-evi karata kao jedan base64url niz po 12 bajtova (kompaktno za uređaj)."""
+    return _b64(b"".join(t["_id"].binary for t in tickets_col.find(query, {"_id": 1})))
+
+
+def offline_kit(event):
+    """
+    Sve što hostesin uređaj treba za provjeru karata eventa bez mreže; None
+    ako event nema uključene potpisane karte (ključ ostaje i nakon isključivanja).
+    """
+    key = event_key(event["_id"]) if event.get("signed_tickets") else None
+    if key is None:
+        return None
+    signed = {"event_id": event["_id"], "qr_code": {"$regex": f"^{SIGNED_QR_PREFIX}\\."}}
+    return {
+        "event_id": str(event["_id"]),
+        "algorithm": KIT_ALGORITHM,
+        "prefix": SIGNED_QR_PREFIX,
+        "key": _b64(key),
+        "ticket_types": {t["id"]: t.get("name") for t in event.get("ticket_types", [])},
+        # Poništene (refund, istek, otkaz, neplaćene) i već ušle karte
+        "revoked": _packed_ids({**signed, "status": {"$nin": list(USABLE_STATUSES)}}),
+        "checked_in": _packed_ids({**signed, "status": "checked_in"}),
+        "generated_at": datetime.utcnow().isoformat(),
+    }
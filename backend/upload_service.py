@@ -3,13 +3,68 @@ Upload slika — Cloudinary (produkcija/MVP) ili lokalni disk (razvoj bez ključ
 
 Ako je CLOUDINARY_URL postavljen, slika ide na Cloudinary CDN i vraća se
 secure_url. Inače se sprema u /app/uploads i servira kroz /api/uploads/.
+
+Datoteke su adresirane sadržajem (sha256): ista slika uploadana dvaput
+zauzima jedno mjesto i ima isti URL. Uz original postoje varijante:
+
+- thumb  (320 px, WebP)  — kartice u listama, ~30–50 KB
+- mobile (1080 px, WebP) — detalji i tlocrt na mobitelu
+- full   (2048 px, WebP) — admin editor
+
+Lokalno ih generira Celery task `generate_image_variants` (Pillow); dok ne
+postoje, /api/uploads/ vraća original. Na Cloudinaryju su varijante URL
+transformacije. Imena varijanti su deterministička (`<hash>_<varijanta>.webp`)
+pa ih klijent može izvesti i iz samog URL-a originala.
+
+Upload se ne drži u memoriji: na upload rutama (`@streamed_upload`) multipart
+dio ide u chunkovima ravno u temp datoteku na uploads volumenu, usput se
+računa sha256 i već iz prvih bajtova provjerava je li to stvarno slika
+(magic bytes, ne ekstenzija).
+Original se u konačno ime samo hardlinka. S Cloudinaryjem se slika prvo
+poslužuje lokalno, a task `forward_image_to_cloudinary` je prebaci na CDN i
+zamijeni URL u dokumentu — request ne čeka Cloudinary.
 """
 
+import functools
+import hashlib
 import os
+import re
+import shutil
+import tempfile
 import uuid
 
+from flask import request
+from werkzeug.exceptions import RequestEntityTooLarge, UnsupportedMediaType
+
 UPLOAD_DIR = os.environ.get("UPLOAD_DIR", "/app/uploads")
+# Isti volumen kao UPLOAD_DIR → temp datoteka postaje original hardlinkom
+UPLOAD_TMP_DIR = os.path.join(UPLOAD_DIR, ".incoming")
+# NGINX admina (drugi korisnik, X-Accel-Redirect) mora moći čitati datoteke;
+# tempfile je 0600, a umask workera nije pod našom kontrolom
+UPLOAD_FILE_MODE = 0o644
 ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "webp", "gif"}
+# Tijelo upload zahtjeva (slika + multipart omotač); app-wide MAX_CONTENT_LENGTH
+# ostaje gornja granica za sve ostale rute
+UPLOAD_MAX_BYTES = int(os.environ.get("UPLOAD_MAX_BYTES", str(10 * 1024 * 1024)))
+# Jedna slika po zahtjevu — ne parsiraj stotine dijelova
+UPLOAD_MAX_FORM_PARTS = 10
+
+# Najveća dimenzija (px) i WebP kvaliteta po varijanti
+VARIANTS = {
+    "thumb": (320, 70),
+    "mobile": (1080, 78),
+    "full": (2048, 82),
+}
+_CLOUDINARY_TRANSFORMS = {
+    "thumb": "c_limit,w_320,f_auto,q_auto",
+    "mobile": "c_limit,w_1080,f_auto,q_auto",
+    "full": "c_limit,w_2048,f_auto,q_auto",
+}
+
+_HASHED_NAME_RE = re.compile(r"(?P<digest>[0-9a-f]{64})(?:_(?P<variant>[a-z]+))?\.(?P<ext>[a-z]+)")
+_CHUNK_SIZE = 64 * 1024
+_SNIFF_BYTES = 12
+_FORMAT_ERROR = "Nepodržani format slike (dozvoljeno: png, jpg, jpeg, webp, gif)"
 
 
 def _extension(filename):
@@ -19,21 +74,257 @@ def _extension(filename):
     return ext if ext in ALLOWED_EXTENSIONS else None
 
 
-def save_image(file_storage, folder="misc"):
-    """Sprema sliku i vraća javni URL. Podiže ValueError za nepodržani format."""
-    ext = _extension(file_storage.filename)
-    if not ext:
-        raise ValueError("Nepodržani format slike (dozvoljeno: png, jpg, jpeg, webp, gif)")
+def sniff_image_type(head):
+    """Ekstenzija prema magic bytes (prvih 12 bajtova) ili None."""
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if head.startswith(b"\xff\xd8\xff"):
+        return "jpg"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return "gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+
+class _UploadTempFile:
+    """
+    Odredište multipart dijela: chunkovi idu na disk, sha256 se računa
+    usput, a ne-slika se odbija (415) čim stigne prvih 12 bajtova — ostatak
+    tijela se više ne zapisuje.
+    """
+
+    def __init__(self):
+        os.makedirs(UPLOAD_TMP_DIR, exist_ok=True)
+        self._file = tempfile.NamedTemporaryFile(dir=UPLOAD_TMP_DIR, suffix=".part")
+        self._head = b""
+        self.sha256 = hashlib.sha256()
+        self.kind = None
+
+    def write(self, data):
+        if self.kind is None:
+            self._head += data[:_SNIFF_BYTES]
+            if len(self._head) >= _SNIFF_BYTES:
+                self.kind = sniff_image_type(self._head)
+                if self.kind is None:
+                    self._file.close()
+                    raise UnsupportedMediaType(_FORMAT_ERROR)
+        self.sha256.update(data)
+        return self._file.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+    def __iter__(self):
+        return iter(self._file)
+
+
+def _upload_stream(total_content_length, content_type, filename=None, content_length=None):
+    return _UploadTempFile()
+
+
+def streamed_upload(view):
+    """
+    Dekorator upload rute: prevelik zahtjev se odbija (413) prije čitanja
+    tijela, a multipart dijelovi se streamaju na disk (sha256 + magic bytes,
+    415 za ne-sliku). Ostale rute zadržavaju standardni Flask parser.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if request.content_length and request.content_length > UPLOAD_MAX_BYTES:
+            raise RequestEntityTooLarge()
+        # Tijelo se parsira tek pri prvom request.files, ovdje u viewu
+        req = request._get_current_object()
+        req._get_file_stream = _upload_stream
+        req.max_form_parts = UPLOAD_MAX_FORM_PARTS
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def variant_name(stored_name, variant):
+    return f"{stored_name.rsplit('.', 1)[0]}_{variant}.webp"
+
+
+def variant_urls(url):
+    """{thumb, mobile, full} za URL originala (lokalni ili Cloudinary)."""
+    if not url:
+        return {}
+    if "/upload/" in url and "res.cloudinary.com" in url:
+        head, tail = url.split("/upload/", 1)
+        return {v: f"{head}/upload/{t}/{tail}" for v, t in _CLOUDINARY_TRANSFORMS.items()}
+    folder_url, name = url.rsplit("/", 1)
+    if not _HASHED_NAME_RE.fullmatch(name):
+        return {}  # stari (UUID) upload — nema varijanti
+    return {v: f"{folder_url}/{variant_name(name, v)}" for v in VARIANTS}
+
+
+def _hash_and_kind(stream):
+    """sha256 i tip iz _UploadTempFile, ili jedan prolaz kroz stream (BytesIO…)."""
+    if isinstance(stream, _UploadTempFile):
+        stream.seek(0)
+        return stream.sha256.hexdigest(), stream.kind or sniff_image_type(stream.read(_SNIFF_BYTES))
+    digest = hashlib.sha256()
+    head = stream.read(_SNIFF_BYTES)
+    digest.update(head)
+    for chunk in iter(lambda: stream.read(_CHUNK_SIZE), b""):
+        digest.update(chunk)
+    return digest.hexdigest(), sniff_image_type(head)
 
-    if os.environ.get("CLOUDINARY_URL"):
-        import cloudinary.uploader
-        result = cloudinary.uploader.upload(
-            file_storage, folder=f"nightclub/{folder}"
-        )
-        return result["secure_url"]
+
+def _store(file_storage, path):
+    """Hardlink temp datoteke u konačno ime; inače kopija u chunkovima."""
+    stream = file_storage.stream
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    source = getattr(stream, "name", None)
+    if isinstance(source, str) and os.path.exists(source):
+        try:
+            os.link(source, tmp_path)
+            os.chmod(tmp_path, UPLOAD_FILE_MODE)
+            os.replace(tmp_path, path)
+            return
+        except OSError:
+            pass  # drugi filesystem — kopiraj
+    stream.seek(0)
+    with open(tmp_path, "wb") as out:
+        shutil.copyfileobj(stream, out, _CHUNK_SIZE)
+    os.chmod(tmp_path, UPLOAD_FILE_MODE)
+    os.replace(tmp_path, path)
+
+
+def save_image(file_storage, folder="misc", target=None):
+    """
+    Sprema sliku i vraća {"url": original, "variants": {...}}.
+    Podiže ValueError za nepodržani format (provjeravaju se magic bytes).
+
+    `target` = (kolekcija, _id, polje) dokumenta u kojem je URL; uz
+    Cloudinary ga task nakon uploada na CDN prepiše (replace_image_url).
+    """
+    if not _extension(file_storage.filename):
+        raise ValueError(_FORMAT_ERROR)
+    stream = file_storage.stream
+    content_hash, ext = _hash_and_kind(stream)
+    if not ext:
+        raise ValueError(_FORMAT_ERROR)
 
     target_dir = os.path.join(UPLOAD_DIR, folder)
     os.makedirs(target_dir, exist_ok=True)
-    name = f"{uuid.uuid4().hex}.{ext}"
-    file_storage.save(os.path.join(target_dir, name))
-    return f"/api/uploads/{folder}/{name}"
+    name = f"{content_hash}.{ext}"
+    path = os.path.join(target_dir, name)
+    if not os.path.exists(path):
+        _store(file_storage, path)
+
+    # Lazy import: tasks importa servise koji importaju ovaj modul
+    from tasks import forward_image_to_cloudinary, generate_image_variants
+    try:
+        generate_image_variants.delay(folder, name)
+        if os.environ.get("CLOUDINARY_URL") and target:
+            collection, doc_id, field = target
+            forward_image_to_cloudinary.delay(folder, name, collection, str(doc_id), field)
+    except Exception as exc:
+        print(f"[upload] Obrada slike nije stavljena u red ({name}): {exc}")
+
+    url = f"/api/uploads/{folder}/{name}"
+    return {"url": url, "variants": variant_urls(url)}
+
+
+def upload_to_cloudinary(folder, name):
+    """Worker: šalje lokalni original na Cloudinary, vraća secure_url."""
+    import cloudinary.uploader
+    # public_id = hash → Cloudinary sam deduplicira istu sliku
+    result = cloudinary.uploader.upload(
+        os.path.join(UPLOAD_DIR, folder, name), folder=f"nightclub/{folder}",
+        public_id=name.rsplit(".", 1)[0], overwrite=False,
+    )
+    return result["secure_url"]
+
+
+# kolekcija → polja slike: polje → (URL, varijante); galerija je lista
+# stavki {"url", "variants"}, pa nema polja varijanti
+IMAGE_FIELDS = {
+    "clubs": {
+        "cover": ("cover_image", "cover_image_variants"),
+        "gallery": ("gallery", None),
+    },
+    "floor_maps": {
+        "background": ("background_image_url", "background_image_variants"),
+    },
+}
+
+
+def replace_image_url(collection, doc_id, field, old_url, new_url):
+    """
+    Lokalni URL → CDN URL u dokumentu. Filter na stari URL: ako je admin
+    u međuvremenu uploadao drugu sliku, ona se ne prepisuje. Vraća broj
+    pogođenih dokumenata.
+    """
+    from datetime import datetime
+
+    from bson import ObjectId
+
+    from db import db
+
+    url_field, variants_field = IMAGE_FIELDS[collection][field]
+    col = db[collection]
+    oid = ObjectId(doc_id)
+    variants = variant_urls(new_url)
+    if field == "gallery":
+        return col.update_one(
+            {"_id": oid, f"{url_field}.url": old_url},
+            {"$set": {
+                f"{url_field}.$[img]": {"url": new_url, "variants": variants},
+                "updated_at": datetime.utcnow(),
+            }},
+            array_filters=[{"img.url": old_url}],
+        ).matched_count
+    update = {"$set": {url_field: new_url, variants_field: variants,
+                       "updated_at": datetime.utcnow()}}
+    if collection == "floor_maps":
+        # Nova verzija mape → floor_map_index ponovno učita meta podatke
+        update["$inc"] = {"version": 1}
+    return col.update_one({"_id": oid, url_field: old_url}, update).matched_count
+
+
+def build_variants(folder, name):
+    """Worker: generira WebP varijante koje još ne postoje (idempotentno)."""
+    from PIL import Image, ImageOps
+
+    source = os.path.join(UPLOAD_DIR, folder, name)
+    with Image.open(source) as original:
+        original.seek(0)  # animirani GIF → prvi frame
+        image = ImageOps.exif_transpose(original)
+        # Prozirnost može biti i bez alfa kanala (P/L/RGB s `transparency`)
+        transparent = "A" in image.getbands() or "transparency" in original.info
+        image = image.convert("RGBA" if transparent else "RGB")
+        for variant, (max_side, quality) in VARIANTS.items():
+            target = os.path.join(UPLOAD_DIR, folder, variant_name(name, variant))
+            if os.path.exists(target):
+                continue
+            resized = image.copy()
+            resized.thumbnail((max_side, max_side), Image.LANCZOS)
+            tmp_path = f"{target}.{uuid.uuid4().hex}.tmp"
+            resized.save(tmp_path, format="WEBP", quality=quality, method=4)
+            os.chmod(tmp_path, UPLOAD_FILE_MODE)
+            os.replace(tmp_path, target)
+
+
+def resolve_upload(folder, filename):
+    """
+    Ime datoteke koju treba poslužiti: tražena varijanta ako postoji,
+    inače original iste slike (varijante se još generiraju).
+    """
+    directory = os.path.join(UPLOAD_DIR, folder)
+    if os.path.exists(os.path.join(directory, filename)):
+        return filename
+    match = _HASHED_NAME_RE.fullmatch(filename)
+    if not match or match.group("variant") not in VARIANTS:
+        return filename
+    for ext in ALLOWED_EXTENSIONS:
+        original = f"{match.group('digest')}.{ext}"
+        if os.path.exists(os.path.join(directory, original)):
+            return original
+    return filename
+
+
+def is_content_addressed(filename):
+    """Ime izvedeno iz sha256 sadržaja — sadržaj pod tim URL-om se nikad ne mijenja."""
+    return bool(_HASHED_NAME_RE.fullmatch(filename))
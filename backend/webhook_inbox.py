@@ -0,0 +1,282 @@
+"""
+Stripe webhook inbox — trajni prijem eventa i obrada na Celery workeru.
+
+Webhook ruta samo verificira potpis, upiše sirovi event u `stripe_events`
+(_id = Stripe event id, pa je retry Stripea DuplicateKeyError) i odmah
+vraća 200. Obrada (potvrde, emailovi, refundi, Socket.IO) ide u tasku
+`process_stripe_event`:
+
+- status claim (received/failed → processing) čini obradu idempotentnom
+- Redis lock po PaymentIntentu + provjera starijih neobrađenih eventa istog
+  intenta čuvaju redoslijed (Stripe ne garantira redoslijed isporuke)
+- odgođeni event čeka dok stariji ne dođe na red (`deferred_until`, isti
+  countdown dobiva Celery retry), a ne vrti se svake sekunde
+- `processing` s isteklim leaseom i `received` koje nitko nije preuzeo
+  vraća u red sweeper (`retry_stuck_stripe_events`)
+
+Statusi: received → processing → processed | skipped | failed (→ dead
+nakon WEBHOOK_MAX_ATTEMPTS). `attempts` broji samo neuspjele obrade —
+odgoda (lock, stariji event) i Celery retry zbog nje ga ne povećavaju.
+"""
+
+import os
+from datetime import datetime, timedelta
+
+from prometheus_client import Counter, Gauge, Histogram
+from pymongo.errors import DuplicateKeyError
+
+from db import stripe_events_col
+from extensions import redis_client
+from payments import handle_payment_intent_succeeded
+
+WEBHOOK_MAX_ATTEMPTS = int(os.environ.get("WEBHOOK_MAX_ATTEMPTS", "8"))
+# Koliko dugo jedan worker smije držati event u `processing`
+WEBHOOK_LEASE_SECONDS = int(os.environ.get("WEBHOOK_LEASE_SECONDS", "120"))
+
+PENDING_STATUSES = ["received", "processing", "failed"]
+
+# Tipovi koje obrađujemo; ostali se spremaju kao `skipped` (audit trag)
+HANDLERS = {
+    "payment_intent.succeeded": handle_payment_intent_succeeded,
+}
+
+WEBHOOK_EVENTS = Counter(
+    "stripe_webhook_events_total",
+    "Stripe webhook events by stage outcome",
+    ["type", "outcome"],
+)
+
+WEBHOOK_LAG = Histogram(
+    "stripe_webhook_processing_lag_seconds",
+    "Time from webhook receipt to finished processing",
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900),
+)
+
+WEBHOOK_BACKLOG = Gauge(
+    "stripe_webhook_backlog",
+    "Stripe events received but not yet processed",
+)
+
+WEBHOOK_OLDEST_AGE = Gauge(
+    "stripe_webhook_oldest_pending_seconds",
+    "Age of the oldest unprocessed Stripe event",
+)
+
+
+class EventFailed(Exception):
+    """Handler je pao; `attempts` je broj neuspjelih obrada s dokumenta."""
+
+    def __init__(self, message, attempts, dead):
+        super().__init__(message)
+        self.attempts = attempts
+        self.dead = dead
+
+
+class EventDeferred(Exception):
+    """Event se ne smije obraditi sada (lock ili stariji event istog intenta)."""
+
+    def __init__(self, message, countdown=1):
+        super().__init__(message)
+        self.countdown = countdown
+
+
+def _payment_intent_id(event):
+    obj = (event.get("data") or {}).get("object") or {}
+    if obj.get("object") == "payment_intent":
+        return obj.get("id")
+    return obj.get("payment_intent")
+
+
+def ingest(event):
+    """
+    Upiše verificirani event (dict iz sirovog payloada). Vraća False za
+    duplikat — Stripe retry istog eventa ne smije pokrenuti drugu obradu.
+    """
+    try:
+        stripe_events_col.insert_one({
+            "_id": event["id"],
+            "type": event.get("type"),
+            "created": event.get("created"),
+            "payment_intent_id": _payment_intent_id(event),
+            "payload": event,
+            "status": "received",
+            "attempts": 0,
+            "received_at": datetime.utcnow(),
+        })
+    except DuplicateKeyError:
+        WEBHOOK_EVENTS.labels(event.get("type"), "duplicate").inc()
+        return False
+    WEBHOOK_EVENTS.labels(event.get("type"), "received").inc()
+    return True
+
+
+def _claim(event_id):
+    now = datetime.utcnow()
+    return stripe_events_col.find_one_and_update(
+        {
+            "_id": event_id,
+            "attempts": {"$lt": WEBHOOK_MAX_ATTEMPTS},
+            "$or": [
+                {"status": {"$in": ["received", "failed"]}},
+                {"status": "processing", "lease_until": {"$lt": now}},
+            ],
+        },
+        {
+            "$set": {
+                "status": "processing",
+                "lease_until": now + timedelta(seconds=WEBHOOK_LEASE_SECONDS),
+            },
+        },
+    )
+
+
+def _release(event_id, status, **fields):
+    stripe_events_col.update_one(
+        {"_id": event_id},
+        {"$set": {"status": status, **fields}, "$unset": {"lease_until": ""}},
+    )
+
+
+def _defer(event_id, countdown, reason):
+    """Vrati event u `received` do `deferred_until`; odgoda ne troši pokušaje."""
+    stripe_events_col.update_one(
+        {"_id": event_id},
+        {
+            "$set": {"status": "received",
+                     "deferred_until": datetime.utcnow() + timedelta(seconds=countdown)},
+            "$unset": {"lease_until": ""},
+        },
+    )
+    raise EventDeferred(reason, countdown=countdown)
+
+
+def _older_pending_wait(doc):
+    """
+    None ako nema starijeg neobrađenog eventa istog intenta, inače koliko
+    sekundi pričekati — do najkasnijeg `retry_at` starijih `failed` eventa
+    (oni se prije toga ionako neće obraditi), najmanje 1 s.
+    """
+    if not doc.get("payment_intent_id") or doc.get("created") is None:
+        return None
+    older = list(stripe_events_col.find({
+        "payment_intent_id": doc["payment_intent_id"],
+        "created": {"$lt": doc["created"]},
+        "status": {"$in": PENDING_STATUSES},
+        "attempts": {"$lt": WEBHOOK_MAX_ATTEMPTS},
+    }, {"status": 1, "retry_at": 1}))
+    if not older:
+        return None
+    now = datetime.utcnow()
+    retry_at = [o["retry_at"] for o in older if o["status"] == "failed" and o.get("retry_at")]
+    if not retry_at:
+        return 1
+    return max(1, int((max(retry_at) - now).total_seconds()) + 1)
+
+
+def process(event_id):
+    """
+    Obradi jedan event. Vraća False ako je već obrađen / preuzet drugdje;
+    podiže EventDeferred kad treba pričekati, a EventFailed kad handler padne
+    (event je tada `failed`/`dead`, Celery radi retry s backoffom).
+    """
+    doc = _claim(event_id)
+    if not doc:
+        return False
+
+    pi_id = doc.get("payment_intent_id")
+    lock = redis_client.lock(f"stripe_pi_lock:{pi_id}", timeout=WEBHOOK_LEASE_SECONDS,
+                             blocking_timeout=5) if pi_id else None
+    if lock is not None and not lock.acquire():
+        _defer(event_id, 1, f"Intent {pi_id} se upravo obrađuje")
+
+    try:
+        wait = _older_pending_wait(doc)
+        if wait is not None:
+            _defer(event_id, wait, f"Stariji event za {pi_id} još nije obrađen")
+
+        handler = HANDLERS.get(doc["type"])
+        try:
+            if handler:
+                handler(doc["payload"]["data"]["object"])
+        except Exception as exc:
+            # Event je naš (lease), pa je doc["attempts"] + 1 stanje nakon $inc
+            attempts = doc.get("attempts", 0) + 1
+            status = "dead" if attempts >= WEBHOOK_MAX_ATTEMPTS else "failed"
+            stripe_events_col.update_one(
+                {"_id": event_id},
+                {
+                    "$set": {
+                        "status": status,
+                        "last_error": str(exc),
+                        "retry_at": datetime.utcnow() + timedelta(seconds=backoff_seconds(attempts)),
+                    },
+                    "$unset": {"lease_until": ""},
+                    "$inc": {"attempts": 1},
+                },
+            )
+            WEBHOOK_EVENTS.labels(doc["type"], status).inc()
+            raise EventFailed(str(exc), attempts, status == "dead") from exc
+
+        outcome = "processed" if handler else "skipped"
+        processed_at = datetime.utcnow()
+        _release(event_id, outcome, processed_at=processed_at, last_error=None,
+                 deferred_until=None)
+        WEBHOOK_EVENTS.labels(doc["type"], outcome).inc()
+        WEBHOOK_LAG.observe((processed_at - doc["received_at"]).total_seconds())
+        return True
+    finally:
+        if lock is not None:
+            try:
+                lock.release()
+            except Exception:
+                pass  # lock je istekao — drugi worker ga je mogao preuzeti
+
+
+def stuck_event_ids(received_grace_seconds=30, limit=500):
+    """
+    Eventi koje nitko ne obrađuje: zaboravljeni received, failed, istekli
+    lease. Odgođeni received čeka svoj Celery retry (`deferred_until`).
+    """
+    now = datetime.utcnow()
+    grace = now - timedelta(seconds=received_grace_seconds)
+    cursor = stripe_events_col.find(
+        {
+            "attempts": {"$lt": WEBHOOK_MAX_ATTEMPTS},
+            "$or": [
+                {"status": "received", "received_at": {"$lt": grace},
+                 "deferred_until": {"$not": {"$gte": grace}}},
+                {"status": "failed", "retry_at": {"$lt": now}},
+                {"status": "processing", "lease_until": {"$lt": now}},
+            ],
+        },
+        {"_id": 1},
+    ).sort("received_at", 1).limit(limit)
+    return [d["_id"] for d in cursor]
+
+
+def _backlog_count():
+    return stripe_events_col.count_documents({"status": {"$in": PENDING_STATUSES}})
+
+
+def _oldest_pending_age():
+    oldest = stripe_events_col.find_one(
+        {"status": {"$in": PENDING_STATUSES}}, {"received_at": 1},
+        sort=[("received_at", 1)],
+    )
+    if not oldest:
+        return 0.0
+    return (datetime.utcnow() - oldest["received_at"]).total_seconds()
+
+
+def register_backlog_metrics():
+    """
+    Backlog i starost računaju se pri scrapeu. Registrira ih samo Celery
+    worker (jedan proces) da se vrijednost ne broji jednom po API workeru.
+    """
+    WEBHOOK_BACKLOG.set_function(_backlog_count)
+    WEBHOOK_OLDEST_AGE.set_function(_oldest_pending_age)
+
+
+def backoff_seconds(attempt):
+    """Eksponencijalni backoff za retry: 2, 4, 8 … najviše 5 min."""
+    return min(300, 2 ** max(1, attempt))
@@ -6,6 +6,7 @@ import EventCard from '../../components/EventCard';
 import PressableScale from '../../components/ui/PressableScale';
 import { scrim } from '../../constants/theme';
 import { api } from '../../services/api';
+import { galleryImageUrl, imageUrl } from '../../services/images';
 
 /** Detalji kluba — tabovi: Eventi | Info. */
 export default function ClubDetail() {
@@ -29,7 +30,7 @@ export default function ClubDetail() {
       {/* Hero */}
       <View className="h-[340px] justify-end">
         {club.cover_image ? (
-          <Image source={{ uri: club.cover_image }} style={StyleSheet.absoluteFill} resizeMode="cover" />
+          <Image source={{ uri: imageUrl(club.cover_image, 'mobile', club.cover_image_variants) }} style={StyleSheet.absoluteFill} resizeMode="cover" />
         ) : (
           <View style={StyleSheet.absoluteFill} className="bg-surfaceHi" />
         )}
@@ -79,6 +80,18 @@ export default function ClubDetail() {
               {club.social_links?.instagram && (
                 <InfoRow label="Instagram" value={club.social_links.instagram} />
               )}
+              {(club.gallery ?? []).length > 0 && (
+                <ScrollView horizontal showsHorizontalScrollIndicator={false} className="mt-4">
+                  {club.gallery.map((image: any, i: number) => (
+                    <Image
+                      key={i}
+                      source={{ uri: galleryImageUrl(image) }}
+                      className="w-32 h-32 rounded-xl mr-3"
+                      resizeMode="cover"
+                    />
+                  ))}
+                </ScrollView>
+              )}
             </View>
           )}
         </View>
@@ -1,11 +1,12 @@
 import { LinearGradient } from 'expo-linear-gradient';
 import { useLocalSearchParams, useRouter } from 'expo-router';
-import { useEffect, useState } from 'react';
+import { useEffect, useRef, useState } from 'react';
 import { Alert, Image, ScrollView, StyleSheet, Text, View } from 'react-native';
 import PaymentSheet from '../../components/PaymentSheet';
 import PressableScale from '../../components/ui/PressableScale';
 import { glow, scrim } from '../../constants/theme';
 import { api, errorMessage } from '../../services/api';
+import { imageUrl } from '../../services/images';
 
 /** Detalji eventa: lineup, tipovi karata (kupnja), ulaz u rezervaciju stola. */
 export default function EventDetail() {
@@ -14,6 +15,9 @@ export default function EventDetail() {
   const [event, setEvent] = useState<any>(null);
   const [purchase, setPurchase] = useState<{ clientSecret: string; ticketId: string } | null>(null);
   const [buying, setBuying] = useState<string | null>(null);
+  // Ključ kupnje po tipu karte — retry iste kupnje šalje isti ključ, pa backend
+  // ne radi drugi PaymentIntent ni ne troši kvotu dvaput
+  const purchaseKeys = useRef<Record<string, string>>({});
 
   function load() {
     api.get(`/api/events/${id}`).then((res) => setEvent(res.data)).catch(() => {});
@@ -23,10 +27,18 @@ export default function EventDetail() {
 
   async function buyTicket(ticketTypeId: string) {
     setBuying(ticketTypeId);
+    const purchaseKey = (purchaseKeys.current[ticketTypeId] ??=
+      `${Date.now().toString(36)}-${Math.random().toString(36).slice(2, 12)}`);
     try {
-      const res = await api.post('/api/tickets/purchase', { event_id: id, ticket_type_id: ticketTypeId });
+      const res = await api.post('/api/tickets/purchase', {
+        event_id: id, ticket_type_id: ticketTypeId, purchase_key: purchaseKey,
+      });
+      delete purchaseKeys.current[ticketTypeId];
       setPurchase({ clientSecret: res.data.client_secret, ticketId: res.data.ticket_id });
     } catch (err: any) {
+      // 4xx je konačan odgovor (rasprodano, neispravno) — nova kupnja dobiva novi ključ
+      const status = err?.response?.status;
+      if (status >= 400 && status < 500 && status !== 409) delete purchaseKeys.current[ticketTypeId];
       Alert.alert('Kupnja nije moguća', errorMessage(err));
     } finally {
       setBuying(null);
@@ -42,7 +54,7 @@ export default function EventDetail() {
       {/* Hero */}
       <View className="h-[400px] justify-end">
         {event.cover_image ? (
-          <Image source={{ uri: event.cover_image }} style={StyleSheet.absoluteFill} resizeMode="cover" />
+          <Image source={{ uri: imageUrl(event.cover_image, 'mobile', event.cover_image_variants) }} style={StyleSheet.absoluteFill} resizeMode="cover" />
         ) : (
           <View style={StyleSheet.absoluteFill} className="bg-surfaceHi" />
         )}
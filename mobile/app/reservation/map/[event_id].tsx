@@ -4,6 +4,7 @@ import { Alert, ScrollView, Text, View } from 'react-native';
 import FloorMap from '../../../components/FloorMap';
 import { FloorTable } from '../../../components/TableMarker';
 import { api, errorMessage } from '../../../services/api';
+import { decodeFloorMap } from '../../../services/floorMap';
 
 /** SVG mapa stolova s real-time dostupnošću — odabir i kreiranje rezervacije. */
 export default function ReservationMap() {
@@ -13,8 +14,8 @@ export default function ReservationMap() {
   const [error, setError] = useState('');
 
   useEffect(() => {
-    api.get(`/api/floor-maps/event/${event_id}`)
-      .then((res) => setMap(res.data))
+    api.get(`/api/floor-maps/event/${event_id}`, { params: { format: 'compact' } })
+      .then((res) => setMap(decodeFloorMap(res.data)))
       .catch((err) => setError(errorMessage(err)));
   }, [event_id]);
 
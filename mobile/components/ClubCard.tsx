@@ -2,6 +2,7 @@ import { LinearGradient } from 'expo-linear-gradient';
 import { useRouter } from 'expo-router';
 import { Image, StyleSheet, Text, View } from 'react-native';
 import { cardShadow, scrim } from '../constants/theme';
+import { imageUrl } from '../services/images';
 import PressableScale from './ui/PressableScale';
 
 export default function ClubCard({ club }: { club: any }) {
@@ -14,7 +15,7 @@ export default function ClubCard({ club }: { club: any }) {
     >
       <View className="h-48 justify-end">
         {club.cover_image ? (
-          <Image source={{ uri: club.cover_image }} style={StyleSheet.absoluteFill} resizeMode="cover" />
+          <Image source={{ uri: imageUrl(club.cover_image, 'thumb', club.cover_image_variants) }} style={StyleSheet.absoluteFill} resizeMode="cover" />
         ) : (
           <View style={StyleSheet.absoluteFill} className="bg-surfaceHi items-center justify-center">
             <Text className="text-neon font-display text-6xl opacity-40">{club.name?.[0]}</Text>
@@ -2,6 +2,7 @@ import { LinearGradient } from 'expo-linear-gradient';
 import { useRouter } from 'expo-router';
 import { Image, StyleSheet, Text, View } from 'react-native';
 import { cardShadow, scrim } from '../constants/theme';
+import { imageUrl } from '../services/images';
 import PressableScale from './ui/PressableScale';
 
 export default function EventCard({ event }: { event: any }) {
@@ -18,7 +19,7 @@ export default function EventCard({ event }: { event: any }) {
     >
       <View className="h-64 justify-end">
         {event.cover_image ? (
-          <Image source={{ uri: event.cover_image }} style={StyleSheet.absoluteFill} resizeMode="cover" />
+          <Image source={{ uri: imageUrl(event.cover_image, 'thumb', event.cover_image_variants) }} style={StyleSheet.absoluteFill} resizeMode="cover" />
         ) : (
           <View style={StyleSheet.absoluteFill} className="bg-surfaceHi items-center justify-center">
             <Text className="text-neon font-display text-6xl opacity-40">{event.name?.[0]}</Text>
@@ -4,6 +4,7 @@ import Svg, { Image as SvgImage } from 'react-native-svg';
 import { Colors } from '../constants/colors';
 import { glow } from '../constants/theme';
 import { useSocketEvent } from '../hooks/useSocket';
+import { imageUrl } from '../services/images';
 import { joinEventRoom, leaveEventRoom } from '../services/socket';
 import TableMarker, { FloorTable } from './TableMarker';
 import PressableScale from './ui/PressableScale';
@@ -13,7 +14,9 @@ import PressableScale from './ui/PressableScale';
  * - slika tlocrta kao pozadina, stolovi pozicionirani u % koordinatama
  * - slobodan stol: zeleni rub → modal s detaljima i gumbom "Rezerviraj"
  * - rezerviran stol: crveni rub, neklikabilan
- * - real-time: Socket.IO `table_updated` ažurira dostupnost bez refresha
+ * - real-time: Socket.IO `table_updated` ažurira dostupnost bez refresha,
+ *   a `floor_map_updated` primjenjuje razliku iz admin editora (novi,
+ *   pomaknuti i obrisani stolovi) bez ponovnog učitavanja mape
  */
 export default function FloorMap({
   map, eventId, onReserve,
@@ -46,6 +49,19 @@ export default function FloorMap({
 
   useSocketEvent('table_updated', onTableUpdate);
 
+  const onMapUpdate = useCallback((data: any) => {
+    if (String(data.map_id) !== String(map._id)) return;
+    const { added = [], patched = {}, deleted = [] } = data.changes ?? {};
+    setTables((prev) => [
+      ...prev
+        .filter((t) => !deleted.includes(t.id))
+        .map((t) => (patched[t.id] ? { ...t, ...patched[t.id] } : t)),
+      ...added.map((t: FloorTable) => ({ ...t, is_available: true, reservation_status: null })),
+    ]);
+  }, [map._id]);
+
+  useSocketEvent('floor_map_updated', onMapUpdate);
+
   return (
     <View>
       <Svg
@@ -54,7 +70,7 @@ export default function FloorMap({
       >
         {map.background_image_url && (
           <SvgImage
-            href={{ uri: map.background_image_url }}
+            href={{ uri: imageUrl(map.background_image_url, 'mobile', map.background_image_variants) }}
             x="0" y="0" width="100" height="70"
             preserveAspectRatio="xMidYMid slice"
             opacity={0.4}
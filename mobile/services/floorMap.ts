@@ -0,0 +1,23 @@
+/**
+ * Kompaktni format mape stolova (`/api/floor-maps/event/:id?format=compact`).
+ *
+ * Backend šalje nazive stupaca jednom (`table_columns`) i stolove kao
+ * retke — payload velike mape je višestruko manji od liste objekata.
+ * Ovdje se reci vraćaju u FloorTable objekte koje koristi SVG mapa.
+ */
+
+import { FloorTable } from '../components/TableMarker';
+
+export function decodeFloorMap(payload: any) {
+  if (payload?.format !== 'compact') return payload;
+  const columns: string[] = payload.table_columns;
+  const tables: FloorTable[] = payload.tables.map((row: any[]) => {
+    const table: any = {};
+    columns.forEach((column, i) => { table[column] = row[i]; });
+    table.reservation_status = table.status ?? null;
+    table.is_available = table.status == null;
+    delete table.status;
+    return table as FloorTable;
+  });
+  return { ...payload, tables };
+}
@@ -0,0 +1,48 @@
+/**
+ * URL-ovi slika s varijantama (thumb / mobile / full).
+ *
+ * Backend sprema slike pod sha256 imenom i generira WebP varijante
+ * `<hash>_<varijanta>.webp`; na Cloudinaryju su varijante URL transformacije.
+ * Liste učitavaju ~50 KB thumbnail umjesto originala od nekoliko MB.
+ */
+
+import { API_URL } from './api';
+
+export type ImageVariant = 'thumb' | 'mobile' | 'full';
+
+const CLOUDINARY_TRANSFORMS: Record<ImageVariant, string> = {
+  thumb: 'c_limit,w_320,f_auto,q_auto',
+  mobile: 'c_limit,w_1080,f_auto,q_auto',
+  full: 'c_limit,w_2048,f_auto,q_auto',
+};
+
+const HASHED_NAME = /^([0-9a-f]{64})\.[a-z]+$/;
+
+export function imageUrl(
+  url: string | null | undefined,
+  variant: ImageVariant = 'thumb',
+  variants?: Partial<Record<ImageVariant, string>> | null,
+): string | undefined {
+  const picked = variants?.[variant] ?? deriveVariant(url, variant);
+  if (!picked) return undefined;
+  return picked.startsWith('/') ? `${API_URL}${picked}` : picked;
+}
+
+/** Stavka galerije: {url, variants}; stari dokumenti imaju samo URL. */
+export type GalleryImage = string | { url: string; variants?: Partial<Record<ImageVariant, string>> };
+
+export function galleryImageUrl(image: GalleryImage, variant: ImageVariant = 'thumb') {
+  return typeof image === 'string' ? imageUrl(image, variant) : imageUrl(image.url, variant, image.variants);
+}
+
+function deriveVariant(url: string | null | undefined, variant: ImageVariant) {
+  if (!url) return url ?? undefined;
+  if (url.includes('res.cloudinary.com') && url.includes('/upload/')) {
+    const [head, tail] = url.split('/upload/');
+    return `${head}/upload/${CLOUDINARY_TRANSFORMS[variant]}/${tail}`;
+  }
+  const slash = url.lastIndexOf('/');
+  const match = url.slice(slash + 1).match(HASHED_NAME);
+  // Stari uploadi (UUID ime) nemaju varijante — koristi original
+  return match ? `${url.slice(0, slash + 1)}${match[1]}_${variant}.webp` : url;
+}